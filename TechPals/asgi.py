@@ -3,6 +3,11 @@ ASGI config for TechPals project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through this entry point (e.g. ``uvicorn TechPals.asgi:application``)
+enables the group chat push stream: each open chat tab holds one cheap
+async connection instead of polling. See ``TechPalsApp.broker`` and the
+``CHAT_RELAY_PATH`` setting for running several workers.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'TechPalsApp.ratelimit.RateLimitMiddleware',  # before sessions so rejects stay cheap
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'TechPalsApp.context_processors.navigation',
             ],
         },
     },
@@ -80,6 +82,22 @@ DATABASES = {
     }
 }
 
+# Cache
+# Group memberships, navigation stamps, rendered pages and unread totals are
+# cached under generation counters (kept in the database, see caching.py).
+# The entries themselves are shared by every worker process through a small
+# SQLite file rather than per-process memory; see sqlite_cache.py.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'TechPalsApp.sqlite_cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -99,12 +117,33 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The custom backend already handles plain usernames, so there is no
+# ModelBackend fallback: a failed login must not be looked up and hashed twice.
 AUTHENTICATION_BACKENDS = [
     'TechPalsApp.backends.EmailOrUsernameModelBackend',  # my custom backend
-    'django.contrib.auth.backends.ModelBackend',         # default backend (optional fallback)
 ]
 
 
+# Logging
+# Login attempts are logged by TechPalsApp.auth with outcome and timing.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'TechPalsApp': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -127,6 +166,40 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Email
+# Sent from background jobs (`manage.py runworker`), e.g. due-date reminders.
+# Printed to the console until a real SMTP backend is configured.
+
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'TechPals Solutions <no-reply@techpals.local>'
+
+# Uploaded user imports wait here until a job worker picks them up. They
+# contain passwords, so keep this outside MEDIA_ROOT; each file is deleted
+# once its import has run.
+
+IMPORT_UPLOAD_DIR = BASE_DIR / 'import_uploads'
+
+# Rate limiting
+# Token buckets per URL name, shared by all worker processes through a
+# SQLite file. See TechPalsApp.ratelimit for the rule format.
+
+RATE_LIMIT_DB = BASE_DIR / 'ratelimit.sqlite3'
+
+RATE_LIMITS = {
+    'login': [('ip', '30/m'), ('field:identifier', '5/m')],
+    'register': [('ip', '5/h')],
+    'post-group-message': [('session', '30/m'), ('ip', '120/m')],
+}
+
+
+# Group chat push
+# Chat messages are pushed to open browser tabs over Server-Sent Events when
+# the site is served through TechPals.asgi. With more than one ASGI worker
+# process, point this at a SQLite file shared by the workers so a message
+# posted in one worker reaches streams held by the others.
+
+CHAT_RELAY_PATH = None  # e.g. BASE_DIR / 'chat_relay.sqlite3'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
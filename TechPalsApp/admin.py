@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Group, GroupBooking, GroupMessage, GroupReport, Booking, Task, Post, Category
+from .models import Group, GroupBooking, GroupMessage, GroupReport, Booking, Task, Post, Category, Skill, Job, ServiceDay
 
 # Register your models here.
 admin.site.register(Group)
@@ -10,3 +10,6 @@ admin.site.register(Booking)
 admin.site.register(Task)
 admin.site.register(Post)
 admin.site.register(Category)
+admin.site.register(Skill)
+admin.site.register(Job)
+admin.site.register(ServiceDay)
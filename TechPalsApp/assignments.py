@@ -0,0 +1,66 @@
+from .models import Group, Task, TaskAssignment
+
+# Maintenance of the denormalized TaskAssignment rows.
+#
+# A task is assigned to every member of the group its booking is booked
+# with (GroupBooking). Signals call into here when a task, a group booking
+# or a group's members change; code that writes with bulk operations, which
+# skip signals, calls rebuild_assignments() itself.
+
+WRITE_BATCH_SIZE = 1000
+
+
+def _members_by_group(group_ids):
+    members = {}
+    rows = Group.group_members.through.objects.filter(group_id__in=group_ids).values_list('group_id', 'user_id')
+    for group_id, user_id in rows:
+        members.setdefault(group_id, []).append(user_id)
+    return members
+
+
+def rebuild_assignments(tasks):
+    """Recompute the assignment rows of ``tasks``, a Task queryset."""
+    TaskAssignment.objects.filter(task__in=tasks.values('id')).delete()
+    rows = list(
+        tasks.filter(booking__group_booking__isnull=False)
+        .values_list('id', 'booking__group_booking__group_id', 'due_date')
+    )
+    members = _members_by_group({group_id for _, group_id, _ in rows})
+    TaskAssignment.objects.bulk_create(
+        [
+            TaskAssignment(task_id=task_id, group_id=group_id, member_id=member_id, due_date=due_date)
+            for task_id, group_id, due_date in rows
+            for member_id in members.get(group_id, ())
+        ],
+        batch_size=WRITE_BATCH_SIZE,
+    )
+
+
+def rebuild_for_bookings(booking_ids):
+    booking_ids = list(booking_ids)
+    for start in range(0, len(booking_ids), WRITE_BATCH_SIZE):
+        rebuild_assignments(Task.objects.filter(booking_id__in=booking_ids[start:start + WRITE_BATCH_SIZE]))
+
+
+def add_members(pairs):
+    """Assign each group's tasks to newly added members; ``pairs`` are (group id, user id)."""
+    users_by_group = {}
+    for group_id, user_id in pairs:
+        users_by_group.setdefault(group_id, []).append(user_id)
+    rows = Task.objects.filter(booking__group_booking__group_id__in=list(users_by_group)).values_list(
+        'id', 'booking__group_booking__group_id', 'due_date'
+    )
+    TaskAssignment.objects.bulk_create(
+        [
+            TaskAssignment(task_id=task_id, group_id=group_id, member_id=user_id, due_date=due_date)
+            for task_id, group_id, due_date in rows
+            for user_id in users_by_group[group_id]
+        ],
+        batch_size=WRITE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_members(pairs):
+    for group_id, user_id in pairs:
+        TaskAssignment.objects.filter(group_id=group_id, member_id=user_id).delete()
@@ -1,19 +1,69 @@
+import logging
+import time
+
+from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.contrib.auth.models import User
 from django.db.models import Q
+from django.db.models.functions import Lower
+
+logger = logging.getLogger('TechPalsApp.auth')
+
+UserModel = get_user_model()
+
 
 class EmailOrUsernameModelBackend(ModelBackend):
+    """
+    Authenticate with either a username or an email address.
+
+    Every attempt costs exactly one password hash: unknown identifiers are
+    hashed against a throwaway password so they take as long as a wrong
+    password, and this backend is the only one configured so a failure is
+    not looked up and hashed a second time by a fallback backend.
+    """
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        print(f"Custom backend trying to authenticate: {username}")
-        try:
-            user = User.objects.get(Q(username=username) | Q(email=username))
-        except User.DoesNotExist:
-            print("User not found by username or email")
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if not username or password is None:
             return None
-        
-        if user.check_password(password) and self.user_can_authenticate(user):
-            print(f"Password valid for user: {user.username}")
-            return user
-        print("Password invalid")
-        return None
 
+        started = time.perf_counter()
+        lookup = 'email' if '@' in username else 'username'
+        user = self.get_user_by_identifier(username)
+
+        if user is None:
+            # Constant cost for unknown users, as in ModelBackend
+            UserModel().set_password(password)
+            outcome = 'unknown_user'
+        elif user.check_password(password) and self.user_can_authenticate(user):
+            outcome = 'success'
+        else:
+            outcome = 'invalid_password'
+            user = None
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            "login_attempt outcome=%s lookup=%s duration_ms=%.1f",
+            outcome, lookup, duration_ms,
+            extra={'event': 'login_attempt', 'outcome': outcome, 'lookup': lookup, 'duration_ms': round(duration_ms, 1)},
+        )
+        return user
+
+    def get_user_by_identifier(self, identifier):
+        if '@' not in identifier:
+            # Unique index on username
+            return UserModel._default_manager.filter(username=identifier).first()
+
+        # Case-insensitive email match served by the LOWER(email) index;
+        # a username containing '@' still wins over someone else's email.
+        candidates = list(
+            UserModel._default_manager.annotate(email_lower=Lower('email'))
+            .filter(Q(username=identifier) | Q(email_lower=identifier.lower()))[:3]
+        )
+        for candidate in candidates:
+            if candidate.username == identifier:
+                return candidate
+        if len(candidates) == 1:
+            return candidates[0]
+        # Several accounts share this email; refuse rather than guess
+        return None
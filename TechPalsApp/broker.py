@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# In-process pub/sub for pushing group chat messages to open streams.
+#
+# Every ASGI worker keeps its own subscribers. With a single worker a
+# publish is delivered straight to the subscribers' asyncio queues. With
+# several workers set CHAT_RELAY_PATH to a SQLite file: publishes are
+# appended to it and one poller thread per worker fans them out locally,
+# so no Redis or other broker process is needed.
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, channel, loop):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when the client fell too far behind; the stream should close
+        # so the browser reconnects and catches up from the database.
+        self.overflowed = False
+
+    def offer(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class SQLiteRelay:
+    POLL_INTERVAL = 0.25
+    RETENTION_SECONDS = 120
+
+    def __init__(self, path, deliver):
+        self.path = str(path)
+        self.deliver = deliver
+        self._local = threading.local()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS relay_event ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' channel TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' created REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def publish(self, channel, payload):
+        self._connection().execute(
+            'INSERT INTO relay_event (channel, payload, created) VALUES (?, ?, ?)',
+            (channel, json.dumps(payload), time.time()),
+        )
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-relay', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        connection = self._connection()
+        last_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM relay_event').fetchone()[0]
+        last_prune = time.time()
+        while True:
+            try:
+                rows = connection.execute(
+                    'SELECT id, channel, payload FROM relay_event WHERE id > ? ORDER BY id',
+                    (last_id,),
+                ).fetchall()
+                for event_id, channel, payload in rows:
+                    last_id = event_id
+                    self.deliver(channel, json.loads(payload))
+                if time.time() - last_prune > self.RETENTION_SECONDS:
+                    connection.execute(
+                        'DELETE FROM relay_event WHERE created < ?',
+                        (time.time() - self.RETENTION_SECONDS,),
+                    )
+                    last_prune = time.time()
+            except sqlite3.Error:
+                logger.exception("Chat relay poll failed")
+            time.sleep(self.POLL_INTERVAL)
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._relay = None
+        self._relay_checked = False
+
+    def _get_relay(self):
+        if not self._relay_checked:
+            with self._lock:
+                if not self._relay_checked:
+                    path = getattr(settings, 'CHAT_RELAY_PATH', None)
+                    if path:
+                        self._relay = SQLiteRelay(path, self._deliver)
+                    self._relay_checked = True
+        return self._relay
+
+    def subscribe(self, channel):
+        """Register a subscriber; must be called from the event loop that will read it."""
+        relay = self._get_relay()
+        if relay is not None:
+            relay.start()
+        subscription = Subscription(channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, payload):
+        """Send ``payload`` to every subscriber of ``channel``. Safe to call from any thread."""
+        relay = self._get_relay()
+        if relay is not None:
+            try:
+                relay.publish(channel, payload)
+                return
+            except sqlite3.Error:
+                logger.exception("Chat relay publish failed, delivering locally only")
+        self._deliver(channel, payload)
+
+    def _deliver(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, payload)
+            except RuntimeError:
+                # The subscriber's event loop has already shut down
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+broker = Broker()
+
+
+def group_channel(group_id):
+    return f'group:{group_id}'
@@ -0,0 +1,220 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Booking, Service, ServiceDay
+
+# Per-service daily booking capacity.
+#
+# Each (service, day) that has bookings has a ServiceDay row holding how
+# many bookings it has and how many it can take. A booking reserves its
+# slot with one conditional UPDATE ("booked = booked + 1 WHERE booked <
+# capacity"), so parallel submissions can't overfill a day and no lock is
+# held beyond that statement. The first booking of a day creates the row
+# with the service's current daily_capacity; later changes to the service
+# capacity are copied to upcoming rows that still had the old value, so a
+# day given its own capacity in the admin keeps it.
+#
+# Booking.clean() refuses a full day up front so forms and the admin show
+# the error; Booking.save() then takes the slot in the booking's own
+# transaction (take_slot), which is what holds under concurrent bookings.
+# A delete signal gives the slot back. Bulk writers call reserve_many
+# themselves, which reserves up to UPSERT_SLOTS days per statement. The
+# availability calendar reads the rows of the range in one query instead
+# of counting bookings.
+
+AVAILABILITY_DAYS = 90
+# (service, day) slots reserved per INSERT ... ON CONFLICT statement
+UPSERT_SLOTS = 200
+FULLY_BOOKED = "This service is fully booked on that date."
+
+
+def _fits(count):
+    return Q(capacity__isnull=True) | Q(booked__lte=F('capacity') - count)
+
+
+def reserve(service_id, day, count=1):
+    """Take ``count`` slots of the service on ``day``; False, taking none, if they don't fit."""
+    days = ServiceDay.objects.filter(service_id=service_id, day=day)
+    if days.filter(_fits(count)).update(booked=F('booked') + count):
+        return True
+    if days.exists():
+        return False
+    # First booking of the day
+    capacity = Service.objects.filter(id=service_id).values_list('daily_capacity', flat=True).first()
+    if capacity is not None and count > capacity:
+        return False
+    try:
+        with transaction.atomic():
+            ServiceDay.objects.create(service_id=service_id, day=day, capacity=capacity, booked=count)
+        return True
+    except IntegrityError:
+        # Another booking created the row first
+        return bool(days.filter(_fits(count)).update(booked=F('booked') + count))
+
+
+def reserve_up_to(service_id, day, count):
+    """Take as many of ``count`` slots as are free, and return how many were taken."""
+    while count > 0:
+        if reserve(service_id, day, count):
+            return count
+        count = min(count, free_slots(service_id, day) or 0)
+    return 0
+
+
+def _reserve_whole(counts, capacities):
+    # One statement per chunk: each row is created, or added to if the
+    # whole count fits, and comes back in RETURNING only if it was
+    opts = ServiceDay._meta
+    qn = connection.ops.quote_name
+    fields = [opts.get_field(name) for name in ('service', 'day', 'capacity', 'booked')]
+    table = qn(opts.db_table)
+    service, day, capacity, booked = (qn(field.column) for field in fields)
+    reserved = set()
+    items = list(counts.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), UPSERT_SLOTS):
+            chunk = items[start:start + UPSERT_SLOTS]
+            params = []
+            for (service_id, slot_day), count in chunk:
+                values = (service_id, slot_day, capacities[service_id], count)
+                params.extend(field.get_db_prep_save(value, connection) for field, value in zip(fields, values))
+            cursor.execute(
+                f'INSERT INTO {table} ({service}, {day}, {capacity}, {booked}) '
+                f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(chunk))} '
+                f'ON CONFLICT({service}, {day}) DO UPDATE SET {booked} = {table}.{booked} + excluded.{booked} '
+                f'WHERE {table}.{capacity} IS NULL OR {table}.{booked} + excluded.{booked} <= {table}.{capacity} '
+                f'RETURNING {service}, {day}',
+                params,
+            )
+            # Dates come back as text on SQLite; str() matches either way
+            reserved.update((service_id, str(slot_day)) for service_id, slot_day in cursor.fetchall())
+    return reserved
+
+
+def reserve_many(counts):
+    """
+    Reserve ``{(service id, day): count}`` slots at once; returns how many
+    were taken for each, the whole count where it fits and what is left of
+    the day where it doesn't.
+    """
+    capacities = dict(
+        Service.objects.filter(id__in={service_id for service_id, _ in counts}).values_list('id', 'daily_capacity')
+    )
+    whole = {
+        (service_id, day): count for (service_id, day), count in counts.items()
+        if service_id in capacities and (capacities[service_id] is None or count <= capacities[service_id])
+    }
+    reserved = _reserve_whole(whole, capacities) if whole else set()
+    taken = {}
+    for (service_id, day), count in counts.items():
+        if (service_id, str(day)) in reserved:
+            taken[service_id, day] = count
+        else:
+            taken[service_id, day] = reserve_up_to(service_id, day, count)
+    return taken
+
+
+def release(service_id, day, count=1):
+    ServiceDay.objects.filter(service_id=service_id, day=day, booked__gte=count).update(booked=F('booked') - count)
+
+
+def _slot_change(booking):
+    # (slot held before this save or None, slot being saved), or None if
+    # unchanged. The previous slot is also what the rollup signals count
+    # from, so it is left on the booking instead of being read again.
+    current = (booking.booking_service_id, booking.due_date)
+    previous = None
+    if booking.pk:
+        previous = Booking.objects.filter(pk=booking.pk).values_list('booking_service_id', 'due_date').first()
+    booking._rollup_previous = previous
+    return None if previous == current else (previous, current)
+
+
+def check_slot(booking):
+    """Raise ValidationError if ``booking`` is moving to a day with no free slot."""
+    change = _slot_change(booking)
+    if change and free_slots(*change[1]) == 0:
+        raise ValidationError({'due_date': FULLY_BOOKED})
+
+
+def take_slot(booking):
+    """
+    Reserve the slot ``booking`` is about to be saved with and give back the
+    one it held before; raises ValidationError, taking nothing, if the day
+    is full. Call it in the transaction that saves the booking.
+    """
+    change = _slot_change(booking)
+    if change is None:
+        return
+    previous, current = change
+    if not reserve(*current):
+        raise ValidationError({'due_date': FULLY_BOOKED})
+    if previous:
+        release(*previous)
+
+
+def free_slots(service_id, day):
+    """Slots left on ``day``; None if the service has no limit."""
+    row = ServiceDay.objects.filter(service_id=service_id, day=day).values_list('capacity', 'booked').first()
+    if row is None:
+        capacity, booked = Service.objects.filter(id=service_id).values_list('daily_capacity', flat=True).first(), 0
+    else:
+        capacity, booked = row
+    return None if capacity is None else max(capacity - booked, 0)
+
+
+def change_capacity(service_id, old, new, today=None):
+    """Give upcoming days that had the service's ``old`` capacity the ``new`` one."""
+    today = today or timezone.localdate()
+    days = ServiceDay.objects.filter(service_id=service_id, day__gte=today)
+    days = days.filter(capacity__isnull=True) if old is None else days.filter(capacity=old)
+    days.update(capacity=new)
+
+
+class DayAvailability:
+    def __init__(self, day, capacity, booked):
+        self.day = day
+        # None: no limit
+        self.capacity = capacity
+        self.booked = booked
+
+    @property
+    def free(self):
+        return None if self.capacity is None else max(self.capacity - self.booked, 0)
+
+    @property
+    def available(self):
+        return self.capacity is None or self.booked < self.capacity
+
+    def as_dict(self):
+        return {
+            'date': self.day.isoformat(),
+            'capacity': self.capacity,
+            'booked': self.booked,
+            'free': self.free,
+        }
+
+
+def availability(service_id, capacity, start=None, days=AVAILABILITY_DAYS):
+    """
+    One :class:`DayAvailability` per day from ``start`` (default tomorrow)
+    for ``days`` days. ``capacity`` is the service's daily capacity, used
+    for days nobody has booked yet.
+    """
+    start = start or timezone.localdate() + timedelta(days=1)
+    end = start + timedelta(days=days - 1)
+    rows = {
+        day: (day_capacity, booked)
+        for day, day_capacity, booked in ServiceDay.objects.filter(
+            service_id=service_id, day__range=(start, end)
+        ).values_list('day', 'capacity', 'booked')
+    }
+    calendar = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        calendar.append(DayAvailability(day, *rows.get(day, (capacity, 0))))
+    return calendar
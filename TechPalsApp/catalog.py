@@ -0,0 +1,89 @@
+import hashlib
+import json
+import threading
+
+from .caching import bump_generation, get_generation
+from .models import Service
+
+# Process-local service catalog.
+#
+# Every service is read on the public services page and on the booking
+# forms, and the list changes rarely. Each process keeps it in memory,
+# stamped with the generation of SERVICE_GENERATION from the shared cache
+# (settings.CACHES, a database table every worker reads). Service saves and
+# deletes bump that generation, so every process reloads on its next
+# request. A request costs one cache-table lookup and no Service query.
+#
+# The catalog also carries its JSON form and a strong ETag over it, so the
+# JSON endpoint and the anonymous services page can answer conditional
+# requests with 304 without rendering anything.
+
+SERVICE_GENERATION = 'services'
+
+
+class CatalogService:
+    def __init__(self, id, service_name, service_description, service_price, daily_capacity):
+        self.id = id
+        self.pk = id
+        self.service_name = service_name
+        self.service_description = service_description
+        self.service_price = service_price
+        self.daily_capacity = daily_capacity
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.service_name,
+            'description': self.service_description,
+            'price': str(self.service_price),
+            'daily_capacity': self.daily_capacity,
+        }
+
+    def __str__(self):
+        return f"{self.service_name} - {self.service_price}"
+
+
+class ServiceCatalog:
+    def __init__(self, stamp, services):
+        self.stamp = stamp
+        self.services = services
+        self.by_id = {service.id: service for service in services}
+        self.json = json.dumps(
+            {'services': [service.as_dict() for service in services]}, separators=(',', ':')
+        ).encode()
+        self.etag = hashlib.sha256(self.json).hexdigest()[:32]
+
+    def get(self, service_id):
+        try:
+            return self.by_id.get(int(service_id))
+        except (TypeError, ValueError):
+            return None
+
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def invalidate_catalog():
+    bump_generation(SERVICE_GENERATION)
+
+
+def get_catalog():
+    """The current :class:`ServiceCatalog`, reloaded only when a service changed."""
+    global _catalog
+    stamp = get_generation(SERVICE_GENERATION)
+    catalog = _catalog
+    if catalog is not None and catalog.stamp == stamp:
+        return catalog
+    with _lock:
+        if _catalog is None or _catalog.stamp != stamp:
+            # Tagged with the stamp read before loading, so a change made
+            # while loading still triggers another reload
+            services = [
+                CatalogService(*row)
+                for row in Service.objects.order_by('id').values_list(
+                    'id', 'service_name', 'service_description', 'service_price', 'daily_capacity'
+                )
+            ]
+            _catalog = ServiceCatalog(stamp, services)
+        return _catalog
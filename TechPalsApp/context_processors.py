@@ -0,0 +1,86 @@
+from django.templatetags.static import static
+
+from .caching import bump_generation, get_generation
+from .images import derivative_url
+from .models import Group, Profile
+from .unread import get_unread_total
+
+# Per-request navigation context: the user's role, which base template to
+# extend, the navbar avatar and the ids of the groups they belong to.
+#
+# It is worked out once and kept in the session, stamped with a per-user
+# generation that signals bump when the profile, the role or the group
+# memberships change, so ordinary page views don't query the profile. The
+# generation lives in the shared cache, so a bump from any worker reaches
+# sessions served by the others. The group ids only feed the unread badge;
+# access checks and group_list ask the database.
+# The navbar's unread badge is looked up (from cache) only by templates
+# that show it.
+
+BASE_TEMPLATES = {
+    'admin': 'base_admin.html',
+    'staff': 'base_staff.html',
+    'user': 'base_user.html',
+}
+SESSION_KEY = 'navigation'
+
+
+def role_for(user):
+    if user.is_superuser:
+        return 'admin'
+    elif user.is_staff:
+        return 'staff'
+    return 'user'
+
+
+def _generation_name(user_id):
+    return f'navigation:{user_id}'
+
+
+def invalidate_navigation(user_id):
+    bump_generation(_generation_name(user_id))
+
+
+def _build_navigation(user):
+    profile = Profile.objects.filter(user=user).only('image').first()
+    avatar_url = derivative_url(profile.image, 64) if profile and profile.image else ''
+    group_ids = set(user.custom_groups.values_list('id', flat=True))
+    group_ids.update(Group.objects.filter(group_leader=user).values_list('id', flat=True))
+    role = role_for(user)
+    return {
+        'role': role,
+        'base_template': BASE_TEMPLATES[role],
+        'avatar_url': avatar_url,
+        'group_ids': sorted(group_ids),
+    }
+
+
+def get_navigation(request):
+    if hasattr(request, '_navigation'):
+        return request._navigation
+
+    user = request.user
+    if not user.is_authenticated:
+        navigation = {'role': None, 'base_template': 'base.html', 'avatar_url': '', 'group_ids': []}
+    else:
+        generation = get_generation(_generation_name(user.id))
+        navigation = request.session.get(SESSION_KEY)
+        if not navigation or navigation.get('generation') != generation or navigation.get('user_id') != user.id:
+            navigation = _build_navigation(user)
+            navigation['generation'] = generation
+            navigation['user_id'] = user.id
+            request.session[SESSION_KEY] = navigation
+
+    request._navigation = navigation
+    return navigation
+
+
+def navigation(request):
+    nav = get_navigation(request)
+    return {
+        'base_template': nav['base_template'],
+        'user_role': nav['role'],
+        'avatar_url': nav['avatar_url'] or static('default-profile.png'),
+        'membership_group_ids': nav['group_ids'],
+        'unread_total': lambda: get_unread_total(request.user.id, nav['group_ids']) if nav['group_ids'] else 0,
+    }
@@ -0,0 +1,159 @@
+import csv
+import zlib
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Booking, GroupMessage, Task
+
+# Streaming exports of bookings, tasks and group messages.
+#
+# Rows are read in primary-key order CHUNK_SIZE at a time, each chunk a new
+# query seeking past the last id, so no cursor stays open while a slow
+# client downloads and memory stays flat however many rows there are.
+# Every chunk is encoded as CSV or NDJSON and, optionally, gzipped on the
+# fly before it is yielded.
+
+CHUNK_SIZE = 2000
+# Encoded lines joined into one response chunk (and one compress call)
+LINES_PER_CHUNK = 500
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Export:
+    def __init__(self, name, queryset, columns):
+        self.name = name
+        self.queryset = queryset
+        # (header, field path) pairs
+        self.columns = columns
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def rows(self, chunk_size=CHUNK_SIZE):
+        fields = ['id'] + [field for _, field in self.columns]
+        last_id = 0
+        while True:
+            chunk = list(self.queryset.filter(id__gt=last_id).order_by('id').values_list(*fields)[:chunk_size])
+            if not chunk:
+                return
+            for row in chunk:
+                yield row[1:]
+            last_id = chunk[-1][0]
+
+
+def _date_range(queryset, field, date_from, date_to):
+    if date_from:
+        queryset = queryset.filter(**{f'{field}__gte': date.fromisoformat(date_from)})
+    if date_to:
+        queryset = queryset.filter(**{f'{field}__lte': date.fromisoformat(date_to)})
+    return queryset
+
+
+def booking_export(date_from=None, date_to=None):
+    return Export('bookings', _date_range(Booking.objects.all(), 'due_date', date_from, date_to), [
+        ('id', 'id'),
+        ('due_date', 'due_date'),
+        ('user_id', 'booking_user_id'),
+        ('username', 'booking_user__username'),
+        ('email', 'booking_user__email'),
+        ('service_id', 'booking_service_id'),
+        ('service', 'booking_service__service_name'),
+        ('price', 'booking_service__service_price'),
+    ])
+
+
+def task_export(date_from=None, date_to=None):
+    return Export('tasks', _date_range(Task.objects.all(), 'due_date', date_from, date_to), [
+        ('id', 'id'),
+        ('title', 'title'),
+        ('due_date', 'due_date'),
+        ('scheduled_date', 'scheduled_date'),
+        ('booking_id', 'booking_id'),
+        ('service', 'booking__booking_service__service_name'),
+        ('group_id', 'booking__group_booking__group_id'),
+        ('group', 'booking__group_booking__group__group_name'),
+        ('created_at', 'created_at'),
+    ])
+
+
+def message_export(group=None):
+    messages = GroupMessage.objects.all()
+    if group:
+        messages = messages.filter(group_id=int(group))
+    return Export('messages', messages, [
+        ('id', 'id'),
+        ('group_id', 'group_id'),
+        ('group', 'group__group_name'),
+        ('sender', 'sender__username'),
+        ('timestamp', 'timestamp'),
+        ('content', 'content'),
+        ('file', 'file'),
+    ])
+
+
+EXPORTS = {
+    # name: (builder, filters it accepts)
+    'bookings': (booking_export, ('date_from', 'date_to')),
+    'tasks': (task_export, ('date_from', 'date_to')),
+    'messages': (message_export, ('group',)),
+}
+
+
+def build_export(name, **filters):
+    """The named export with the given filters; unknown or empty filters are ignored."""
+    builder, accepted = EXPORTS[name]
+    return builder(**{key: value for key, value in filters.items() if key in accepted and value})
+
+
+class _Line:
+    # csv.writer target that hands back what was written instead of storing it
+    def write(self, value):
+        return value
+
+
+def encode_csv(export):
+    writer = csv.writer(_Line())
+    yield writer.writerow(export.headers)
+    for row in export.rows():
+        yield writer.writerow(row)
+
+
+def encode_ndjson(export):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    headers = export.headers
+    for row in export.rows():
+        yield encoder.encode(dict(zip(headers, row))) + '\n'
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson,
+}
+
+
+def stream_export(export, fmt, compress=False):
+    """Yield the export as bytes chunks of CSV or NDJSON, gzipped if ``compress``."""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31: gzip container
+    lines = []
+    for line in ENCODERS[fmt](export):
+        lines.append(line)
+        if len(lines) >= LINES_PER_CHUNK:
+            data = ''.join(lines).encode()
+            lines = []
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+    data = ''.join(lines).encode()
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def export_filename(export, fmt, compress=False):
+    return f"{export.name}-{date.today():%Y%m%d}.{fmt}{'.gz' if compress else ''}"
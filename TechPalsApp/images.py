@@ -0,0 +1,120 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Resized WebP derivatives of uploaded images.
+#
+# Originals are kept as uploaded; for each one we write a WebP copy at a
+# few fixed widths as media/derivatives/<width>/<original name>.webp.
+# Generation runs in a small thread pool after the upload is committed, so
+# the request that saved the image never waits on Pillow. Until a
+# derivative exists the templates fall back to the original.
+
+DERIVATIVE_WIDTHS = (64, 320, 960)
+DERIVATIVE_DIR = 'derivatives'
+WEBP_QUALITY = 80
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-derivatives')
+
+# Derivatives that are known to exist, so templates don't stat them twice
+_existing = set()
+# Originals that are missing or not images; not worth retrying on every save
+_unusable = set()
+
+
+def derivative_name(name, width):
+    # The original extension stays in the name, so avatar.png and
+    # avatar.jpg don't share a derivative
+    return f'{DERIVATIVE_DIR}/{width}/{name}.webp'
+
+
+def pick_width(width):
+    # Smallest derivative at least as wide as asked for
+    for candidate in DERIVATIVE_WIDTHS:
+        if candidate >= width:
+            return candidate
+    return DERIVATIVE_WIDTHS[-1]
+
+
+def derivative_exists(name):
+    if name in _existing:
+        return True
+    if default_storage.exists(name):
+        _existing.add(name)
+        return True
+    return False
+
+
+def derivative_url(image, width):
+    """URL of the derivative of ``image`` for ``width`` pixels, or the original's URL."""
+    if not image:
+        return ''
+    name = derivative_name(image.name, pick_width(width))
+    if derivative_exists(name):
+        return default_storage.url(name)
+    return image.url
+
+
+def generate_derivatives(name, force=False):
+    """Write every derivative of the stored image ``name``. Returns how many were written."""
+    if not default_storage.exists(name):
+        logger.warning("Skipping derivatives for missing image %s", name)
+        _unusable.add(name)
+        return 0
+    try:
+        with default_storage.open(name, 'rb') as original:
+            source = ImageOps.exif_transpose(Image.open(original))
+            source.load()
+    except (UnidentifiedImageError, OSError):
+        logger.warning("Skipping derivatives for unreadable image %s", name)
+        _unusable.add(name)
+        return 0
+
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA' if 'A' in source.getbands() else 'RGB')
+
+    written = 0
+    for width in DERIVATIVE_WIDTHS:
+        target = derivative_name(name, width)
+        if not force and derivative_exists(target):
+            continue
+        resized = source.copy()
+        resized.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        resized.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        default_storage.save(target, ContentFile(buffer.getvalue()))
+        _existing.add(target)
+        written += 1
+    return written
+
+
+def _generate_in_background(name, on_complete):
+    try:
+        if generate_derivatives(name) and on_complete is not None:
+            on_complete()
+    except Exception:
+        logger.exception("Generating derivatives for %s failed", name)
+
+
+def schedule_derivatives(image, on_complete=None):
+    """
+    Queue derivative generation for ``image`` once the current transaction commits.
+
+    ``on_complete`` is called from the worker thread after new derivatives
+    were written, e.g. to drop cached pages that still point at the original.
+    """
+    if not image:
+        return
+    name = image.name
+    if name in _unusable or derivative_exists(derivative_name(name, DERIVATIVE_WIDTHS[-1])):
+        return
+    transaction.on_commit(lambda: _executor.submit(_generate_in_background, name, on_complete))
@@ -0,0 +1,464 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .capacity import reserve_many
+from .catalog import get_catalog
+from .models import Booking, Profile
+from .rollups import count_bookings, count_new_users
+from .skills import sync_skills_for_profiles
+
+# Bulk imports of users and bookings from CSV or JSON Lines.
+#
+# Rows are read lazily and handled in batches. For users, each batch is validated,
+# checked for existing usernames/emails with one query per field, has its
+# passwords hashed across a worker pool and is then inserted, users and
+# profiles together, in a single transaction. The import_users command
+# hashes in a process pool. Uploads through the web view are saved with
+# save_upload and imported by the 'import-users' job, which hashes on a few
+# threads (PBKDF2 releases the GIL) rather than forking from a worker
+# thread. A bad row never stops the import; it is recorded in the report
+# with its line number.
+#
+# Columns: username, email, password (optional; without one the account
+# gets an unusable password and must be reset), role (admin, staff or
+# user; defaults to user) and tech_stack (optional).
+#
+# Bookings follow the same pattern; see BookingImporter.
+
+ROLES = ('admin', 'staff', 'user')
+BATCH_SIZE = 500
+# Hashing threads for uploaded imports, run by a job worker
+UPLOAD_HASH_THREADS = 4
+# Columns of a rejected row echoed back in the error report
+USER_ERROR_COLUMNS = ('username', 'email')
+
+_username_max_length = User._meta.get_field('username').max_length
+_tech_stack_max_length = Profile._meta.get_field('tech_stack').max_length
+
+
+class RowError:
+    def __init__(self, line, values, error):
+        self.line = line
+        # The row's identifying columns, as given
+        self.values = values
+        self.error = error
+
+    def as_dict(self):
+        return {'line': self.line, **self.values, 'error': self.error}
+
+
+class ImportReport:
+    def __init__(self, columns=USER_ERROR_COLUMNS):
+        self.columns = columns
+        self.processed = 0
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, line, row, error):
+        row = row or {}
+        self.errors.append(RowError(line, {column: row.get(column, '') for column in self.columns}, error))
+
+    def write_errors(self, stream):
+        writer = csv.DictWriter(stream, fieldnames=('line',) + tuple(self.columns) + ('error',))
+        writer.writeheader()
+        for error in self.errors:
+            writer.writerow(error.as_dict())
+
+
+def detect_format(filename):
+    _, extension = os.path.splitext(filename.lower())
+    return 'jsonl' if extension in ('.jsonl', '.ndjson') else 'csv'
+
+
+def read_rows(stream, fmt):
+    """
+    Yield ``(line_number, row)`` pairs from a text stream.
+
+    ``row`` is ``None`` for a JSON line that could not be parsed.
+    """
+    if fmt == 'jsonl':
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError:
+                row = None
+            yield line, row if isinstance(row, dict) else None
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # The header is line 1
+            yield reader.line_num, row
+
+
+def open_upload(uploaded_file):
+    """Wrap an uploaded file as a text stream, tolerating a UTF-8 BOM."""
+    return io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+
+
+def save_upload(uploaded_file):
+    """Copy an uploaded file into IMPORT_UPLOAD_DIR for a job worker; returns its path."""
+    os.makedirs(settings.IMPORT_UPLOAD_DIR, exist_ok=True)
+    _, extension = os.path.splitext(uploaded_file.name.lower())
+    descriptor, path = tempfile.mkstemp(suffix=extension, dir=settings.IMPORT_UPLOAD_DIR)
+    with os.fdopen(descriptor, 'wb') as saved:
+        for chunk in uploaded_file.chunks():
+            saved.write(chunk)
+    return path
+
+
+def _clean(row):
+    if row is None:
+        raise ValidationError("Malformed JSON line")
+    username = str(row.get('username') or '').strip()
+    email = str(row.get('email') or '').strip()
+    password = row.get('password') or None
+    role = str(row.get('role') or 'user').strip().lower()
+    tech_stack = str(row.get('tech_stack') or '').strip() or None
+
+    if not username:
+        raise ValidationError("Username is required")
+    if len(username) > _username_max_length:
+        raise ValidationError(f"Username is longer than {_username_max_length} characters")
+    User.username_validator(username)
+    if not email:
+        raise ValidationError("Email is required")
+    validate_email(email)
+    if role not in ROLES:
+        raise ValidationError(f"Unknown role '{role}'")
+    if tech_stack and len(tech_stack) > _tech_stack_max_length:
+        raise ValidationError(f"Tech stack is longer than {_tech_stack_max_length} characters")
+
+    return {
+        'username': username,
+        'email': email,
+        'password': str(password) if password is not None else None,
+        'role': role,
+        'tech_stack': tech_stack,
+    }
+
+
+def _batches(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker():
+    # Hashers read settings, which a fresh (spawned) worker hasn't loaded yet
+    import django
+    django.setup()
+
+
+class UserImporter:
+    def __init__(self, batch_size=BATCH_SIZE, workers=None, threads=False, progress=None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.threads = threads
+        self.progress = progress
+        self.report = ImportReport()
+        # Usernames and lowercased emails already used earlier in the file
+        self._usernames = set()
+        self._emails = set()
+        self._executor = None
+
+    def run(self, rows):
+        try:
+            for batch in _batches(rows, self.batch_size):
+                self._import_batch(batch)
+                if self.progress is not None:
+                    self.progress(self.report)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+        # Rows are rejected at different stages of a batch; report them in file order
+        self.report.errors.sort(key=lambda error: error.line)
+        return self.report
+
+    def _validate(self, batch):
+        cleaned = []
+        for line, row in batch:
+            try:
+                values = _clean(row)
+            except ValidationError as error:
+                self.report.add_error(line, row, ' '.join(error.messages))
+                continue
+            email_key = values['email'].lower()
+            if values['username'] in self._usernames:
+                self.report.add_error(line, row, "Duplicate username in file")
+            elif email_key in self._emails:
+                self.report.add_error(line, row, "Duplicate email in file")
+            else:
+                self._usernames.add(values['username'])
+                self._emails.add(email_key)
+                cleaned.append((line, row, values))
+        return cleaned
+
+    def _drop_existing(self, cleaned):
+        if not cleaned:
+            return cleaned
+        taken_usernames = set(
+            User.objects.filter(username__in=[values['username'] for _, _, values in cleaned])
+            .values_list('username', flat=True)
+        )
+        # Matches the case-insensitive email lookup used at login (LOWER(email) index)
+        taken_emails = set(
+            User.objects.annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=[values['email'].lower() for _, _, values in cleaned])
+            .values_list('email_lower', flat=True)
+        )
+        available = []
+        for line, row, values in cleaned:
+            if values['username'] in taken_usernames:
+                self.report.add_error(line, row, "Username already taken")
+            elif values['email'].lower() in taken_emails:
+                self.report.add_error(line, row, "Email already taken")
+            else:
+                available.append((line, row, values))
+        return available
+
+    def _hash_passwords(self, passwords):
+        if self.workers == 0 or len(passwords) < 2:
+            return [make_password(password) for password in passwords]
+        workers = self.workers or os.cpu_count() or 1
+        if self._executor is None:
+            if self.threads:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import-hashing')
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(self._executor.map(make_password, passwords, chunksize=chunksize))
+
+    def _import_batch(self, batch):
+        self.report.processed += len(batch)
+        rows = self._drop_existing(self._validate(batch))
+        if not rows:
+            return
+
+        # Rows without a password get an unusable one, which costs nothing to make
+        to_hash = [values['password'] for _, _, values in rows if values['password'] is not None]
+        hashed = iter(self._hash_passwords(to_hash))
+
+        users = []
+        tech_stacks = []
+        for _, _, values in rows:
+            password = next(hashed) if values['password'] is not None else make_password(None)
+            users.append(User(
+                username=values['username'],
+                email=values['email'],
+                password=password,
+                is_staff=values['role'] in ('admin', 'staff'),
+                is_superuser=values['role'] == 'admin',
+            ))
+            tech_stacks.append(values['tech_stack'])
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=self.batch_size)
+                Profile.objects.bulk_create_for_users(
+                    users,
+                    {user.pk: {'tech_stack': tech_stack} for user, tech_stack in zip(users, tech_stacks)},
+                    batch_size=self.batch_size,
+                )
+                # bulk_create skips the signals that tag profiles with skills and count sign-ups
+                sync_skills_for_profiles(Profile.objects.filter(user__in=users).only('id', 'tech_stack'))
+                count_new_users([timezone.localdate(user.date_joined) for user in users])
+        except IntegrityError:
+            # Someone created one of these accounts after the batch was checked
+            for line, row, _ in rows:
+                self.report.add_error(line, row, "Conflicted with an account created during the import; re-run to retry")
+            return
+        self.report.created += len(users)
+
+
+def import_users(rows, batch_size=BATCH_SIZE, workers=None, threads=False, progress=None):
+    """
+    Create users and profiles from ``(line_number, row)`` pairs.
+
+    ``workers`` is the size of the password-hashing pool (``None`` for one
+    per CPU, 0 to hash in this process), made of processes unless
+    ``threads`` is set. ``progress`` is called with the running
+    :class:`ImportReport` after every batch.
+    """
+    return UserImporter(batch_size=batch_size, workers=workers, threads=threads, progress=progress).run(rows)
+
+
+# Bookings
+#
+# Columns: user (username or email), service (id or name) and due_date
+# (YYYY-MM-DD). A batch resolves all its users with one query and its
+# services from the in-memory catalog, applies make_booking's due-date rule
+# to every row at once and inserts the valid rows with bulk_create.
+
+BOOKING_BATCH_SIZE = 1000
+BOOKING_ERROR_COLUMNS = ('user', 'service', 'due_date')
+
+
+def _booking_values(row):
+    if row is None:
+        raise ValidationError("Malformed JSON line")
+    values = {column: str(row.get(column) or '').strip() for column in BOOKING_ERROR_COLUMNS}
+    for column in BOOKING_ERROR_COLUMNS:
+        if not values[column]:
+            raise ValidationError(f"{column.replace('_', ' ').capitalize()} is required")
+    return values
+
+
+class BookingImporter:
+    def __init__(self, batch_size=BOOKING_BATCH_SIZE, progress=None, today=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.today = today or timezone.localdate()
+        self.report = ImportReport(BOOKING_ERROR_COLUMNS)
+        self._catalog = get_catalog()
+        # Resolved users by username and lowercased email; None if unknown
+        self._users_by_name = {}
+        self._users_by_email = {}
+        self._services_by_name = {}
+        for service in self._catalog.services:
+            self._services_by_name.setdefault(service.service_name.lower(), []).append(service.id)
+
+    def run(self, rows):
+        for batch in _batches(rows, self.batch_size):
+            self._import_batch(batch)
+            if self.progress is not None:
+                self.progress(self.report)
+        self.report.errors.sort(key=lambda error: error.line)
+        return self.report
+
+    def _service_id(self, text):
+        if text.isdigit() and self._catalog.get(text):
+            return int(text)
+        ids = self._services_by_name.get(text.lower(), [])
+        if len(ids) > 1:
+            raise ValidationError(f"More than one service is called '{text}'; use its id")
+        if not ids:
+            raise ValidationError(f"Unknown service '{text}'")
+        return ids[0]
+
+    def _resolve_users(self, cleaned):
+        # Usernames and (case-insensitive) emails not seen in an earlier
+        # batch, all looked up in one query; clients recur across a file
+        names = {values['user'] for _, _, values in cleaned if '@' not in values['user']} - self._users_by_name.keys()
+        emails = {values['user'].lower() for _, _, values in cleaned if '@' in values['user']} - self._users_by_email.keys()
+        if not names and not emails:
+            return
+        users = User.objects.annotate(email_lower=Lower('email')).filter(
+            Q(username__in=names) | Q(email_lower__in=emails)
+        ).values_list('id', 'username', 'email_lower')
+        by_email = {}
+        for user_id, username, email in users:
+            if username in names:
+                self._users_by_name[username] = user_id
+            # Emails aren't unique; an ambiguous one can't pick a user
+            by_email[email] = None if email in by_email else user_id
+        for name in names:
+            self._users_by_name.setdefault(name, None)
+        for email in emails:
+            self._users_by_email[email] = by_email.get(email)
+
+    def _validate(self, batch):
+        cleaned = []
+        for line, row in batch:
+            try:
+                values = _booking_values(row)
+                due_date = date.fromisoformat(values['due_date'])
+                service_id = self._service_id(values['service'])
+            except ValidationError as error:
+                self.report.add_error(line, row, ' '.join(error.messages))
+                continue
+            except ValueError:
+                self.report.add_error(line, row, "Invalid due date format")
+                continue
+            cleaned.append((line, row, {**values, 'due_date': due_date, 'service_id': service_id}))
+        return cleaned
+
+    def _import_batch(self, batch):
+        self.report.processed += len(batch)
+        cleaned = self._validate(batch)
+        if not cleaned:
+            return
+        self._resolve_users(cleaned)
+
+        bookings = []
+        accepted = []
+        for line, row, values in cleaned:
+            user = values['user']
+            user_id = self._users_by_email[user.lower()] if '@' in user else self._users_by_name[user]
+            if user_id is None:
+                self.report.add_error(line, row, "Unknown or ambiguous user" if '@' in user else "Unknown user")
+            elif values['due_date'] <= self.today:
+                # Same rule as make_booking
+                self.report.add_error(line, row, "Due date cannot be today or in the past")
+            else:
+                bookings.append(Booking(
+                    booking_user_id=user_id, booking_service_id=values['service_id'], due_date=values['due_date']
+                ))
+                accepted.append((line, row))
+        if not bookings:
+            return
+
+        full = []
+        try:
+            with transaction.atomic():
+                # bulk_create skips the signals that reserve capacity and keep
+                # the dashboard rollups current
+                bookings, accepted, full = self._reserve(bookings, accepted)
+                Booking.objects.bulk_create(bookings, batch_size=self.batch_size)
+                count_bookings([(booking.booking_service_id, booking.due_date) for booking in bookings])
+        except IntegrityError:
+            # A user or service was deleted after the batch was checked
+            for line, row in accepted:
+                self.report.add_error(line, row, "Conflicted with a user or service deleted during the import; re-run to retry")
+            return
+        finally:
+            for line, row in full:
+                self.report.add_error(line, row, "The service is fully booked on that date")
+        self.report.created += len(bookings)
+
+    def _reserve(self, bookings, accepted):
+        # Reserve each (service, day) once for all its rows; when only some
+        # fit, the earliest rows in the file get the slots
+        slots = {}
+        for index, booking in enumerate(bookings):
+            slots.setdefault((booking.booking_service_id, booking.due_date), []).append(index)
+        taken = reserve_many({slot: len(indexes) for slot, indexes in slots.items()})
+        kept = set()
+        for slot, indexes in slots.items():
+            kept.update(indexes[:taken[slot]])
+        return (
+            [booking for index, booking in enumerate(bookings) if index in kept],
+            [row for index, row in enumerate(accepted) if index in kept],
+            [row for index, row in enumerate(accepted) if index not in kept],
+        )
+
+
+def import_bookings(rows, batch_size=BOOKING_BATCH_SIZE, progress=None):
+    """
+    Create bookings from ``(line_number, row)`` pairs.
+
+    ``progress`` is called with the running :class:`ImportReport` after
+    every batch.
+    """
+    return BookingImporter(batch_size=batch_size, progress=progress).run(rows)
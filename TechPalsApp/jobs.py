@@ -0,0 +1,344 @@
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, OperationalError, close_old_connections, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .imports import UPLOAD_HASH_THREADS, import_users, read_rows
+from .models import Booking, Job, TaskAssignment
+
+# Background jobs without an external broker.
+#
+# Jobs are rows in the Job table. `manage.py runworker` runs a pool of
+# threads (optionally in several processes) that claim due jobs with a
+# conditional UPDATE, so two workers never run the same job. A job that
+# raises is retried with exponential backoff until max_attempts, and a job
+# whose worker died is put back once its lock is older than LOCK_TIMEOUT.
+#
+# Register work with @job('name') and queue it with enqueue('name', ...).
+# Jobs registered with a schedule are periodic: the worker keeps exactly
+# one future run of each queued. A long job can call report_progress to
+# publish partial results through job_status while it runs.
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+LOCK_TIMEOUT = timedelta(minutes=30)
+POLL_INTERVAL_SECONDS = 2
+RETENTION = timedelta(days=7)
+CLAIM_CANDIDATES = 5
+
+logger = logging.getLogger(__name__)
+_registry = {}
+_periodic = {}
+_periodic_kwargs = {}
+_running = threading.local()
+
+
+def job(name, schedule=None, kwargs_for=None):
+    """
+    Register a function as the job ``name``.
+
+    ``schedule`` makes it periodic: a callable taking the current time and
+    returning when the next run is due, e.g. ``daily_at(8)``. ``kwargs_for``
+    maps that due time to the run's kwargs, so a run retried later still
+    works on the data it was scheduled for.
+    """
+    def decorator(func):
+        _registry[name] = func
+        if schedule is not None:
+            _periodic[name] = schedule
+            if kwargs_for is not None:
+                _periodic_kwargs[name] = kwargs_for
+        return func
+    return decorator
+
+
+def daily_at(hour, minute=0):
+    def next_run(now):
+        local = timezone.localtime(now)
+        candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= local:
+            candidate += timedelta(days=1)
+        return candidate
+    return next_run
+
+
+def enqueue(name, kwargs=None, run_at=None, max_attempts=3, unique_key=None):
+    """
+    Queue the job ``name`` with JSON-serializable ``kwargs``.
+
+    With ``unique_key``, an already queued or running job with that key is
+    returned instead of adding a second one.
+    """
+    if name not in _registry:
+        raise ValueError(f"No job registered as {name!r}")
+    new_job = Job(
+        name=name,
+        kwargs=kwargs or {},
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts,
+        unique_key=unique_key,
+    )
+    if unique_key is None:
+        new_job.save()
+        return new_job
+    try:
+        with transaction.atomic():
+            new_job.save()
+        return new_job
+    except IntegrityError:
+        return Job.objects.get(unique_key=unique_key, status__in=[Job.QUEUED, Job.RUNNING])
+
+
+def job_status(job_id):
+    """A JSON-ready summary of one job, or None if it doesn't exist."""
+    found = Job.objects.filter(id=job_id).first()
+    if found is None:
+        return None
+    return {
+        'id': found.id,
+        'name': found.name,
+        'status': found.status,
+        'attempts': found.attempts,
+        'max_attempts': found.max_attempts,
+        'run_at': found.run_at.isoformat(),
+        'finished_at': found.finished_at.isoformat() if found.finished_at else None,
+        'last_error': found.last_error.strip().splitlines()[-1] if found.last_error else '',
+        'result': found.result,
+    }
+
+
+def job_counts():
+    counts = dict.fromkeys([status for status, _ in Job.STATUS_CHOICES], 0)
+    counts.update(Job.objects.values_list('status').annotate(count=Count('id')))
+    return counts
+
+
+def report_progress(progress):
+    """Store ``progress`` as the result of the job running on this thread, if any."""
+    job_id = getattr(_running, 'job_id', None)
+    if job_id is not None:
+        Job.objects.filter(id=job_id).update(result=progress)
+
+
+def ensure_periodic(names=None):
+    """Make sure each periodic job has its next run queued."""
+    now = timezone.now()
+    for name in names or _periodic:
+        run_at = _periodic[name](now)
+        kwargs = _periodic_kwargs[name](run_at) if name in _periodic_kwargs else None
+        enqueue(name, kwargs, run_at=run_at, unique_key=f'periodic:{name}')
+
+
+def recover_stale():
+    """Requeue jobs whose worker stopped mid-run; fail them if they are out of attempts."""
+    cutoff = timezone.now() - LOCK_TIMEOUT
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=timezone.now(), last_error='Worker stopped while running the job', locked_by=''
+    )
+    return stale.update(status=Job.QUEUED, run_at=timezone.now(), locked_by='', locked_at=None)
+
+
+def claim_next(worker_id):
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by('run_at', 'id')
+        .values_list('id', flat=True)[:CLAIM_CANDIDATES]
+    )
+    for job_id in candidates:
+        # Only one worker's UPDATE can still see the job as queued
+        claimed = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    # Jitter, so jobs that failed together don't all retry together
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def run_job(claimed):
+    func = _registry.get(claimed.name)
+    try:
+        if func is None:
+            raise LookupError(f"No job registered as {claimed.name!r}")
+        _running.job_id = claimed.id
+        try:
+            result = func(**claimed.kwargs)
+        finally:
+            _running.job_id = None
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if claimed.attempts < claimed.max_attempts:
+            logger.warning("Job %s #%s failed (attempt %s); retrying", claimed.name, claimed.id, claimed.attempts)
+            Job.objects.filter(id=claimed.id).update(
+                status=Job.QUEUED, run_at=now + retry_delay(claimed.attempts),
+                last_error=error, locked_by='', locked_at=None,
+            )
+        else:
+            logger.error("Job %s #%s failed after %s attempts", claimed.name, claimed.id, claimed.attempts)
+            Job.objects.filter(id=claimed.id).update(
+                status=Job.FAILED, finished_at=now, last_error=error, locked_by='', locked_at=None,
+            )
+    else:
+        Job.objects.filter(id=claimed.id).update(
+            status=Job.SUCCEEDED, finished_at=timezone.now(), result=result, locked_by='', locked_at=None,
+        )
+    if claimed.name in _periodic:
+        ensure_periodic([claimed.name])
+
+
+class Worker:
+    def __init__(self, threads=4, poll_interval=POLL_INTERVAL_SECONDS, stop_when_empty=False):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.stop_when_empty = stop_when_empty
+        self.stopping = threading.Event()
+
+    def run(self):
+        recover_stale()
+        ensure_periodic()
+        connection.close()
+        workers = [
+            threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True)
+            for i in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        try:
+            for thread in workers:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            # Let running jobs finish; don't claim new ones
+            self.stopping.set()
+            for thread in workers:
+                thread.join()
+
+    def _loop(self):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    claimed = claim_next(worker_id)
+                except OperationalError:
+                    # SQLite busy with another writer; try again shortly
+                    claimed = None
+                if claimed is None:
+                    if self.stop_when_empty:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                run_job(claimed)
+        finally:
+            connection.close()
+
+
+# Jobs
+
+REMINDER_DAYS_AHEAD = 1
+
+
+def reminder_kwargs(run_at):
+    return {'day': (timezone.localdate(run_at) + timedelta(days=REMINDER_DAYS_AHEAD)).isoformat()}
+
+
+@job('send-due-reminders', schedule=daily_at(8), kwargs_for=reminder_kwargs)
+def send_due_reminders(day=None):
+    """
+    Email staff about tasks, and clients about bookings, due on ``day`` (default: tomorrow).
+
+    Each message is sent on its own, so one rejected address doesn't fail
+    the job; failures are listed in the result rather than retried, as a
+    retry would send every other reminder again.
+    """
+    day = date.fromisoformat(day) if day else timezone.localdate() + timedelta(days=REMINDER_DAYS_AHEAD)
+    sender = settings.DEFAULT_FROM_EMAIL
+    messages = []
+
+    task_rows = TaskAssignment.objects.filter(due_date=day).exclude(member__email='').values_list(
+        'member__email', 'member__username', 'task__title', 'group__group_name'
+    )
+    for email, username, title, group_name in task_rows.iterator():
+        messages.append(EmailMessage(
+            f"Task due {day:%b %d}: {title}",
+            f"Hi {username},\n\nThe task \"{title}\" for {group_name} is due on {day:%A, %b %d}.\n",
+            sender,
+            [email],
+        ))
+
+    booking_rows = Booking.objects.filter(due_date=day).exclude(booking_user__email='').values_list(
+        'booking_user__email', 'booking_user__username', 'booking_service__service_name'
+    )
+    for email, username, service_name in booking_rows.iterator():
+        messages.append(EmailMessage(
+            f"Your {service_name} booking is due {day:%b %d}",
+            f"Hi {username},\n\nYour booking for {service_name} is due on {day:%A, %b %d}.\n",
+            sender,
+            [email],
+        ))
+
+    sent = 0
+    failed = []
+    if messages:
+        # One connection for the batch; if it can't be opened nothing was
+        # sent and the whole job is safe to retry
+        with get_connection(fail_silently=False) as mail:
+            for message in messages:
+                try:
+                    sent += mail.send_messages([message])
+                except Exception as error:
+                    logger.warning("Reminder to %s failed: %s", message.to[0], error)
+                    failed.append({'to': message.to[0], 'subject': message.subject, 'error': str(error)})
+    return {'day': day.isoformat(), 'sent': sent, 'failed': failed}
+
+
+# Rejected rows kept in an import job's result; the rest are only counted
+IMPORT_ERRORS_SHOWN = 200
+
+
+def import_summary(report):
+    return {
+        'processed': report.processed,
+        'created': report.created,
+        'rejected': len(report.errors),
+        'errors': [error.as_dict() for error in report.errors[:IMPORT_ERRORS_SHOWN]],
+    }
+
+
+@job('import-users')
+def import_users_upload(path, fmt):
+    """Import the users in an upload saved by imports.save_upload, then delete it."""
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            report = import_users(
+                read_rows(stream, fmt), workers=UPLOAD_HASH_THREADS, threads=True,
+                progress=lambda report: report_progress(import_summary(report)),
+            )
+    finally:
+        os.remove(path)
+    return import_summary(report)
+
+
+@job('prune-jobs', schedule=daily_at(3))
+def prune_jobs():
+    """Delete finished jobs older than RETENTION."""
+    cutoff = timezone.now() - RETENTION
+    deleted, _ = Job.objects.filter(status__in=[Job.SUCCEEDED, Job.FAILED], finished_at__lt=cutoff).delete()
+    return {'deleted': deleted}
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+
+from .catalog import get_catalog
+from .models import Booking, Group
+
+# Typeahead lookups for form pickers.
+#
+# Forms no longer render every user, booking or group into a <select>;
+# a picker asks one of these for the first few matches of what was typed.
+# Each lookup is a prefix match that seeks on a LOWER(...) index and stops
+# after LOOKUP_LIMIT rows, so it costs the same however big the table is.
+# Results are (id, label) pairs. The users page searches with the same
+# prefix_match.
+
+LOOKUP_LIMIT = 20
+# Usernames whose bookings are searched when looking up bookings by user
+BOOKING_USER_CANDIDATES = 50
+
+
+def prefix_match(field, text):
+    """
+    Q matching rows whose ``field`` starts with ``text``, ignoring case.
+
+    ``LOWER(field) >= 'abc' AND LOWER(field) < 'abd'`` can seek on an
+    index over ``LOWER(field)``; ``istartswith`` can't.
+    """
+    low = text.lower()
+    high = low[:-1] + chr(ord(low[-1]) + 1)
+    return Q(GreaterThanOrEqual(Lower(field), low), LessThan(Lower(field), high))
+
+
+def lookup_users(text, staff_only=False, limit=LOOKUP_LIMIT):
+    users = User.objects.filter(prefix_match('username', text))
+    if staff_only:
+        users = users.filter(is_staff=True)
+    return list(users.order_by(Lower('username')).values_list('id', 'username')[:limit])
+
+
+def lookup_groups(text, limit=LOOKUP_LIMIT):
+    groups = Group.objects.filter(prefix_match('group_name', text)).order_by(Lower('group_name'))
+    return list(groups.values_list('id', 'group_name')[:limit])
+
+
+def lookup_services(text, limit=LOOKUP_LIMIT):
+    # The catalog is already in memory
+    text = text.lower()
+    matches = [service for service in get_catalog().services if service.service_name.lower().startswith(text)]
+    matches.sort(key=lambda service: service.service_name.lower())
+    return [(service.id, service.service_name) for service in matches[:limit]]
+
+
+def booking_label(booking_id, service_name, username, due_date):
+    return f"#{booking_id} {service_name} | {username} | due {due_date:%b %d, %Y}"
+
+
+def lookup_bookings(text, limit=LOOKUP_LIMIT):
+    """Bookings by id, or by the prefix of their client's username or service name; latest due first."""
+    bookings = Booking.objects.order_by('-due_date', '-id').values_list(
+        'id', 'booking_service__service_name', 'booking_user__username', 'due_date'
+    )
+    if text.lstrip('#').isdigit():
+        rows = list(bookings.filter(id=int(text.lstrip('#'))))
+    else:
+        user_ids = [user_id for user_id, _ in lookup_users(text, limit=BOOKING_USER_CANDIDATES)]
+        rows = list(bookings.filter(booking_user_id__in=user_ids)[:limit]) if user_ids else []
+        # A popular service has far more bookings than a handful of clients,
+        # so each one is read newest first off its (service, due_date) index
+        # and stops at the limit instead of sorting them all
+        for service_id, _ in lookup_services(text, limit=limit):
+            rows.extend(bookings.filter(booking_service_id=service_id)[:limit])
+        rows = sorted(set(rows), key=lambda row: (row[3], row[0]), reverse=True)[:limit]
+    return [(row[0], booking_label(*row)) for row in rows]
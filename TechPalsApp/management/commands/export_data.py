@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from TechPalsApp.exports import EXPORTS, FORMATS, build_export, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream bookings, tasks or group messages as CSV or NDJSON, optionally gzipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS), help="What to export.")
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help="Compress the output.")
+        parser.add_argument('--output', '-o', help="File to write; stdout by default.")
+        parser.add_argument('--from', dest='date_from', help="Bookings and tasks due on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', help="Bookings and tasks due on or before this date (YYYY-MM-DD).")
+        parser.add_argument('--group', help="Only this group's messages.")
+
+    def handle(self, *args, **options):
+        try:
+            export = build_export(
+                options['name'], date_from=options['date_from'], date_to=options['date_to'], group=options['group']
+            )
+        except ValueError as e:
+            raise CommandError(f"Invalid filter: {e}")
+
+        stream = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in stream_export(export, options['format'], compress=options['gzip']):
+                stream.write(chunk)
+        finally:
+            if options['output']:
+                stream.close()
+            else:
+                stream.flush()
@@ -0,0 +1,39 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from TechPalsApp.images import generate_derivatives
+from TechPalsApp.models import Post, Profile
+
+
+def _generate(name, force):
+    return name, generate_derivatives(name, force=force)
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP derivatives for existing blog and profile images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Number of worker processes.")
+        parser.add_argument('--force', action='store_true', help="Regenerate derivatives that already exist.")
+
+    def handle(self, *args, **options):
+        names = set(Post.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True))
+        names.update(Profile.objects.exclude(image='').values_list('image', flat=True))
+        names = sorted(names)
+        self.stdout.write(f"Processing {len(names)} images with {options['workers']} workers...")
+
+        # Workers only touch files; don't let them inherit an open DB connection
+        connections.close_all()
+
+        written = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(_generate, name, options['force']) for name in names]
+            for done, future in enumerate(as_completed(futures), start=1):
+                name, count = future.result()
+                written += count
+                if count:
+                    self.stdout.write(f"[{done}/{len(names)}] {name}: {count} derivatives")
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} derivatives for {len(names)} images."))
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from TechPalsApp.imports import BOOKING_BATCH_SIZE, detect_format, import_bookings, read_rows
+
+
+class Command(BaseCommand):
+    help = "Create bookings in bulk from a CSV or JSON Lines file with user, service and due_date columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a header row) or .jsonl file to import.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format; guessed from the extension by default.")
+        parser.add_argument('--batch-size', type=int, default=BOOKING_BATCH_SIZE, help="Rows checked and inserted per transaction.")
+        parser.add_argument('--errors', help="Write rejected rows to this CSV file instead of stderr.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+
+        def progress(report):
+            self.stdout.write(f"{report.processed} rows processed, {report.created} created, {len(report.errors)} rejected")
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                report = import_bookings(read_rows(stream, fmt), batch_size=options['batch_size'], progress=progress)
+        except OSError as error:
+            raise CommandError(f"Could not read {options['path']}: {error}")
+
+        if report.errors:
+            if options['errors']:
+                with open(options['errors'], 'w', newline='') as stream:
+                    report.write_errors(stream)
+                self.stdout.write(f"Wrote {len(report.errors)} rejected rows to {options['errors']}")
+            else:
+                report.write_errors(sys.stderr)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report.created} bookings from {report.processed} rows ({len(report.errors)} rejected)."
+        ))
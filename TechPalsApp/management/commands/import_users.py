@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from TechPalsApp.imports import BATCH_SIZE, detect_format, import_users, read_rows
+
+
+class Command(BaseCommand):
+    help = "Create users and profiles in bulk from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a header row) or .jsonl file to import.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format; guessed from the extension by default.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows checked and inserted per transaction.")
+        parser.add_argument('--workers', type=int, default=None, help="Password hashing processes (default: one per CPU, 0 for none).")
+        parser.add_argument('--errors', help="Write rejected rows to this CSV file instead of stderr.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+
+        def progress(report):
+            self.stdout.write(f"{report.processed} rows processed, {report.created} created, {len(report.errors)} rejected")
+
+        # Hashing workers don't need the parent's DB connection
+        connections.close_all()
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                report = import_users(
+                    read_rows(stream, fmt),
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    progress=progress,
+                )
+        except OSError as error:
+            raise CommandError(f"Could not read {options['path']}: {error}")
+
+        if report.errors:
+            if options['errors']:
+                with open(options['errors'], 'w', newline='') as stream:
+                    report.write_errors(stream)
+                self.stdout.write(f"Wrote {len(report.errors)} rejected rows to {options['errors']}")
+            else:
+                report.write_errors(sys.stderr)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report.created} users from {report.processed} rows ({len(report.errors)} rejected)."
+        ))
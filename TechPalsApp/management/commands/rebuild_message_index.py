@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from TechPalsApp.search import REBUILD_BATCH_SIZE, fts_enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for group chat messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            self.stdout.write(self.style.WARNING("Full-text index is only used on SQLite; nothing to do."))
+            return
+
+        def progress(count):
+            self.stdout.write(f"Indexed {count} messages...")
+
+        total = rebuild_index(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt message index with {total} messages."))
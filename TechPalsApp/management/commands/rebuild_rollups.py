@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from TechPalsApp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recount the daily KPI and revenue rollups from users, bookings, tasks and group bookings."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = rebuild_rollups()
+        for table, count in written.items():
+            self.stdout.write(f"{table}: {count} rows")
+        self.stdout.write(self.style.SUCCESS("Rebuilt rollups."))
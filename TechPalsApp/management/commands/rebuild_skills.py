@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from TechPalsApp.models import Profile, Skill
+from TechPalsApp.skills import sync_skills_for_profiles
+
+
+class Command(BaseCommand):
+    help = "Re-derive every profile's skill tags from its tech stack."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--prune', action='store_true', help="Delete skills no profile or service uses any more.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        profiles = Profile.objects.order_by('id').only('id', 'tech_stack')
+        total = 0
+        last_id = 0
+        while True:
+            batch = list(profiles.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                total += sync_skills_for_profiles(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Tagged {total} profiles...")
+
+        if options['prune']:
+            deleted, _ = Skill.objects.filter(profiles__isnull=True, services__isnull=True).delete()
+            self.stdout.write(f"Pruned {deleted} unused skills.")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt skills for {total} profiles."))
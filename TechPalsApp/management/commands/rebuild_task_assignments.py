@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from TechPalsApp.assignments import rebuild_assignments
+from TechPalsApp.models import Task, TaskAssignment
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized task assignment index from tasks, group bookings and group members."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_assignments(Task.objects.all())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {TaskAssignment.objects.count()} task assignments."))
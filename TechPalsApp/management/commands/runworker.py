@@ -0,0 +1,53 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# The jobs module imports models, so it is only imported once Django is set
+# up: in handle(), and in _process_main() for spawned worker processes.
+
+
+def _process_main(threads, poll_interval, stop_when_empty):
+    import django
+    django.setup()
+    from TechPalsApp.jobs import Worker
+    Worker(threads, poll_interval, stop_when_empty).run()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (reminders, maintenance) until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Jobs run at once per process.")
+        parser.add_argument('--processes', type=int, default=1, help="Worker processes to start, each with --threads threads.")
+        parser.add_argument('--poll-interval', type=float, default=None, help="Seconds to wait when no job is due.")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due instead of waiting for more.")
+
+    def handle(self, *args, **options):
+        from TechPalsApp.jobs import POLL_INTERVAL_SECONDS, Worker, job_counts
+
+        threads, processes = options['threads'], options['processes']
+        if threads < 1 or processes < 1:
+            raise CommandError("--threads and --processes must be at least 1.")
+        poll_interval = options['poll_interval'] or POLL_INTERVAL_SECONDS
+
+        self.stdout.write(f"Starting {processes} process(es) x {threads} thread(s); queue: {job_counts()}")
+        if processes == 1:
+            Worker(threads, poll_interval, options['once']).run()
+        else:
+            # Children open their own connections
+            connections.close_all()
+            children = [
+                multiprocessing.Process(target=_process_main, args=(threads, poll_interval, options['once']))
+                for _ in range(processes)
+            ]
+            for child in children:
+                child.start()
+            try:
+                for child in children:
+                    child.join()
+            except KeyboardInterrupt:
+                # Children got the same SIGINT and finish their running jobs
+                for child in children:
+                    child.join()
+        self.stdout.write(self.style.SUCCESS(f"Worker stopped; queue: {job_counts()}"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from TechPalsApp.scheduling import apply_plan, plan_tasks
+
+
+class Command(BaseCommand):
+    help = "Plan open tasks across groups earliest deadline first and optionally apply the plan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help="Write the plan back instead of only reporting it.")
+        parser.add_argument('--replan', action='store_true', help="Place every booking afresh instead of only moving overloaded ones.")
+
+    def handle(self, *args, **options):
+        plan = plan_tasks(keep_assignments=not options['replan'])
+
+        for overload in plan.overloads_before:
+            self.stdout.write(
+                f"Overloaded: {overload.group_name} has {overload.demand} tasks due by {overload.due_date}, "
+                f"can finish {overload.capacity}"
+            )
+        for move in plan.moves:
+            self.stdout.write(
+                f"Booking #{move.booking_id} ({len(move.task_ids)} tasks): "
+                f"{plan.group_name(move.from_group_id) or 'unassigned'} -> {plan.group_name(move.to_group_id) or 'unassigned'}"
+            )
+        self.stdout.write(
+            f"{len(plan.schedule)} tasks planned, {len(plan.moves)} bookings to move, "
+            f"{len(plan.late_task_ids)} late, {len(plan.overloads_after)} overloads remaining."
+        )
+
+        if options['apply']:
+            moved, created, rescheduled = apply_plan(plan)
+            self.stdout.write(self.style.SUCCESS(
+                f"Applied: {moved} bookings moved, {created} assigned, {rescheduled} tasks rescheduled."
+            ))
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.db.models import Q
+
+from .caching import bump_generation, get_generation, versioned_key
+from .models import Group
+
+# Cached group membership index.
+#
+# For each group we keep the leader and a set of member ids, so chat access
+# checks are a set lookup instead of loading every member row. The entry is
+# keyed by a per-group generation bumped from signals whenever the members,
+# the leader or a member's username change. The cache is shared between
+# workers (settings.CACHES), so a bump in one is seen by all; writes still
+# re-check membership in the database with is_member.
+
+MEMBERSHIP_TIMEOUT = 60 * 60
+
+
+class GroupMembership:
+    def __init__(self, group_id, leader_id, leader_username, members):
+        self.group_id = group_id
+        self.leader_id = leader_id
+        self.leader_username = leader_username
+        # (id, username) pairs, ordered by username for display
+        self.members = members
+        self.member_ids = frozenset(member_id for member_id, _ in members)
+
+    def can_access(self, user):
+        # Leader and members only; being an admin doesn't open a chat
+        return user.id == self.leader_id or user.id in self.member_ids
+
+    @property
+    def member_names(self):
+        return [username for _, username in self.members]
+
+
+def _generation_name(group_id):
+    return f'group-membership:{group_id}'
+
+
+def invalidate_membership(group_id):
+    bump_generation(_generation_name(group_id))
+
+
+def membership_version(group_id):
+    """A value that changes whenever the group's members or leader change."""
+    return get_generation(_generation_name(group_id))
+
+
+def _load_membership(group_id):
+    group = Group.objects.filter(id=group_id).values('group_leader_id', 'group_leader__username').first()
+    if group is None:
+        return None
+    members = list(
+        Group.group_members.through.objects.filter(group_id=group_id)
+        .order_by('user__username')
+        .values_list('user_id', 'user__username')
+    )
+    return GroupMembership(group_id, group['group_leader_id'], group['group_leader__username'], members)
+
+
+def get_membership(group_id):
+    """Return the ``GroupMembership`` for ``group_id``, or None if the group doesn't exist."""
+    key = versioned_key(f'group-membership:{group_id}', _generation_name(group_id))
+    membership = cache.get(key)
+    if membership is None:
+        membership = _load_membership(group_id)
+        if membership is None:
+            return None
+        cache.set(key, membership, MEMBERSHIP_TIMEOUT)
+    return membership
+
+
+def is_member(group_id, user_id):
+    """Whether the user leads or belongs to the group, read from the database."""
+    return Group.objects.filter(id=group_id).filter(Q(group_leader_id=user_id) | Q(group_members=user_id)).exists()
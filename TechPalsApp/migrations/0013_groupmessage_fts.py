@@ -0,0 +1,34 @@
+from django.db import migrations
+
+FTS_TABLE = 'TechPalsApp_groupmessage_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 is SQLite only; other databases use the icontains fallback
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" '
+        "USING fts5(content, group_id UNINDEXED, tokenize='porter unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO "{FTS_TABLE}" (rowid, content, group_id) '
+        'SELECT id, content, group_id FROM "TechPalsApp_groupmessage"'
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS "{FTS_TABLE}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0012_groupmessage_group_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
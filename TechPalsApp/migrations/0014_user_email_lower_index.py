@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import migrations
+
+INDEX_NAME = 'user_email_lower_idx'
+
+
+def _user_table(apps):
+    app_label, model_name = settings.AUTH_USER_MODEL.split('.')
+    return apps.get_model(app_label, model_name)._meta.db_table
+
+
+def create_index(apps, schema_editor):
+    # Backs the case-insensitive email lookup in EmailOrUsernameModelBackend
+    table = schema_editor.quote_name(_user_table(apps))
+    schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON {table} (LOWER(email))')
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0013_groupmessage_fts'),
+        # Run after every auth_user table rebuild, which would drop the index on SQLite
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:39
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+USER_INDEXES = {
+    # Prefix search on the users page
+    'user_username_lower_idx': '(LOWER(username))',
+    # Users page order: admins, staff, clients, newest first
+    'user_role_joined_idx': '(is_superuser, is_staff, date_joined, id)',
+}
+
+
+def _user_table(apps):
+    app_label, model_name = settings.AUTH_USER_MODEL.split('.')
+    return apps.get_model(app_label, model_name)._meta.db_table
+
+
+def create_indexes(apps, schema_editor):
+    table = schema_editor.quote_name(_user_table(apps))
+    for name, columns in USER_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} {columns}')
+
+
+def drop_indexes(apps, schema_editor):
+    for name in USER_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0014_user_email_lower_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(django.db.models.functions.text.Lower('tech_stack'), name='profile_tech_stack_lower_idx'),
+        ),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
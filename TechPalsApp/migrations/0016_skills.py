@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:42
+
+import re
+
+from django.db import migrations, models
+
+# A frozen copy of TechPalsApp.skills.parse_skills as of this migration, so
+# later changes to the app's parsing don't change what this migration does
+SEPARATORS = re.compile(r'[,;/|&\n]|\band\b')
+ALIASES = {
+    'js': 'javascript',
+    'ts': 'typescript',
+    'py': 'python',
+    'reactjs': 'react',
+    'react.js': 'react',
+    'vuejs': 'vue',
+    'vue.js': 'vue',
+    'node.js': 'node',
+    'nodejs': 'node',
+    'postgres': 'postgresql',
+    'golang': 'go',
+    'k8s': 'kubernetes',
+    'ml': 'machine learning',
+}
+SKILL_NAME_LENGTH = 50
+
+
+def parse_skills(text):
+    names = []
+    for part in SEPARATORS.split(text or ''):
+        name = ' '.join(part.lower().split()).strip(' .-')
+        name = ALIASES.get(name, name)
+        if name and len(name) <= SKILL_NAME_LENGTH and name not in names:
+            names.append(name)
+    return names
+
+
+def tag_existing_profiles(apps, schema_editor):
+    Profile = apps.get_model('TechPalsApp', 'Profile')
+    Skill = apps.get_model('TechPalsApp', 'Skill')
+    names_by_profile = {
+        profile_id: parse_skills(tech_stack)
+        for profile_id, tech_stack in Profile.objects.exclude(tech_stack__isnull=True).values_list('id', 'tech_stack')
+    }
+    names = sorted({name for names in names_by_profile.values() for name in names})
+    Skill.objects.bulk_create([Skill(name=name) for name in names], ignore_conflicts=True)
+    ids = dict(Skill.objects.values_list('name', 'id'))
+    Through = Profile.skills.through
+    Through.objects.bulk_create(
+        [Through(profile_id=profile_id, skill_id=ids[name]) for profile_id, names in names_by_profile.items() for name in names],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0015_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Skill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='skills',
+            field=models.ManyToManyField(blank=True, related_name='profiles', to='TechPalsApp.skill'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='skills',
+            field=models.ManyToManyField(blank=True, related_name='services', to='TechPalsApp.skill'),
+        ),
+        migrations.RunPython(tag_existing_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0016_skills'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='daily_capacity',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='scheduled_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_assignments(apps, schema_editor):
+    Task = apps.get_model('TechPalsApp', 'Task')
+    Group = apps.get_model('TechPalsApp', 'Group')
+    TaskAssignment = apps.get_model('TechPalsApp', 'TaskAssignment')
+    members = {}
+    for group_id, user_id in Group.group_members.through.objects.values_list('group_id', 'user_id'):
+        members.setdefault(group_id, []).append(user_id)
+    rows = Task.objects.filter(booking__group_booking__isnull=False).values_list(
+        'id', 'booking__group_booking__group_id', 'due_date'
+    )
+    TaskAssignment.objects.bulk_create(
+        [
+            TaskAssignment(task_id=task_id, group_id=group_id, member_id=member_id, due_date=due_date)
+            for task_id, group_id, due_date in rows
+            for member_id in members.get(group_id, ())
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0017_task_scheduling'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_date', models.DateField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['due_date', 'id'], name='task_due_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='taskassignment',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_assignments', to='TechPalsApp.group'),
+        ),
+        migrations.AddField(
+            model_name='taskassignment',
+            name='member',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_assignments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='taskassignment',
+            name='task',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='TechPalsApp.task'),
+        ),
+        migrations.AddIndex(
+            model_name='taskassignment',
+            index=models.Index(fields=['member', 'due_date', 'task'], name='taskassignment_member_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskassignment',
+            constraint=models.UniqueConstraint(fields=('task', 'member'), name='taskassignment_task_member_uniq'),
+        ),
+        migrations.RunPython(fill_assignments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    app_label, model_name = settings.AUTH_USER_MODEL.split('.')
+    User = apps.get_model(app_label, model_name)
+    Booking = apps.get_model('TechPalsApp', 'Booking')
+    Task = apps.get_model('TechPalsApp', 'Task')
+    GroupBooking = apps.get_model('TechPalsApp', 'GroupBooking')
+    DailyRollup = apps.get_model('TechPalsApp', 'DailyRollup')
+    ServiceDailyRollup = apps.get_model('TechPalsApp', 'ServiceDailyRollup')
+    GroupDailyRollup = apps.get_model('TechPalsApp', 'GroupDailyRollup')
+
+    days = {}
+    users = User.objects.annotate(day=TruncDate('date_joined')).values_list('day').annotate(count=Count('id'))
+    for day, count in users:
+        days.setdefault(day, DailyRollup(day=day)).new_users = count
+    for day, count in Booking.objects.values_list('due_date').annotate(count=Count('id')):
+        days.setdefault(day, DailyRollup(day=day)).bookings = count
+    for day, count in Task.objects.values_list('due_date').annotate(count=Count('id')):
+        days.setdefault(day, DailyRollup(day=day)).tasks_due = count
+    DailyRollup.objects.bulk_create(days.values(), batch_size=1000)
+
+    services = Booking.objects.values_list('booking_service_id', 'due_date').annotate(
+        count=Count('id'), revenue=Sum('booking_service__service_price')
+    )
+    ServiceDailyRollup.objects.bulk_create(
+        [
+            ServiceDailyRollup(service_id=service_id, day=day, bookings=count, revenue=revenue)
+            for service_id, day, count, revenue in services
+        ],
+        batch_size=1000,
+    )
+    groups = GroupBooking.objects.values_list('group_id', 'due_date').annotate(count=Count('id'))
+    GroupDailyRollup.objects.bulk_create(
+        [GroupDailyRollup(group_id=group_id, day=day, bookings=count) for group_id, day, count in groups],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0019_job_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('new_users', models.IntegerField(default=0)),
+                ('bookings', models.IntegerField(default=0)),
+                ('tasks_due', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GroupDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='TechPalsApp.group')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'group'], name='group_rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('group', 'day'), name='group_rollup_unique_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='TechPalsApp.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'service'], name='service_rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('service', 'day'), name='service_rollup_unique_day')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
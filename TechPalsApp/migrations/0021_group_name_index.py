@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:55
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0020_kpi_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(django.db.models.functions.text.Lower('group_name'), name='group_name_lower_idx'),
+        ),
+    ]
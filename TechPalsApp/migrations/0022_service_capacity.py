@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_service_days(apps, schema_editor):
+    # Existing services have no capacity, so every counter starts unlimited
+    Booking = apps.get_model('TechPalsApp', 'Booking')
+    ServiceDay = apps.get_model('TechPalsApp', 'ServiceDay')
+    counts = Booking.objects.values_list('booking_service_id', 'due_date').annotate(count=Count('id'))
+    ServiceDay.objects.bulk_create(
+        [ServiceDay(service_id=service_id, day=day, booked=count) for service_id, day, count in counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0021_group_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='daily_capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ServiceDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('capacity', models.PositiveIntegerField(blank=True, null=True)),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='TechPalsApp.service')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('service', 'day'), name='service_day_unique')],
+            },
+        ),
+        migrations.RunPython(fill_service_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def fill_read_states(apps, schema_editor):
+    # Existing members and leaders start with the history marked as read
+    Group = apps.get_model('TechPalsApp', 'Group')
+    GroupReadState = apps.get_model('TechPalsApp', 'GroupReadState')
+    latest = dict(Group.objects.annotate(latest=Max('messages__id')).values_list('id', 'latest'))
+    readers = set(Group.group_members.through.objects.values_list('group_id', 'user_id'))
+    readers.update(Group.objects.filter(group_leader__isnull=False).values_list('id', 'group_leader_id'))
+    GroupReadState.objects.bulk_create(
+        [
+            GroupReadState(group_id=group_id, user_id=user_id, last_read_id=latest.get(group_id) or 0)
+            for group_id, user_id in readers
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0022_service_capacity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.PositiveBigIntegerField(default=0)),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='TechPalsApp.group')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'group'), name='group_read_state_unique')],
+            },
+        ),
+        migrations.RunPython(fill_read_states, migrations.RunPython.noop),
+    ]
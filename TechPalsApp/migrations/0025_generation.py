@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TechPalsApp', '0024_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Generation',
+            fields=[
+                ('name', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField()),
+            ],
+        ),
+        # The cache moved out of this database (see sqlite_cache.py)
+        migrations.RunSQL('DROP TABLE IF EXISTS techpals_cache', migrations.RunSQL.noop),
+    ]
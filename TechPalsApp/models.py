@@ -1,26 +1,105 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from datetime import date
 from django.utils import timezone
 from django.utils.text import slugify
+from django.db.models.functions import Lower
+from .caching import BLOG_GENERATION, bump_generation
 
 
 # Create your models here.
 
+class ProfileManager(models.Manager):
+    def bulk_create_for_users(self, users, values_by_user=None, batch_size=500):
+        """
+        Create profiles for many users in one INSERT per batch.
+
+        Used when users are provisioned with ``User.objects.bulk_create``,
+        which skips the post_save signal that normally creates the profile.
+        ``values_by_user`` maps a user id to extra field values.
+        """
+        values_by_user = values_by_user or {}
+        profiles = [Profile(user=user, **values_by_user.get(user.pk, {})) for user in users]
+        return self.bulk_create(profiles, batch_size=batch_size, ignore_conflicts=True)
+
+
+class Skill(models.Model):
+    # Normalized, lowercase tag parsed from a profile's tech_stack (see skills.py)
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     image = models.ImageField(upload_to='profile_pics/', default='default.jpg')
     tech_stack = models.CharField(max_length=100, blank=True, null=True)
+    skills = models.ManyToManyField(Skill, blank=True, related_name='profiles')
+
+    objects = ProfileManager()
+
+    class Meta:
+        indexes = [
+            # Prefix search on the users page compares LOWER(tech_stack) ranges
+            models.Index(Lower('tech_stack'), name='profile_tech_stack_lower_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} Profile"
+
+    # Dirty-field tracking, so syncing a profile only writes what changed
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def _current_values(self):
+        values = {}
+        for field in self._meta.concrete_fields:
+            if field.attname in self.get_deferred_fields():
+                continue
+            value = getattr(self, field.attname)
+            # Compare files by their stored name, not the FieldFile object
+            values[field.attname] = value.name if isinstance(value, models.fields.files.FieldFile) else value
+        return values
+
+    def _snapshot(self):
+        self._saved_values = self._current_values()
+
+    def get_dirty_fields(self):
+        saved = getattr(self, '_saved_values', None)
+        if saved is None or self._state.adding:
+            return [field.attname for field in self._meta.concrete_fields if not field.primary_key]
+        current = self._current_values()
+        return [name for name, value in current.items() if name in saved and saved[name] != value]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot()
+
+    def save_if_dirty(self):
+        """Save only the changed fields; returns False without a query if nothing changed."""
+        if self._state.adding:
+            self.save()
+            return True
+        dirty = self.get_dirty_fields()
+        if not dirty:
+            return False
+        self.save(update_fields=dirty)
+        return True
     
 class Service(models.Model):
     service_name = models.CharField(max_length=100)
     service_description = models.TextField()
     service_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Skills a group needs to deliver the service; used to recommend groups
+    skills = models.ManyToManyField(Skill, blank=True, related_name='services')
+    # Bookings the service takes per due date; blank for no limit
+    daily_capacity = models.PositiveIntegerField(null=True, blank=True)
     
     def __str__(self):
         return f"{self.service_name} - {self.service_price}"
@@ -45,6 +124,30 @@ class Booking(models.Model):
     booking_service = models.ForeignKey('Service', on_delete=models.CASCADE)
     due_date = models.DateField()
 
+    class Meta:
+        indexes = [
+            # Back the keyset-paginated booking list filtered by user or service
+            models.Index(fields=['booking_user', 'due_date'], name='booking_user_due_idx'),
+            models.Index(fields=['booking_service', 'due_date'], name='booking_service_due_idx'),
+            models.Index(fields=['due_date', 'id'], name='booking_due_id_idx'),
+        ]
+
+    def clean(self):
+        # capacity.py imports the models, so it is imported on use
+        from .capacity import check_slot
+        super().clean()
+        # Refuse a full day here so forms and the admin show it as a field error
+        if self.booking_service_id and self.due_date:
+            check_slot(self)
+
+    def save(self, *args, **kwargs):
+        # The service-day slot is taken in the same transaction as the row,
+        # so a day that filled up after clean() still refuses the booking
+        from .capacity import take_slot
+        with transaction.atomic():
+            take_slot(self)
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Booking for {self.booking_service.service_name} by {self.booking_user.username}"
 
@@ -71,6 +174,14 @@ class Task(models.Model):
     due_date = models.DateField()
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='tasks')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Day the scheduler planned the task to be worked on, on or before due_date
+    scheduled_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Admin task list: upcoming tasks in due-date order, keyset paginated
+            models.Index(fields=['due_date', 'id'], name='task_due_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} for {self.booking.booking_service.service_name}"
@@ -99,6 +210,14 @@ class Group(models.Model):
         limit_choices_to={'is_staff': True},  # Only staff can be leader
         related_name='led_groups'
     )
+    # Tasks the group can complete per day; used by the task scheduler
+    daily_capacity = models.PositiveSmallIntegerField(default=3)
+
+    class Meta:
+        indexes = [
+            # Typeahead prefix search on group names
+            models.Index(Lower('group_name'), name='group_name_lower_idx'),
+        ]
 
     def __str__(self):
         return self.group_name
@@ -119,6 +238,26 @@ class GroupBooking(models.Model):
     def __str__(self):
         return f"{self.booking} assigned to {self.group.group_name}"
 
+class TaskAssignment(models.Model):
+    # Denormalized (task, group, member, due date) rows so a staff member's
+    # task list is one index range scan. Maintained by signals and
+    # assignments.py; never edited directly.
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='assignments')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='task_assignments')
+    member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_assignments')
+    due_date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'member'], name='taskassignment_task_member_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['member', 'due_date', 'task'], name='taskassignment_member_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} for {self.member}"
+
 class GroupMessage(models.Model):
     group = models.ForeignKey(Group, related_name='messages', on_delete=models.CASCADE)
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -126,9 +265,44 @@ class GroupMessage(models.Model):
     file = models.FileField(upload_to='group_messages_files/', blank=True, null=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Chat polling reads "messages in group X after id N" as a range scan
+            models.Index(fields=['group', 'id'], name='groupmessage_group_id_idx'),
+        ]
+
     def __str__(self):
         return f"Message by {self.sender} in {self.group}"
 
+    def as_dict(self):
+        # Shape shared by the JSON delta endpoint and the push stream
+        return {
+            'id': self.id,
+            'sender_id': self.sender_id,
+            'sender': self.sender.username,
+            'content': self.content,
+            'file_url': self.file.url if self.file else None,
+            'file_name': self.file.name if self.file else None,
+            'timestamp': self.timestamp.isoformat(),
+        }
+
+
+class GroupReadState(models.Model):
+    # How far a member has read a group's chat, and how many messages from
+    # others came after that. Kept current by unread.py; never counted on read.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='group_read_states')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='read_states')
+    last_read_id = models.PositiveBigIntegerField(default=0)
+    unread = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'group'], name='group_read_state_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.group_id}: {self.unread} unread"
+
 
 class GroupReport(models.Model):
     group_booking = models.OneToOneField(GroupBooking, on_delete=models.CASCADE)
@@ -174,6 +348,136 @@ class Post(models.Model):
         if not self.excerpt:
             self.excerpt = self.content[:150]  # first 150 chars as excerpt
         super().save(*args, **kwargs)
+        # Drop cached blog pages and sidebar fragments
+        bump_generation(BLOG_GENERATION)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        bump_generation(BLOG_GENERATION)
+        return result
+
+    def __str__(self):
+        return self.title
+
+
+class Job(models.Model):
+    # Background job queue kept in the main database; see jobs.py
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Only one queued or running job may hold a given key (dedupe, periodic jobs)
+    unique_key = models.CharField(max_length=200, null=True, blank=True)
+    locked_by = models.CharField(max_length=200, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for "queued and due", oldest first
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unique_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='job_active_unique_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+# Daily KPI rollups for the admin dashboard. Kept current by signals and
+# rollups.py; never edited directly.
+
+class DailyRollup(models.Model):
+    day = models.DateField(unique=True)
+    new_users = models.IntegerField(default=0)
+    bookings = models.IntegerField(default=0)
+    # Tasks falling due that day
+    tasks_due = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.bookings} bookings, {self.new_users} new users"
+
+
+class ServiceDailyRollup(models.Model):
+    # Bookings of a service due on a day; revenue is bookings x the current price
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    bookings = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'day'], name='service_rollup_unique_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'service'], name='service_rollup_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.service_id} on {self.day}: {self.bookings}"
+
+
+class GroupDailyRollup(models.Model):
+    # Bookings a group delivers on a day (GroupBooking.due_date)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    bookings = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'day'], name='group_rollup_unique_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'group'], name='group_rollup_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.group_id} on {self.day}: {self.bookings}"
+
+
+class ServiceDay(models.Model):
+    # Bookings of a service due on a day, against that day's capacity (copied
+    # from Service.daily_capacity when the row is created; None for no
+    # limit). Reserved and released by capacity.py, never counted on read.
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='days')
+    day = models.DateField()
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'day'], name='service_day_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.service_id} on {self.day}: {self.booked}/{self.capacity or '-'}"
+
+
+class Generation(models.Model):
+    # Cache invalidation counter; bumped atomically by caching.py
+    name = models.CharField(max_length=200, primary_key=True)
+    value = models.BigIntegerField()
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"{self.name}: {self.value}"
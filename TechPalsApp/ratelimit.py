@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import math
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+# Token-bucket rate limiting shared by every worker process on the machine.
+#
+# Buckets live in a small SQLite file in WAL mode. Taking a token is one
+# UPSERT ... RETURNING statement, which SQLite runs atomically, so several
+# gunicorn/uvicorn workers can share limits without Redis.
+#
+# RATE_LIMITS maps a URL name to a list of (identity, rate) rules. The
+# identity is one of:
+#   'ip'            the client address
+#   'session'       the raw session cookie (the session itself is never loaded)
+#   'field:<name>'  a POST field, e.g. the login identifier
+# and a rate is '<count>/<s|m|h|d>'. Only POSTs are limited.
+
+UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+CLEANUP_EVERY = 1000
+STALE_AFTER_SECONDS = 60 * 60 * 24
+
+
+def parse_rate(rate):
+    """'5/m' -> (capacity 5, refill of 5 tokens per 60 seconds expressed per second)."""
+    count, unit = rate.split('/')
+    count = int(count)
+    return count, count / UNITS[unit[0]]
+
+
+class BucketStore:
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS bucket ('
+                ' key TEXT PRIMARY KEY,'
+                ' tokens REAL NOT NULL,'
+                ' updated REAL NOT NULL,'
+                ' allowed INTEGER NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, refill_rate):
+        """
+        Take one token from ``key``'s bucket.
+
+        Returns ``(allowed, retry_after_seconds)``.
+        """
+        now = time.time()
+        # In the UPDATE branch every expression sees the row's old values, so
+        # "allowed" and the new token count are computed from the same refill.
+        refilled = 'MIN(:capacity, tokens + (:now - updated) * :rate)'
+        row = self._connection().execute(
+            'INSERT INTO bucket (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1) '
+            'ON CONFLICT(key) DO UPDATE SET '
+            f' allowed = {refilled} >= 1,'
+            f' tokens = CASE WHEN {refilled} >= 1 THEN {refilled} - 1 ELSE {refilled} END,'
+            ' updated = :now '
+            'RETURNING allowed, tokens',
+            {'key': key, 'capacity': capacity, 'rate': refill_rate, 'now': now},
+        ).fetchone()
+
+        self._calls += 1
+        if self._calls % CLEANUP_EVERY == 0:
+            self._connection().execute('DELETE FROM bucket WHERE updated < ?', (now - STALE_AFTER_SECONDS,))
+
+        allowed, tokens = row
+        if allowed:
+            return True, 0
+        return False, math.ceil((1 - tokens) / refill_rate)
+
+
+def client_ip(request):
+    if getattr(settings, 'RATE_LIMIT_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def identity_value(request, identity):
+    if identity == 'ip':
+        return client_ip(request)
+    if identity == 'session':
+        cookie = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        # Without a session there is nothing to post as; fall back to the address
+        return hashlib.sha256(cookie.encode()).hexdigest() if cookie else f'ip:{client_ip(request)}'
+    if identity.startswith('field:'):
+        return request.POST.get(identity[len('field:'):], '').strip().lower()
+    raise ValueError(f"Unknown rate limit identity: {identity}")
+
+
+class RateLimitMiddleware:
+    """
+    Reject over-limit POSTs with 429 before the session is loaded or the
+    view runs. Place it above SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rules = {
+            route: [(identity, *parse_rate(rate)) for identity, rate in rules]
+            for route, rules in getattr(settings, 'RATE_LIMITS', {}).items()
+        }
+        path = getattr(settings, 'RATE_LIMIT_DB', None)
+        self.store = BucketStore(path) if path and self.rules else None
+
+    def __call__(self, request):
+        if self.store is not None and request.method == 'POST':
+            rejected = self.check(request)
+            if rejected is not None:
+                return rejected
+        return self.get_response(request)
+
+    def check(self, request):
+        try:
+            route = resolve(request.path_info).url_name
+        except Resolver404:
+            return None
+        rules = self.rules.get(route)
+        if not rules:
+            return None
+
+        for identity, capacity, refill_rate in rules:
+            value = identity_value(request, identity)
+            if not value:
+                continue
+            key = f'{route}:{identity}:{value}'
+            try:
+                allowed, retry_after = self.store.take(key, capacity, refill_rate)
+            except sqlite3.Error:
+                # Never lock users out because the limiter's store is unavailable
+                logger.exception("Rate limit store unavailable")
+                return None
+            if not allowed:
+                logger.warning("rate_limited route=%s identity=%s", route, identity)
+                response = HttpResponse("Too many requests. Please try again later.", status=429)
+                response['Retry-After'] = str(retry_after)
+                return response
+        return None
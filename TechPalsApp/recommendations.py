@@ -0,0 +1,113 @@
+from datetime import date, timedelta
+
+from django.db.models import Count, Q
+
+from .models import Group, Task
+from .skills import skills_in_text
+
+# Group recommendations for task assignment.
+#
+# Every group is scored for a booking's service from three signals:
+#   skill overlap     share of the service's skills covered by the group's
+#                     members and leader
+#   open-task load    tasks not yet due that are assigned to the group
+#   leader available  the group has an active leader who isn't swamped by
+#                     tasks due soon across all the groups they lead
+#
+# The data comes from a fixed number of aggregate queries whatever the
+# number of groups. The group x skill matrix is restricted to the service's
+# skills in SQL and held as one bitset per group, so each group's overlap
+# is an AND and a popcount.
+
+SKILL_WEIGHT = 0.6
+LOAD_WEIGHT = 0.25
+LEADER_WEIGHT = 0.15
+LEADER_WINDOW_DAYS = 7
+
+
+class GroupScore:
+    def __init__(self, group_id, group_name, leader_username, skill_overlap, open_tasks, leader_available, score):
+        self.group_id = group_id
+        self.group_name = group_name
+        self.leader_username = leader_username
+        self.skill_overlap = skill_overlap
+        self.open_tasks = open_tasks
+        self.leader_available = leader_available
+        self.score = score
+
+    def as_dict(self):
+        return {
+            'group_id': self.group_id,
+            'group_name': self.group_name,
+            'leader': self.leader_username,
+            'skill_overlap': round(self.skill_overlap, 3),
+            'open_tasks': self.open_tasks,
+            'leader_available': round(self.leader_available, 3),
+            'score': round(self.score, 3),
+        }
+
+
+def service_skill_ids(service):
+    """The service's tagged skills, or known skills named in its name and description."""
+    ids = list(service.skills.values_list('id', flat=True))
+    if ids:
+        return ids
+    return skills_in_text(f'{service.service_name} {service.service_description}')
+
+
+def _skill_masks(skill_ids):
+    # Bit i of a group's mask is set when someone in the group has skill_ids[i]
+    bits = {skill_id: 1 << i for i, skill_id in enumerate(skill_ids)}
+    masks = {}
+    if not bits:
+        return masks
+    members = Group.group_members.through.objects.filter(
+        user__profile__skills__in=skill_ids
+    ).values_list('group_id', 'user__profile__skills')
+    leaders = Group.objects.filter(
+        group_leader__profile__skills__in=skill_ids
+    ).values_list('id', 'group_leader__profile__skills')
+    for rows in (members, leaders):
+        for group_id, skill_id in rows:
+            masks[group_id] = masks.get(group_id, 0) | bits[skill_id]
+    return masks
+
+
+def _task_counts(today):
+    # Open tasks per group, and how many of them fall due within the window
+    soon = today + timedelta(days=LEADER_WINDOW_DAYS)
+    rows = (
+        Task.objects.filter(due_date__gte=today, booking__group_booking__isnull=False)
+        .values_list('booking__group_booking__group_id')
+        .annotate(open=Count('id'), soon=Count('id', filter=Q(due_date__lte=soon)))
+    )
+    return {group_id: (open_count, soon_count) for group_id, open_count, soon_count in rows}
+
+
+def rank_groups(service, today=None, limit=None):
+    """Score every group for ``service``; best first."""
+    today = today or date.today()
+    skill_ids = service_skill_ids(service)
+    wanted = len(skill_ids)
+    masks = _skill_masks(skill_ids)
+    counts = _task_counts(today)
+    groups = list(Group.objects.values_list(
+        'id', 'group_name', 'group_leader_id', 'group_leader__username', 'group_leader__is_active'
+    ))
+
+    # Tasks due soon for each leader, summed over every group they lead
+    leader_load = {}
+    for group_id, _, leader_id, _, _ in groups:
+        if leader_id:
+            leader_load[leader_id] = leader_load.get(leader_id, 0) + counts.get(group_id, (0, 0))[1]
+
+    scores = []
+    for group_id, group_name, leader_id, leader_username, leader_active in groups:
+        overlap = masks.get(group_id, 0).bit_count() / wanted if wanted else 0.0
+        open_tasks = counts.get(group_id, (0, 0))[0]
+        available = 1 / (1 + leader_load[leader_id]) if leader_id and leader_active else 0.0
+        score = SKILL_WEIGHT * overlap + LOAD_WEIGHT / (1 + open_tasks) + LEADER_WEIGHT * available
+        scores.append(GroupScore(group_id, group_name, leader_username, overlap, open_tasks, available, score))
+
+    scores.sort(key=lambda item: (-item.score, item.group_name))
+    return scores[:limit] if limit else scores
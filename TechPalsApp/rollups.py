@@ -0,0 +1,280 @@
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .caching import bump_generation, versioned_key
+from .models import Booking, DailyRollup, GroupBooking, GroupDailyRollup, Service, ServiceDailyRollup, Task
+
+# Daily KPI rollups.
+#
+# Bookings, tasks, group bookings and sign-ups are counted into small
+# per-day tables as they are written, so the admin dashboard sums a few
+# hundred rollup rows instead of scanning Booking and Task. Signals call
+# the count_* functions for single saves and deletes; code that writes
+# with bulk operations or queryset updates, which skip signals, calls them
+# itself. Each function takes (key..., day) rows and a +1/-1 sign. Counts
+# going up are added with one INSERT ... ON CONFLICT DO UPDATE per
+# UPSERT_ROWS keys, which creates missing rows in the same statement;
+# counts going down take one UPDATE per key and never create a row.
+#
+# Service revenue is kept as bookings x the service's current price, so a
+# price change rewrites that service's rows (reprice_service). Revenue
+# reports sum those rows over a date range: a year is 365 rows per service
+# however many bookings there are.
+#
+# rebuild_rollups recounts everything from the source tables, for when
+# rows were written around the counters (raw SQL, fixtures, restores).
+
+ROLLUP_GENERATION = 'rollups'
+DASHBOARD_DAYS = 30
+DASHBOARD_TOP = 10
+UPCOMING_TASK_DAYS = 7
+DASHBOARD_CACHE_SECONDS = 60 * 60
+REVENUE_PERIODS = ('day', 'month')
+REBUILD_BATCH_SIZE = 1000
+# Keys added per INSERT ... ON CONFLICT statement
+UPSERT_ROWS = 200
+
+
+def _upsert(model, key_fields, fields, rows):
+    # Add to many rows at once; rows are (key values..., delta values...)
+    # tuples in key_fields + fields order, with every delta positive. Other
+    # columns of a new row take their field defaults.
+    opts = model._meta
+    qn = connection.ops.quote_name
+    given = [opts.get_field(name) for name in key_fields + fields]
+    defaults = [field for field in opts.concrete_fields if not field.primary_key and field not in given]
+    columns = ', '.join(qn(field.column) for field in given + defaults)
+    keys = ', '.join(qn(opts.get_field(name).column) for name in key_fields)
+    updates = ', '.join(
+        f'{column} = {qn(opts.db_table)}.{column} + excluded.{column}'
+        for column in (qn(opts.get_field(name).column) for name in fields)
+    )
+    placeholders = '(' + ', '.join(['%s'] * (len(given) + len(defaults))) + ')'
+    default_params = [field.get_db_prep_save(field.get_default(), connection) for field in defaults]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_ROWS):
+            chunk = rows[start:start + UPSERT_ROWS]
+            params = []
+            for row in chunk:
+                params.extend(field.get_db_prep_save(value, connection) for field, value in zip(given, row))
+                params.extend(default_params)
+            cursor.execute(
+                f'INSERT INTO {qn(opts.db_table)} ({columns}) VALUES {", ".join([placeholders] * len(chunk))} '
+                f'ON CONFLICT({keys}) DO UPDATE SET {updates}',
+                params,
+            )
+
+
+def _add(model, key_fields, fields, rows, sign):
+    # rows are (key values..., counts...) tuples; sign applies to the counts
+    if sign > 0:
+        _upsert(model, key_fields, fields, rows)
+        return
+    # A missing row went with a deleted service or group; there is nothing
+    # to take away from
+    for row in rows:
+        keys = dict(zip(key_fields, row))
+        model.objects.filter(**keys).update(**{
+            field: F(field) + sign * value for field, value in zip(fields, row[len(key_fields):])
+        })
+
+
+def _count_days(model, field, days, sign):
+    _add(model, ('day',), (field,), list(Counter(days).items()), sign)
+
+
+def count_new_users(days, sign=1):
+    """Count users who joined on ``days`` (one date per user)."""
+    _count_days(DailyRollup, 'new_users', days, sign)
+    bump_generation(ROLLUP_GENERATION)
+
+
+def count_tasks(days, sign=1):
+    """Count tasks due on ``days`` (one date per task)."""
+    _count_days(DailyRollup, 'tasks_due', days, sign)
+    bump_generation(ROLLUP_GENERATION)
+
+
+def count_bookings(rows, sign=1):
+    """Count bookings given as ``(service id, due date)`` rows."""
+    counts = Counter(rows)
+    prices = dict(Service.objects.filter(id__in={service_id for service_id, _ in counts}).values_list('id', 'service_price'))
+    _add(ServiceDailyRollup, ('service_id', 'day'), ('bookings', 'revenue'), [
+        (service_id, day, count, count * prices[service_id])
+        for (service_id, day), count in counts.items()
+        # A service being deleted takes its rows with it
+        if service_id in prices
+    ], sign)
+    _count_days(DailyRollup, 'bookings', [day for _, day in rows], sign)
+    bump_generation(ROLLUP_GENERATION)
+
+
+def count_group_bookings(rows, sign=1):
+    """Count group bookings given as ``(group id, due date)`` rows."""
+    _add(GroupDailyRollup, ('group_id', 'day'), ('bookings',), [
+        (group_id, day, count) for (group_id, day), count in Counter(rows).items()
+    ], sign)
+    bump_generation(ROLLUP_GENERATION)
+
+
+def reprice_service(service_id, price):
+    ServiceDailyRollup.objects.filter(service_id=service_id).update(revenue=F('bookings') * price)
+    bump_generation(ROLLUP_GENERATION)
+
+
+def rebuild_rollups():
+    """
+    Replace every rollup row with counts taken from users, bookings, tasks
+    and group bookings. Run it in a transaction; returns the rows written
+    per table.
+    """
+    days = {}
+    users = User.objects.annotate(day=TruncDate('date_joined')).values_list('day').annotate(count=Count('id'))
+    for day, count in users:
+        days.setdefault(day, DailyRollup(day=day)).new_users = count
+    for day, count in Booking.objects.values_list('due_date').annotate(count=Count('id')):
+        days.setdefault(day, DailyRollup(day=day)).bookings = count
+    for day, count in Task.objects.values_list('due_date').annotate(count=Count('id')):
+        days.setdefault(day, DailyRollup(day=day)).tasks_due = count
+    services = [
+        ServiceDailyRollup(service_id=service_id, day=day, bookings=count, revenue=revenue)
+        for service_id, day, count, revenue in Booking.objects.values_list('booking_service_id', 'due_date').annotate(
+            count=Count('id'), revenue=Sum('booking_service__service_price')
+        )
+    ]
+    groups = [
+        GroupDailyRollup(group_id=group_id, day=day, bookings=count)
+        for group_id, day, count in GroupBooking.objects.values_list('group_id', 'due_date').annotate(count=Count('id'))
+    ]
+
+    written = {}
+    for model, rows in ((DailyRollup, days.values()), (ServiceDailyRollup, services), (GroupDailyRollup, groups)):
+        model.objects.all().delete()
+        written[model.__name__] = len(model.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE))
+    bump_generation(ROLLUP_GENERATION)
+    return written
+
+
+def _money(value):
+    # SQLite sums decimals as floats
+    return Decimal(value or 0).quantize(Decimal('0.01'))
+
+
+def revenue_report(start, end, service_id=None, period='day'):
+    """
+    Bookings and revenue due between ``start`` and ``end`` (inclusive),
+    from the service rollups: totals, one entry per service and one per
+    day or month that had bookings.
+    """
+    rows = ServiceDailyRollup.objects.filter(day__gte=start, day__lte=end, bookings__gt=0)
+    if service_id is not None:
+        rows = rows.filter(service_id=service_id)
+
+    totals = rows.aggregate(bookings=Sum('bookings'), revenue=Sum('revenue'))
+    services = (
+        rows.values('service_id', name=F('service__service_name'))
+        .annotate(bookings=Sum('bookings'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'name')
+    )
+    periods = (
+        rows.annotate(period=TruncMonth('day') if period == 'month' else F('day'))
+        .values('period')
+        .annotate(bookings=Sum('bookings'), revenue=Sum('revenue'))
+        .order_by('period')
+    )
+    return {
+        'from': start,
+        'to': end,
+        'period': period,
+        'bookings': totals['bookings'] or 0,
+        'revenue': _money(totals['revenue']),
+        'services': [{**row, 'revenue': _money(row['revenue'])} for row in services],
+        'periods': [
+            {'start': row['period'], 'bookings': row['bookings'], 'revenue': _money(row['revenue'])}
+            for row in periods
+        ],
+    }
+
+
+def _series(rows, start, end, field):
+    by_day = {row['day']: row[field] for row in rows}
+    days = []
+    day = start
+    while day <= end:
+        days.append({'day': day, 'value': by_day.get(day, 0)})
+        day += timedelta(days=1)
+    peak = max([item['value'] for item in days] + [1])
+    for item in days:
+        item['percent'] = round(100 * item['value'] / peak)
+    return days
+
+
+def _with_percent(rows, field):
+    peak = max([row[field] for row in rows] + [1])
+    for row in rows:
+        row['percent'] = round(100 * row[field] / peak)
+    return rows
+
+
+def dashboard_metrics(today=None):
+    """KPIs for the admin dashboard, from the rollup tables only."""
+    today = today or timezone.localdate()
+    start = today - timedelta(days=DASHBOARD_DAYS - 1)
+    soon = today + timedelta(days=UPCOMING_TASK_DAYS)
+
+    totals = DailyRollup.objects.aggregate(
+        users=Sum('new_users'),
+        bookings=Sum('bookings'),
+        past_due=Sum('tasks_due', filter=Q(day__lt=today)),
+        upcoming=Sum('tasks_due', filter=Q(day__gte=today, day__lte=soon)),
+    )
+    revenue = ServiceDailyRollup.objects.aggregate(
+        total=Sum('revenue'), recent=Sum('revenue', filter=Q(day__gte=start, day__lte=today)),
+    )
+    daily = list(DailyRollup.objects.filter(day__gte=start, day__lte=today).values('day', 'new_users', 'bookings'))
+    services = list(
+        ServiceDailyRollup.objects.values('service_id', name=F('service__service_name'))
+        .annotate(bookings_total=Sum('bookings'), revenue_total=Sum('revenue'))
+        .order_by('-revenue_total', 'name')[:DASHBOARD_TOP]
+    )
+    groups = list(
+        GroupDailyRollup.objects.filter(day__gte=start, day__lte=today)
+        .values('group_id', name=F('group__group_name'))
+        .annotate(delivered=Sum('bookings'))
+        .filter(delivered__gt=0)
+        .order_by('-delivered', 'name')[:DASHBOARD_TOP]
+    )
+
+    return {
+        'today': today,
+        'days': DASHBOARD_DAYS,
+        'total_users': totals['users'] or 0,
+        'total_bookings': totals['bookings'] or 0,
+        'total_revenue': revenue['total'] or 0,
+        'recent_revenue': revenue['recent'] or 0,
+        'past_due_tasks': totals['past_due'] or 0,
+        'upcoming_tasks': totals['upcoming'] or 0,
+        'new_users_series': _series(daily, start, today, 'new_users'),
+        'bookings_series': _series(daily, start, today, 'bookings'),
+        'services': _with_percent(services, 'revenue_total'),
+        'groups': _with_percent(groups, 'delivered'),
+    }
+
+
+def get_dashboard_metrics():
+    """dashboard_metrics() served from cache until a rollup changes or the day turns."""
+    today = timezone.localdate()
+    key = f'{versioned_key("dashboard", ROLLUP_GENERATION)}:{today.isoformat()}'
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = dashboard_metrics(today)
+        cache.set(key, metrics, DASHBOARD_CACHE_SECONDS)
+    return metrics
@@ -0,0 +1,280 @@
+import heapq
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from .assignments import rebuild_for_bookings
+from .models import Group, GroupBooking, Task
+from .rollups import count_group_bookings
+
+# Deadline-aware task scheduling across groups.
+#
+# A group with daily_capacity c can finish at most c * n tasks in the next
+# n days, so it is overloaded when, for some date, more of its open tasks
+# are due by then than that. The planner walks bookings earliest deadline
+# first (all tasks of a booking go to the booking's group) and keeps a
+# min-heap of groups keyed by the day their next task would be finished.
+# A booking stays with its current group while that group can still meet
+# its deadlines; otherwise it goes to the group that can finish it
+# soonest. Each task also gets the day it is planned to be worked on.
+#
+# Everything is loaded in two queries and written back with bulk updates,
+# so re-planning thousands of tasks is a single pass.
+
+WRITE_BATCH_SIZE = 500
+
+
+def _finish_day(assigned, capacity):
+    # 1-based day on which the next task for a group would be finished
+    return assigned // capacity + 1
+
+
+class Overload:
+    def __init__(self, group_id, group_name, due_date, demand, capacity):
+        self.group_id = group_id
+        self.group_name = group_name
+        self.due_date = due_date
+        # Open tasks due on or before due_date, against what can be done by then
+        self.demand = demand
+        self.capacity = capacity
+
+
+class Move:
+    def __init__(self, booking_id, task_ids, from_group_id, to_group_id):
+        self.booking_id = booking_id
+        self.task_ids = task_ids
+        self.from_group_id = from_group_id
+        self.to_group_id = to_group_id
+
+
+class Plan:
+    def __init__(self, today, groups):
+        self.today = today
+        # id -> (name, daily capacity)
+        self.groups = groups
+        self.assignments = {}
+        self.schedule = {}
+        self.moves = []
+        self.late_task_ids = []
+        self.overloads_before = []
+        self.overloads_after = []
+        self._due_dates = {}
+        self._current_schedule = {}
+        self._has_group_booking = set()
+
+    def group_name(self, group_id):
+        return self.groups[group_id][0] if group_id in self.groups else None
+
+    @property
+    def changed_task_ids(self):
+        return [task_id for task_id, day in self.schedule.items() if self._current_schedule.get(task_id) != day]
+
+
+def load_open_tasks(today):
+    """(task id, booking id, due date, scheduled date, current group id) for every open task."""
+    return list(
+        Task.objects.filter(due_date__gte=today)
+        .values_list('id', 'booking_id', 'due_date', 'scheduled_date', 'booking__group_booking__group_id')
+    )
+
+
+def load_groups():
+    return {
+        group_id: (name, capacity)
+        for group_id, name, capacity in Group.objects.values_list('id', 'group_name', 'daily_capacity')
+    }
+
+
+def find_overloads(tasks, groups, today):
+    """Overloaded (group, date) points for ``(due_date, group_id)`` pairs."""
+    deadlines = {}
+    for due_date, group_id in tasks:
+        if group_id is not None:
+            deadlines.setdefault(group_id, []).append(due_date)
+
+    overloads = []
+    for group_id, dates in deadlines.items():
+        name, capacity = groups.get(group_id, ('', 0))
+        dates.sort()
+        for i, due_date in enumerate(dates):
+            # Report each date once, after the last task due that day
+            if i + 1 < len(dates) and dates[i + 1] == due_date:
+                continue
+            can_finish = capacity * ((due_date - today).days + 1)
+            if i + 1 > can_finish:
+                overloads.append(Overload(group_id, name, due_date, i + 1, can_finish))
+    overloads.sort(key=lambda item: (item.due_date, item.group_name))
+    return overloads
+
+
+def group_overload(group_id, due_date, extra=1, today=None):
+    """The overload ``group_id`` would have at ``due_date`` after taking ``extra`` more tasks, or None."""
+    today = today or date.today()
+    group = Group.objects.filter(id=group_id).values_list('group_name', 'daily_capacity').first()
+    if group is None:
+        return None
+    demand = Task.objects.filter(
+        booking__group_booking__group_id=group_id, due_date__gte=today, due_date__lte=due_date
+    ).count() + extra
+    can_finish = group[1] * ((due_date - today).days + 1)
+    if demand > can_finish:
+        return Overload(group_id, group[0], due_date, demand, can_finish)
+    return None
+
+
+def plan_tasks(today=None, keep_assignments=True):
+    """
+    Plan every open task. Returns a :class:`Plan`; nothing is written.
+
+    With ``keep_assignments`` bookings only move when their current group
+    can't meet their deadlines; without it every booking is placed afresh.
+    """
+    today = today or date.today()
+    groups = load_groups()
+    rows = load_open_tasks(today)
+    plan = Plan(today, groups)
+    plan.overloads_before = find_overloads([(due, group_id) for _, _, due, _, group_id in rows], groups, today)
+
+    bookings = {}
+    current_group = {}
+    for task_id, booking_id, due_date, scheduled_date, group_id in rows:
+        bookings.setdefault(booking_id, []).append((due_date, task_id))
+        current_group[booking_id] = group_id
+        plan._current_schedule[task_id] = scheduled_date
+        if group_id is not None:
+            plan._has_group_booking.add(booking_id)
+
+    capacity = {group_id: cap for group_id, (_, cap) in groups.items() if cap > 0}
+    assigned = dict.fromkeys(capacity, 0)
+    group_heap = [(1, group_id) for group_id in capacity]
+    heapq.heapify(group_heap)
+
+    booking_heap = []
+    for booking_id, tasks in bookings.items():
+        tasks.sort()
+        booking_heap.append((tasks[0][0], booking_id))
+    heapq.heapify(booking_heap)
+
+    def fits(group_id, tasks):
+        done = assigned[group_id]
+        return all(
+            _finish_day(done + i, capacity[group_id]) <= (due_date - today).days + 1
+            for i, (due_date, _) in enumerate(tasks)
+        )
+
+    def pick_group(tasks):
+        # Pop groups in order of their next finish day while they could still
+        # make the first deadline; the first one that fits the whole booking wins
+        first_deadline = (tasks[0][0] - today).days + 1
+        popped = []
+        choice = None
+        while group_heap:
+            key, group_id = heapq.heappop(group_heap)
+            if key != _finish_day(assigned[group_id], capacity[group_id]):
+                continue  # Stale entry; the fresh one is still in the heap
+            popped.append(group_id)
+            if key > first_deadline:
+                break
+            if fits(group_id, tasks):
+                choice = group_id
+                break
+        for group_id in popped:
+            heapq.heappush(group_heap, (_finish_day(assigned[group_id], capacity[group_id]), group_id))
+        if choice is None and popped:
+            # Nobody can make it in time; the group that finishes soonest is least late
+            choice = popped[0]
+        return choice
+
+    while booking_heap:
+        _, booking_id = heapq.heappop(booking_heap)
+        tasks = bookings[booking_id]
+        current = current_group[booking_id]
+
+        if keep_assignments and current in capacity and fits(current, tasks):
+            group_id = current
+        else:
+            group_id = pick_group(tasks)
+            if group_id is None:
+                # No group has any capacity; leave the booking where it is
+                group_id = current
+
+        plan.assignments[booking_id] = group_id
+        plan._due_dates[booking_id] = tasks[0][0]
+        if group_id != current:
+            plan.moves.append(Move(booking_id, [task_id for _, task_id in tasks], current, group_id))
+        if group_id not in capacity:
+            continue
+
+        key = _finish_day(assigned[group_id], capacity[group_id])
+        for due_date, task_id in tasks:
+            day = today + timedelta(days=_finish_day(assigned[group_id], capacity[group_id]) - 1)
+            plan.schedule[task_id] = day
+            if day > due_date:
+                plan.late_task_ids.append(task_id)
+            assigned[group_id] += 1
+        # Keys only grow, so the group's older heap entry is now recognisably stale
+        if _finish_day(assigned[group_id], capacity[group_id]) != key:
+            heapq.heappush(group_heap, (_finish_day(assigned[group_id], capacity[group_id]), group_id))
+
+    plan.overloads_after = find_overloads(
+        [(due, plan.assignments.get(booking_id)) for _, booking_id, due, _, _ in rows], groups, today
+    )
+    return plan
+
+
+def _update_grouped(queryset, field, ids_by_value):
+    # One UPDATE per distinct value (a few dates or groups) instead of a
+    # CASE expression per row, in chunks to stay under SQL variable limits
+    for value, ids in ids_by_value.items():
+        for start in range(0, len(ids), WRITE_BATCH_SIZE):
+            queryset.filter(id__in=ids[start:start + WRITE_BATCH_SIZE]).update(**{field: value})
+
+
+def apply_plan(plan):
+    """
+    Write a plan back: move or create GroupBookings, then set every changed
+    scheduled date. Returns (bookings moved, bookings assigned, tasks rescheduled).
+    """
+    moved = {move.booking_id: move.to_group_id for move in plan.moves if move.to_group_id is not None}
+    existing = {booking_id: group_id for booking_id, group_id in moved.items() if booking_id in plan._has_group_booking}
+    changed = plan.changed_task_ids
+
+    with transaction.atomic():
+        # Group throughput rollups move with the bookings
+        existing_ids = list(existing)
+        old_rows = []
+        for start in range(0, len(existing_ids), WRITE_BATCH_SIZE):
+            old_rows.extend(
+                GroupBooking.objects.filter(booking_id__in=existing_ids[start:start + WRITE_BATCH_SIZE])
+                .values_list('booking_id', 'group_id', 'due_date')
+            )
+        count_group_bookings([(group_id, due_date) for _, group_id, due_date in old_rows], -1)
+        count_group_bookings([(existing[booking_id], due_date) for booking_id, _, due_date in old_rows])
+        count_group_bookings([
+            (group_id, plan._due_dates[booking_id]) for booking_id, group_id in moved.items() if booking_id not in existing
+        ])
+
+        booking_ids_by_group = {}
+        for booking_id, group_id in existing.items():
+            booking_ids_by_group.setdefault(group_id, []).append(booking_id)
+        for group_id, booking_ids in booking_ids_by_group.items():
+            for start in range(0, len(booking_ids), WRITE_BATCH_SIZE):
+                GroupBooking.objects.filter(booking_id__in=booking_ids[start:start + WRITE_BATCH_SIZE]).update(group_id=group_id)
+
+        GroupBooking.objects.bulk_create(
+            [
+                GroupBooking(booking_id=booking_id, group_id=group_id, due_date=plan._due_dates[booking_id])
+                for booking_id, group_id in moved.items()
+                if booking_id not in existing
+            ],
+            batch_size=WRITE_BATCH_SIZE,
+        )
+
+        task_ids_by_day = {}
+        for task_id in changed:
+            task_ids_by_day.setdefault(plan.schedule[task_id], []).append(task_id)
+        _update_grouped(Task.objects.all(), 'scheduled_date', task_ids_by_day)
+
+        # Queryset updates and bulk_create skip the signals that keep assignments in sync
+        rebuild_for_bookings(moved)
+    return len(existing), len(moved) - len(existing), len(changed)
@@ -0,0 +1,131 @@
+import re
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import GroupMessage
+
+# Full-text search over group chat messages.
+#
+# Message text is mirrored into an SQLite FTS5 table whose rowid is the
+# GroupMessage id. Signals keep it current one row at a time and the
+# rebuild_message_index command refills it in bulk. On databases without
+# FTS5 search falls back to a plain icontains scan.
+
+FTS_TABLE = 'TechPalsApp_groupmessage_fts'
+REBUILD_BATCH_SIZE = 2000
+
+# Private-use markers for snippet(); escaped text can never contain them
+_MARK_START = '\ue000'
+_MARK_END = '\ue001'
+
+CREATE_FTS_TABLE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" '
+    "USING fts5(content, group_id UNINDEXED, tokenize='porter unicode61 remove_diacritics 2')"
+)
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(text):
+    # Quote every word so user input can't inject FTS syntax; the last word
+    # is a prefix match so results show up while the user is still typing.
+    terms = re.findall(r'\w+', text or '')
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def index_message(message):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s', [message.pk])
+        cursor.execute(
+            f'INSERT INTO "{FTS_TABLE}" (rowid, content, group_id) VALUES (%s, %s, %s)',
+            [message.pk, message.content, message.group_id],
+        )
+
+
+def remove_message(message_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s', [message_id])
+
+
+def rebuild_index(batch_size=REBUILD_BATCH_SIZE, progress=None):
+    """Refill the FTS table from GroupMessage. Returns the number of rows indexed."""
+    if not fts_enabled():
+        return 0
+    total = 0
+    rows = GroupMessage.objects.order_by('id').values_list('id', 'content', 'group_id').iterator(chunk_size=batch_size)
+    # One transaction, so searches keep seeing the old index until the swap
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(CREATE_FTS_TABLE)
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}"')
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(f'INSERT INTO "{FTS_TABLE}" (rowid, content, group_id) VALUES (%s, %s, %s)', batch)
+                total += len(batch)
+                batch = []
+                if progress:
+                    progress(total)
+        if batch:
+            cursor.executemany(f'INSERT INTO "{FTS_TABLE}" (rowid, content, group_id) VALUES (%s, %s, %s)', batch)
+            total += len(batch)
+        cursor.execute(f'INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}") VALUES (\'optimize\')')
+    return total
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+def search_messages(text, group_ids, page=1, per_page=20):
+    """
+    Search messages in ``group_ids``, best BM25 match first.
+
+    Returns ``(results, has_next)`` where each result is a GroupMessage
+    with ``highlighted`` set to a marked-up snippet of the matching text.
+    """
+    group_ids = list(group_ids)
+    match = build_match_query(text)
+    if not match or not group_ids:
+        return [], False
+    offset = (page - 1) * per_page
+
+    if not fts_enabled():
+        queryset = GroupMessage.objects.filter(group_id__in=group_ids, content__icontains=text).order_by('-id')
+        results = list(queryset.select_related('sender', 'group')[offset:offset + per_page + 1])
+        for message in results:
+            message.highlighted = escape(message.content)
+        return results[:per_page], len(results) > per_page
+
+    placeholders = ', '.join(['%s'] * len(group_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, snippet("{FTS_TABLE}", 0, %s, %s, %s, 16) FROM "{FTS_TABLE}" '
+            f'WHERE "{FTS_TABLE}" MATCH %s AND group_id IN ({placeholders}) '
+            'ORDER BY rank LIMIT %s OFFSET %s',
+            [_MARK_START, _MARK_END, '…', match, *group_ids, per_page + 1, offset],
+        )
+        hits = cursor.fetchall()
+
+    has_next = len(hits) > per_page
+    hits = hits[:per_page]
+    messages = GroupMessage.objects.select_related('sender', 'group').in_bulk([message_id for message_id, _ in hits])
+    results = []
+    for message_id, snippet in hits:
+        message = messages.get(message_id)
+        if message is not None:
+            message.highlighted = _highlight(snippet)
+            results.append(message)
+    return results, has_next
@@ -1,18 +1,328 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Profile
+from django.utils import timezone
+from .assignments import add_members, rebuild_assignments, rebuild_for_bookings, remove_members
+from .broker import broker, group_channel
+from .caching import BLOG_GENERATION, bump_generation
+from .capacity import change_capacity, release
+from .catalog import invalidate_catalog
+from .context_processors import invalidate_navigation
+from .images import schedule_derivatives
+from .membership import invalidate_membership
+from .rollups import count_bookings, count_group_bookings, count_new_users, count_tasks, reprice_service
+from .search import index_message, remove_message
+from .skills import sync_profile_skills
+from .unread import forget, record_message
+from .models import Profile, Group, GroupBooking, GroupMessage, Category, Post, Task, Booking, Service
 
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
     if created:
-        # Create profile if new user
+        # Create profile if new user; this also caches it on instance.profile
         Profile.objects.create(user=instance)
+        return
+    # Logins save only last_login; there is nothing to sync or create
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    profile = instance._state.fields_cache.get('profile')
+    if profile is None:
+        # Nothing loaded alongside the user: make sure the profile exists,
+        # creating it if it is missing, and cache it for the caller
+        instance.profile, _ = Profile.objects.get_or_create(user=instance)
+        return
+    # Only write the fields of the loaded profile that actually changed
+    profile.save_if_dirty()
+
+
+@receiver(post_save, sender=GroupMessage)
+def publish_group_message(sender, instance, created, **kwargs):
+    # Push new chat messages to open streams once the row is committed
+    if created:
+        payload = instance.as_dict()
+        transaction.on_commit(lambda: broker.publish(group_channel(instance.group_id), payload))
+
+
+@receiver(post_save, sender=GroupMessage)
+def index_group_message(sender, instance, **kwargs):
+    index_message(instance)
+
+
+@receiver(post_delete, sender=GroupMessage)
+def unindex_group_message(sender, instance, **kwargs):
+    remove_message(instance.pk)
+
+
+# Unread counters for the group list and navbar badge
+@receiver(post_save, sender=GroupMessage)
+def count_unread_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_message(instance)
+
+
+# Keep the cached group membership index and members' navigation in sync
+@receiver(m2m_changed, sender=Group.group_members.through)
+def group_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # Changed from the user side (user.custom_groups); pk_set holds group ids
+        if action == 'pre_clear':
+            instance._cleared_group_ids = list(instance.custom_groups.values_list('id', flat=True))
+        elif action == 'post_clear':
+            for group_id in getattr(instance, '_cleared_group_ids', []):
+                invalidate_membership(group_id)
+            invalidate_navigation(instance.pk)
+        elif action in ('post_add', 'post_remove'):
+            for group_id in pk_set:
+                invalidate_membership(group_id)
+            invalidate_navigation(instance.pk)
     else:
-        # Update profile if exists
-        try:
-            instance.profile.save()
-        except Profile.DoesNotExist:
-            # If profile doesn't exist for some reason, create it
-            Profile.objects.create(user=instance)
+        # pk_set holds user ids
+        if action == 'pre_clear':
+            instance._cleared_member_ids = list(instance.group_members.values_list('id', flat=True))
+        elif action == 'post_clear':
+            invalidate_membership(instance.pk)
+            for user_id in getattr(instance, '_cleared_member_ids', []):
+                invalidate_navigation(user_id)
+        elif action in ('post_add', 'post_remove'):
+            invalidate_membership(instance.pk)
+            for user_id in pk_set:
+                invalidate_navigation(user_id)
+
+
+# Members who leave a group lose their read state. Runs after
+# group_members_changed, which remembers what a clear removes.
+@receiver(m2m_changed, sender=Group.group_members.through)
+def group_members_read_states(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_remove':
+        forget([(group_id, instance.pk) for group_id in pk_set] if reverse else [(instance.pk, user_id) for user_id in pk_set])
+    elif action == 'post_clear':
+        if reverse:
+            forget([(group_id, instance.pk) for group_id in getattr(instance, '_cleared_group_ids', [])])
+        else:
+            forget([(instance.pk, user_id) for user_id in getattr(instance, '_cleared_member_ids', [])])
+
+
+# Denormalized task assignments for the staff task list
+@receiver(m2m_changed, sender=Group.group_members.through)
+def group_members_assignments(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            pairs = [(group_id, instance.pk) for group_id in pk_set]
+        else:
+            pairs = [(instance.pk, user_id) for user_id in pk_set]
+        if action == 'post_add':
+            add_members(pairs)
+        else:
+            remove_members(pairs)
+    elif action == 'pre_clear':
+        # Only the memberships being cleared lose their assignments;
+        # group_members_changed has already listed them
+        if reverse:
+            instance.task_assignments.filter(group_id__in=getattr(instance, '_cleared_group_ids', [])).delete()
+        else:
+            instance.task_assignments.filter(member_id__in=getattr(instance, '_cleared_member_ids', [])).delete()
+
+
+@receiver(post_save, sender=Task)
+def task_assignments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rebuild_assignments(Task.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=GroupBooking)
+@receiver(post_delete, sender=GroupBooking)
+def group_booking_assignments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rebuild_for_bookings([instance.booking_id])
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_leader(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_leader_id = (
+            Group.objects.filter(pk=instance.pk).values_list('group_leader_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    invalidate_membership(instance.pk)
+    # Leaders see the groups they lead in their navigation
+    previous_leader_id = getattr(instance, '_previous_leader_id', None)
+    if previous_leader_id != instance.group_leader_id:
+        for user_id in (previous_leader_id, instance.group_leader_id):
+            if user_id:
+                invalidate_navigation(user_id)
+
+
+@receiver(post_save, sender=User)
+def member_renamed(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login; anything else may have changed the username or role
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_navigation(instance.pk)
+    group_ids = set(Group.group_members.through.objects.filter(user_id=instance.pk).values_list('group_id', flat=True))
+    group_ids.update(Group.objects.filter(group_leader_id=instance.pk).values_list('id', flat=True))
+    for group_id in group_ids:
+        invalidate_membership(group_id)
+
+
+# Process-local service catalogs reload on their next request
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def service_changed(sender, instance, **kwargs):
+    invalidate_catalog()
+
+
+# Blog page and sidebar caches
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump_generation(BLOG_GENERATION)
+
+
+@receiver(post_save, sender=User)
+def author_renamed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    if Post.objects.filter(author_id=instance.pk).exists():
+        bump_generation(BLOG_GENERATION)
+
+
+# Resized copies of uploaded images are made off the request thread
+@receiver(post_save, sender=Post)
+def create_post_image_derivatives(sender, instance, **kwargs):
+    # Cached blog pages still point at the original until the copies exist
+    schedule_derivatives(instance.image, on_complete=lambda: bump_generation(BLOG_GENERATION))
+
+
+@receiver(post_save, sender=Profile)
+def tag_profile_skills(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Re-derive the skill tags only when the tech stack text changed
+    if raw or (update_fields is not None and 'tech_stack' not in update_fields):
+        return
+    if created:
+        if instance.tech_stack:
+            sync_profile_skills(instance)
+        return
+    saved = getattr(instance, '_saved_values', None)
+    if saved is None or saved.get('tech_stack') != instance.tech_stack:
+        sync_profile_skills(instance)
+
+
+@receiver(post_save, sender=Profile)
+def create_profile_image_derivatives(sender, instance, **kwargs):
+    # The navbar avatar is cached in the session; refresh it now and again
+    # once the small copy exists
+    invalidate_navigation(instance.user_id)
+    schedule_derivatives(instance.image, on_complete=lambda: invalidate_navigation(instance.user_id))
+
+
+# Daily KPI rollups for the admin dashboard
+ROLLUP_FIELDS = {
+    Booking: ('booking_service_id', 'due_date'),
+    GroupBooking: ('group_id', 'due_date'),
+    Task: ('due_date',),
+    Service: ('service_price', 'daily_capacity'),
+}
+
+
+def _rollup_values(instance):
+    return tuple(getattr(instance, field) for field in ROLLUP_FIELDS[type(instance)])
+
+
+# Booking.save() already reads the previous (service, due date) to move its
+# capacity slot and leaves it in _rollup_previous
+@receiver(pre_save, sender=GroupBooking)
+@receiver(pre_save, sender=Task)
+@receiver(pre_save, sender=Service)
+def remember_rollup_values(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk:
+        instance._rollup_previous = (
+            sender.objects.filter(pk=instance.pk).values_list(*ROLLUP_FIELDS[sender]).first()
+        )
+
+
+def _rollup_change(instance, created):
+    # (old values or None, new values), or None when nothing counted changed
+    previous = None if created else getattr(instance, '_rollup_previous', None)
+    current = _rollup_values(instance)
+    return None if previous == current else (previous, current)
+
+
+@receiver(post_save, sender=Booking)
+def booking_rollups(sender, instance, created, raw=False, **kwargs):
+    change = None if raw else _rollup_change(instance, created)
+    if change:
+        if change[0]:
+            count_bookings([change[0]], -1)
+        count_bookings([change[1]])
+
+
+@receiver(post_save, sender=GroupBooking)
+def group_booking_rollups(sender, instance, created, raw=False, **kwargs):
+    change = None if raw else _rollup_change(instance, created)
+    if change:
+        if change[0]:
+            count_group_bookings([change[0]], -1)
+        count_group_bookings([change[1]])
+
+
+@receiver(post_save, sender=Task)
+def task_rollups(sender, instance, created, raw=False, **kwargs):
+    change = None if raw else _rollup_change(instance, created)
+    if change:
+        if change[0]:
+            count_tasks(change[0], -1)
+        count_tasks(change[1])
+
+
+@receiver(post_save, sender=Service)
+def service_price_rollups(sender, instance, created, raw=False, **kwargs):
+    change = None if raw or created else _rollup_change(instance, created)
+    if change and change[0] and change[0][0] != change[1][0]:
+        reprice_service(instance.pk, instance.service_price)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted_rollups(sender, instance, **kwargs):
+    count_bookings([_rollup_values(instance)], -1)
+
+
+@receiver(post_delete, sender=GroupBooking)
+def group_booking_deleted_rollups(sender, instance, **kwargs):
+    count_group_bookings([_rollup_values(instance)], -1)
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted_rollups(sender, instance, **kwargs):
+    count_tasks([instance.due_date], -1)
+
+
+@receiver(post_save, sender=User)
+def user_joined_rollups(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        count_new_users([timezone.localdate(instance.date_joined)])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted_rollups(sender, instance, **kwargs):
+    count_new_users([timezone.localdate(instance.date_joined)], -1)
+
+
+# Per-service daily capacity. Booking.save() takes the slot; these only
+# keep the ServiceDay counters in step with deletes and capacity changes.
+@receiver(post_delete, sender=Booking)
+def release_booking_slot(sender, instance, **kwargs):
+    release(*_rollup_values(instance))
+
 
+@receiver(post_save, sender=Service)
+def service_capacity_changed(sender, instance, created, raw=False, **kwargs):
+    change = None if raw or created else _rollup_change(instance, created)
+    if change and change[0] and change[0][1] != change[1][1]:
+        change_capacity(instance.pk, change[0][1], change[1][1])
@@ -0,0 +1,94 @@
+import re
+
+from .models import Profile, Skill
+
+# Normalized skill tags.
+#
+# Profile.tech_stack is free text ("Python, Django & React.js"). It is split
+# into lowercase tags, with common spellings folded together, and kept in
+# the Skill table so profiles, services and groups can be compared by id.
+
+SEPARATORS = re.compile(r'[,;/|&\n]|\band\b')
+ALIASES = {
+    'js': 'javascript',
+    'ts': 'typescript',
+    'py': 'python',
+    'reactjs': 'react',
+    'react.js': 'react',
+    'vuejs': 'vue',
+    'vue.js': 'vue',
+    'node.js': 'node',
+    'nodejs': 'node',
+    'postgres': 'postgresql',
+    'golang': 'go',
+    'k8s': 'kubernetes',
+    'ml': 'machine learning',
+}
+_max_length = Skill._meta.get_field('name').max_length
+
+
+def normalize_skill(name):
+    name = ' '.join(name.lower().split()).strip(' .-')
+    return ALIASES.get(name, name)
+
+
+def parse_skills(text):
+    """Split a free-text tech stack into unique normalized skill names, in order."""
+    names = []
+    for part in SEPARATORS.split(text or ''):
+        name = normalize_skill(part)
+        if name and len(name) <= _max_length and name not in names:
+            names.append(name)
+    return names
+
+
+def _skills_by_name(names, create):
+    existing = dict(Skill.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = [name for name in names if name not in existing]
+    if missing and create:
+        Skill.objects.bulk_create([Skill(name=name) for name in missing], ignore_conflicts=True)
+        existing.update(Skill.objects.filter(name__in=missing).values_list('name', 'id'))
+    return existing
+
+
+def skill_ids_for(names, create=True):
+    """Ids of the skills called ``names``, creating missing ones unless ``create`` is False."""
+    if not names:
+        return []
+    existing = _skills_by_name(names, create)
+    return [existing[name] for name in names if name in existing]
+
+
+def skills_in_text(text):
+    """Ids of known skills mentioned in prose, e.g. a service description."""
+    words = re.findall(r'[\w.+#-]+', (text or '').lower())
+    # Multi-word skills ("machine learning") are matched as word pairs
+    candidates = {normalize_skill(word) for word in words}
+    candidates.update(normalize_skill(f'{a} {b}') for a, b in zip(words, words[1:]))
+    candidates.discard('')
+    return skill_ids_for(sorted(candidates), create=False)
+
+
+def sync_profile_skills(profile):
+    profile.skills.set(skill_ids_for(parse_skills(profile.tech_stack)))
+
+
+def sync_skills_for_profiles(profiles):
+    """Rebuild the skill tags of many profiles with a handful of queries."""
+    profiles = list(profiles)
+    names_by_profile = {profile.pk: parse_skills(profile.tech_stack) for profile in profiles}
+    all_names = sorted({name for names in names_by_profile.values() for name in names})
+    ids = _skills_by_name(all_names, create=True) if all_names else {}
+
+    through = Profile.skills.through
+    through.objects.filter(profile_id__in=list(names_by_profile)).delete()
+    through.objects.bulk_create(
+        [
+            through(profile_id=profile_id, skill_id=ids[name])
+            for profile_id, names in names_by_profile.items()
+            for name in names
+            if name in ids
+        ],
+        batch_size=1000,
+    )
+    return len(profiles)
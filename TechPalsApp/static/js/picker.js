@@ -0,0 +1,143 @@
+// Typeahead picker for <select data-picker-url="..."> fields.
+//
+// The select only holds the options that are already chosen; this adds a
+// search box that asks the lookup endpoint for matches as the user types
+// and adds the one picked. Multiple selects show their choices as removable
+// badges. The select itself is still what the form submits, and it fires
+// "change" like a normal select does.
+(function () {
+    'use strict';
+
+    const DELAY_MS = 200;
+
+    function enhance(select) {
+        const multiple = select.multiple;
+        const wrapper = document.createElement('div');
+        wrapper.className = 'position-relative';
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control';
+        input.autocomplete = 'off';
+        input.placeholder = select.dataset.pickerPlaceholder || 'Type to search...';
+        const menu = document.createElement('div');
+        menu.className = 'list-group position-absolute w-100 shadow-sm d-none';
+        menu.style.zIndex = 1000;
+        const chosen = document.createElement('div');
+        chosen.className = 'mt-2';
+
+        select.parentNode.insertBefore(wrapper, select);
+        wrapper.appendChild(input);
+        wrapper.appendChild(menu);
+        wrapper.appendChild(chosen);
+        // Keep the select in the form (and its required check) but out of sight
+        wrapper.appendChild(select);
+        select.classList.add('visually-hidden');
+        select.tabIndex = -1;
+        input.id = select.id;
+        select.removeAttribute('id');
+
+        function selectedOptions() {
+            return Array.from(select.options).filter(function (option) { return option.value && option.selected; });
+        }
+
+        function render() {
+            chosen.replaceChildren();
+            if (!multiple) {
+                const option = selectedOptions()[0];
+                input.value = option ? option.textContent.trim() : '';
+                return;
+            }
+            selectedOptions().forEach(function (option) {
+                const badge = document.createElement('span');
+                badge.className = 'badge text-bg-secondary me-1 mb-1';
+                badge.textContent = option.textContent.trim() + ' ';
+                const remove = document.createElement('button');
+                remove.type = 'button';
+                remove.className = 'btn-close btn-close-white btn-sm align-middle';
+                remove.setAttribute('aria-label', 'Remove');
+                remove.addEventListener('click', function () {
+                    option.remove();
+                    render();
+                    select.dispatchEvent(new Event('change', {bubbles: true}));
+                });
+                badge.appendChild(remove);
+                chosen.appendChild(badge);
+            });
+        }
+
+        function choose(id, label) {
+            let option = Array.from(select.options).find(function (item) { return item.value === String(id); });
+            if (!multiple) {
+                Array.from(select.options).forEach(function (item) { if (item.value) { item.remove(); } });
+                option = null;
+            }
+            if (!option) {
+                option = new Option(label, id);
+                select.add(option);
+            }
+            option.selected = true;
+            menu.classList.add('d-none');
+            render();
+            if (multiple) {
+                input.value = '';
+            }
+            select.dispatchEvent(new Event('change', {bubbles: true}));
+        }
+
+        function show(results) {
+            menu.replaceChildren();
+            results.forEach(function (result) {
+                const item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'list-group-item list-group-item-action';
+                item.textContent = result.label;
+                item.addEventListener('mousedown', function (event) {
+                    event.preventDefault();  // Keep focus in the input
+                    choose(result.id, result.label);
+                });
+                menu.appendChild(item);
+            });
+            menu.classList.toggle('d-none', results.length === 0);
+        }
+
+        let timer = null;
+        let latest = 0;
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            const text = input.value.trim();
+            if (!text) {
+                show([]);
+                return;
+            }
+            timer = setTimeout(function () {
+                const request = ++latest;
+                const url = new URL(select.dataset.pickerUrl, window.location.href);
+                url.searchParams.set('q', text);
+                fetch(url, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+                    .then(function (response) { return response.ok ? response.json() : {results: []}; })
+                    .then(function (data) {
+                        // Ignore answers to queries the user has already typed past
+                        if (request === latest) {
+                            show(data.results);
+                        }
+                    })
+                    .catch(function () {
+                        // Network error or a non-JSON answer: drop stale suggestions
+                        if (request === latest) {
+                            show([]);
+                        }
+                    });
+            }, DELAY_MS);
+        });
+        input.addEventListener('blur', function () {
+            menu.classList.add('d-none');
+            if (!multiple) {
+                render();  // Undo half-typed text
+            }
+        });
+
+        render();
+    }
+
+    document.querySelectorAll('select[data-picker-url]').forEach(enhance);
+})();
@@ -1,8 +1,16 @@
 from django import template
 import os
 
+from TechPalsApp.images import derivative_url
+
 register = template.Library()
 
 @register.filter
 def basename(value):
     return os.path.basename(value)
+
+
+@register.filter
+def thumbnail(image, width=320):
+    # Usage: {{ post.image|thumbnail:320 }} -> URL of the resized WebP copy
+    return derivative_url(image, int(width))
@@ -1,3 +1,1076 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from smtplib import SMTPRecipientsRefused
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from .assignments import rebuild_assignments
+from .broker import Broker, broker, group_channel
+from .caching import bump_generation, get_generation
+from .catalog import SERVICE_GENERATION, get_catalog
+from .exports import build_export
+from .images import DERIVATIVE_WIDTHS, derivative_name, generate_derivatives
+from .imports import BookingImporter
+from .jobs import LOCK_TIMEOUT, claim_next, enqueue, ensure_periodic, job, recover_stale, report_progress, run_job
+from .lookups import LOOKUP_LIMIT
+from .membership import get_membership
+from .models import (
+    Booking, Category, DailyRollup, Generation, Group, GroupBooking, GroupDailyRollup, GroupMessage, GroupReadState,
+    Job, Post, Profile, Service, ServiceDailyRollup, ServiceDay, Task, TaskAssignment,
+)
+from .pagination import keyset_page
+from .ratelimit import BucketStore
+from .sqlite_cache import SQLiteCache
+from .rollups import get_dashboard_metrics, rebuild_rollups
+from .scheduling import apply_plan, plan_tasks
+from .skills import sync_skills_for_profiles
+from .unread import get_unread_total, mark_read
+from .views import _group_event_stream
+
+
+def make_service(name='Repair', price='10.00', **fields):
+    return Service.objects.create(service_name=name, service_description=name, service_price=price, **fields)
+
+
+def rollup_rows():
+    # Every non-empty rollup row; rebuild_rollups doesn't write the empty ones
+    return (
+        set(
+            DailyRollup.objects.exclude(new_users=0, bookings=0, tasks_due=0)
+            .values_list('day', 'new_users', 'bookings', 'tasks_due')
+        ),
+        set(ServiceDailyRollup.objects.exclude(bookings=0).values_list('service_id', 'day', 'bookings', 'revenue')),
+        set(GroupDailyRollup.objects.exclude(bookings=0).values_list('group_id', 'day', 'bookings')),
+    )
+
+
+def make_group(name, leader, members=()):
+    group = Group.objects.create(group_name=name, group_leader=leader)
+    group.group_members.set(members)
+    return group
+
+
+@override_settings(RATE_LIMITS={})
+class GroupMembershipTests(TestCase):
+    def setUp(self):
+        self.leader = User.objects.create_user('leader', 'leader@example.com', 'pw', is_staff=True)
+        self.member = User.objects.create_user('member', 'member@example.com', 'pw', is_staff=True)
+        self.group = make_group('Support', self.leader, [self.member])
+
+    def test_removing_a_member_invalidates_the_cached_membership(self):
+        self.assertTrue(get_membership(self.group.id).can_access(self.member))
+        self.group.group_members.remove(self.member)
+        self.assertFalse(get_membership(self.group.id).can_access(self.member))
+
+    def test_posting_rechecks_membership_in_the_database(self):
+        self.assertTrue(get_membership(self.group.id).can_access(self.member))
+        # Removed without signals, so the cached membership still lists them
+        Group.group_members.through.objects.filter(group=self.group, user=self.member).delete()
+        self.client.force_login(self.member)
+        response = self.client.post(reverse('post-group-message', args=[self.group.id]), {'content': 'hi'})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(GroupMessage.objects.exists())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        service = make_service()
+        # Several bookings share a due date, so the id has to break the tie
+        self.bookings = [
+            Booking.objects.create(booking_user=user, booking_service=service, due_date=date(2026, 1, 1 + i // 3))
+            for i in range(7)
+        ]
+
+    def test_pages_walk_forward_and_back_without_gaps(self):
+        seen = []
+        page = keyset_page(Booking.objects.all(), per_page=3)
+        pages = [page]
+        while page.has_next:
+            page = keyset_page(Booking.objects.all(), after=page.next_cursor, per_page=3)
+            pages.append(page)
+        for page in pages:
+            seen.extend(page)
+        self.assertEqual(seen, self.bookings)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+        back = keyset_page(Booking.objects.all(), before=pages[-1].previous_cursor, per_page=3)
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertTrue(back.has_previous)
+
+    def test_malformed_cursor_shows_the_first_page(self):
+        page = keyset_page(Booking.objects.all(), after='not-a-date~x', per_page=3)
+        self.assertEqual(list(page), self.bookings[:3])
+        self.assertFalse(page.has_previous)
+
+
+class UserListTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        joined = [timezone.now() - timedelta(days=day) for day in range(3)]
+        # Many users share a role and a join time, so the id has to break the tie
+        User.objects.bulk_create([
+            User(
+                username=f'user{i:02}', email=f'user{i:02}@example.com',
+                is_staff=i % 5 == 0, is_superuser=i % 20 == 0, date_joined=joined[i % 3],
+            )
+            for i in range(70)
+        ])
+        self.client.force_login(self.admin)
+
+    def walk(self, **params):
+        pages = [self.client.get(reverse('users'), params).context['page']]
+        while pages[-1].has_next:
+            pages.append(self.client.get(reverse('users'), {**params, 'after': pages[-1].next_cursor}).context['page'])
+        return pages
+
+    def test_pages_follow_role_then_join_order_without_gaps(self):
+        expected = list(User.objects.order_by('-is_superuser', '-is_staff', '-date_joined', '-id'))
+        pages = self.walk()
+        self.assertEqual([len(page) for page in pages], [50, 21])
+        self.assertEqual([user for page in pages for user in page], expected)
+
+        back = self.client.get(reverse('users'), {'before': pages[1].previous_cursor}).context['page']
+        self.assertEqual(list(back), list(pages[0]))
+
+    def test_search_is_paged_in_the_same_order(self):
+        # The admin matches on tech stack, the others on username
+        Profile.objects.filter(user=self.admin).update(tech_stack='Userland tools')
+        User.objects.create_user('zed', 'zed@example.com', 'pw')
+        pages = self.walk(q='USER')
+        self.assertEqual(
+            [user for page in pages for user in page],
+            list(User.objects.exclude(username='zed').order_by('-is_superuser', '-is_staff', '-date_joined', '-id')),
+        )
+        self.assertEqual(self.client.get(reverse('users'), {'q': 'USER'}).context['total'], 71)
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.leader = User.objects.create_user('leader', 'leader@example.com', 'pw', is_staff=True)
+        self.group = make_group('Support', self.leader)
+        self.message = GroupMessage.objects.create(group=self.group, sender=self.leader, content='printer jammed again')
+
+    def search(self, user, text):
+        self.client.force_login(user)
+        return [message.id for message in self.client.get(reverse('message-search'), {'q': text}).context['results']]
+
+    def test_index_follows_message_edits_and_deletes(self):
+        self.assertEqual(self.search(self.leader, 'printer'), [self.message.id])
+        self.message.content = 'scanner offline'
+        self.message.save()
+        self.assertEqual(self.search(self.leader, 'printer'), [])
+        self.assertEqual(self.search(self.leader, 'scan'), [self.message.id])
+        self.message.delete()
+        self.assertEqual(self.search(self.leader, 'scanner'), [])
+
+    def test_search_and_chat_share_the_membership_rule(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.assertEqual(self.search(admin, 'printer'), [])
+        self.assertEqual(self.client.get(reverse('group-chat', args=[self.group.id])).status_code, 403)
+        self.group.group_members.add(admin)
+        self.assertEqual(self.search(admin, 'printer'), [self.message.id])
+        self.assertEqual(self.client.get(reverse('group-chat', args=[self.group.id])).status_code, 200)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = self.settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def save_image(self, name, color, format):
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300), color).save(buffer, format=format)
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_same_stem_with_another_extension_gets_its_own_derivative(self):
+        png = self.save_image('profile_pics/avatar.png', 'red', 'PNG')
+        jpg = self.save_image('profile_pics/avatar.jpg', 'blue', 'JPEG')
+        self.assertEqual(generate_derivatives(png), len(DERIVATIVE_WIDTHS))
+        self.assertEqual(generate_derivatives(jpg), len(DERIVATIVE_WIDTHS))
+
+        with default_storage.open(derivative_name(png, 64)) as png_thumb, \
+                default_storage.open(derivative_name(jpg, 64)) as jpg_thumb:
+            red, _, blue = Image.open(png_thumb).convert('RGB').getpixel((0, 0))
+            self.assertGreater(red, blue)
+            red, _, blue = Image.open(jpg_thumb).convert('RGB').getpixel((0, 0))
+            self.assertGreater(blue, red)
+
+
+class NavigationTests(TestCase):
+    def setUp(self):
+        self.leader = User.objects.create_user('leader', 'leader@example.com', 'pw', is_staff=True)
+        self.member = User.objects.create_user('member', 'member@example.com', 'pw', is_staff=True)
+        self.group = make_group('Support', self.leader, [self.member])
+        self.client.force_login(self.member)
+
+    def group_list(self):
+        return list(self.client.get(reverse('group-list')).context['groups'])
+
+    def test_session_navigation_follows_membership_changes(self):
+        self.assertEqual(self.group_list(), [self.group])
+        self.assertEqual(self.client.session['navigation']['group_ids'], [self.group.id])
+        self.group.group_members.remove(self.member)
+        self.assertEqual(self.group_list(), [])
+        self.assertEqual(self.client.session['navigation']['group_ids'], [])
+
+    def test_group_list_does_not_trust_the_session(self):
+        self.assertEqual(self.group_list(), [self.group])
+        Group.group_members.through.objects.filter(group=self.group, user=self.member).delete()
+        self.assertEqual(self.group_list(), [])
+
+
+class CountingHasher(MD5PasswordHasher):
+    encoded = 0
+
+    def encode(self, password, salt):
+        CountingHasher.encoded += 1
+        return super().encode(password, salt)
+
+
+@override_settings(PASSWORD_HASHERS=['TechPalsApp.tests.CountingHasher'])
+class LoginBackendTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'Ana@Example.com', 'secret')
+
+    def attempt(self, identifier, password):
+        CountingHasher.encoded = 0
+        with self.assertLogs('TechPalsApp.auth', 'INFO') as logs:
+            user = authenticate(username=identifier, password=password)
+        self.assertEqual(CountingHasher.encoded, 1)
+        return user, logs.records[0].outcome
+
+    def test_every_attempt_hashes_once(self):
+        self.assertEqual(self.attempt('ana', 'secret'), (self.user, 'success'))
+        self.assertEqual(self.attempt('ana@example.COM', 'secret'), (self.user, 'success'))
+        self.assertEqual(self.attempt('ana', 'wrong'), (None, 'invalid_password'))
+        self.assertEqual(self.attempt('nobody', 'secret'), (None, 'unknown_user'))
+        self.assertEqual(self.attempt('nobody@example.com', 'secret'), (None, 'unknown_user'))
+
+    def test_inactive_users_are_refused(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.attempt('ana', 'secret'), (None, 'invalid_password'))
+
+    def test_shared_emails_are_refused_but_usernames_win(self):
+        User.objects.create_user('ana2', 'ana@example.com', 'secret')
+        self.assertEqual(self.attempt('ana@example.com', 'secret'), (None, 'unknown_user'))
+        owner = User.objects.create_user('ana@example.com', 'other@example.com', 'secret')
+        self.assertEqual(self.attempt('ana@example.com', 'secret'), (owner, 'success'))
+
+
+class ProfileSignalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        Profile.objects.filter(user=self.user).delete()
+        self.user = User.objects.get(pk=self.user.pk)
+
+    def test_saving_a_user_recreates_a_missing_profile(self):
+        self.user.save()
+        self.assertTrue(Profile.objects.filter(user=self.user).exists())
+
+    def test_logins_do_not_touch_the_profile(self):
+        # Only the last_login UPDATE; no profile lookup or creation
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+        self.assertFalse(Profile.objects.filter(user=self.user).exists())
+
+    def test_admin_can_update_a_user_without_a_profile(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('update-user', args=[self.user.pk]), {
+            'username': 'customer', 'email': 'customer@example.com', 'tech_stack': 'Django',
+        })
+        self.assertRedirects(response, reverse('users'))
+        self.assertEqual(Profile.objects.get(user=self.user).tech_stack, 'Django')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserImportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        uploads = self.settings(IMPORT_UPLOAD_DIR=self.directory)
+        uploads.enable()
+        self.addCleanup(uploads.disable)
+
+    def test_upload_is_imported_by_a_job_with_progress(self):
+        User.objects.create_user('taken', 'taken@example.com', 'pw')
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('users.csv', (
+            'username,email,password,role,tech_stack\n'
+            'ana,ana@example.com,secret1,staff,Python\n'
+            'ben,ben@example.com,secret2,,\n'
+            'taken,other@example.com,secret3,,\n'
+            'cy,not-an-email,secret4,,\n'
+        ).encode())
+        response = self.client.post(reverse('import-users'), {'file': upload})
+
+        # Nothing is hashed in the request; the page polls the queued job
+        queued = Job.objects.get(name='import-users')
+        self.assertRedirects(response, f"{reverse('import-users')}?job={queued.id}")
+        self.assertFalse(User.objects.filter(username='ana').exists())
+        page = self.client.get(response.url)
+        self.assertEqual(page.context['job']['status'], Job.QUEUED)
+        self.assertContains(page, reverse('job-detail', args=[queued.id]))
+
+        run_job(claim_next('worker-1'))
+
+        result = self.client.get(reverse('job-detail', args=[queued.id])).json()['job']['result']
+        self.assertEqual((result['processed'], result['created'], result['rejected']), (4, 2, 2))
+        self.assertEqual([error['line'] for error in result['errors']], [4, 5])
+        self.assertContains(self.client.get(response.url), '2 users created')
+        # The saved upload is gone once imported
+        self.assertEqual(os.listdir(self.directory), [])
+        ana = User.objects.get(username='ana')
+        self.assertTrue(ana.check_password('secret1'))
+        self.assertTrue(ana.is_staff)
+        self.assertEqual(ana.profile.tech_stack, 'Python')
+        self.assertTrue(User.objects.get(username='ben').check_password('secret2'))
+        # Two from the signal, two from the bulk insert
+        self.assertEqual(DailyRollup.objects.get(day=timezone.localdate()).new_users, 4)
+
+    def test_progress_is_reported_while_the_job_runs(self):
+        seen = []
+
+        @job('test-progress')
+        def progress_job():
+            report_progress({'processed': 10})
+            seen.append(Job.objects.get(name='test-progress').result)
+            return {'processed': 20}
+
+        enqueue('test-progress')
+        run_job(claim_next('worker-1'))
+        self.assertEqual(seen, [{'processed': 10}])
+        self.assertEqual(Job.objects.get(name='test-progress').result, {'processed': 20})
+
+
+class SkillTagTests(TestCase):
+    def setUp(self):
+        self.profile = User.objects.create_user('customer', 'customer@example.com', 'pw').profile
+
+    def skills(self):
+        return sorted(self.profile.skills.values_list('name', flat=True))
+
+    def test_signal_and_bulk_sync_agree(self):
+        self.profile.tech_stack = 'Python, React.js & k8s'
+        self.profile.save()
+        self.assertEqual(self.skills(), ['kubernetes', 'python', 'react'])
+
+        Profile.objects.filter(pk=self.profile.pk).update(tech_stack='JS and Postgres')
+        sync_skills_for_profiles(Profile.objects.filter(pk=self.profile.pk))
+        self.assertEqual(self.skills(), ['javascript', 'postgresql'])
+
+
+class TaskAssignmentTests(TestCase):
+    def setUp(self):
+        self.leader = User.objects.create_user('leader', 'leader@example.com', 'pw', is_staff=True)
+        self.ana = User.objects.create_user('ana', 'ana@example.com', 'pw', is_staff=True)
+        self.ben = User.objects.create_user('ben', 'ben@example.com', 'pw', is_staff=True)
+        self.group = make_group('Support', self.leader, [self.ana])
+        customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        self.booking = Booking.objects.create(booking_user=customer, booking_service=make_service(), due_date=date(2026, 3, 1))
+        GroupBooking.objects.create(group=self.group, booking=self.booking, due_date=self.booking.due_date)
+
+    def assigned(self):
+        return sorted(TaskAssignment.objects.values_list('task__title', 'member__username'))
+
+    def test_signals_follow_tasks_and_members(self):
+        task = Task.objects.create(title='Visit', booking=self.booking, due_date=date(2026, 3, 1))
+        self.assertEqual(self.assigned(), [('Visit', 'ana')])
+        self.group.group_members.add(self.ben)
+        self.assertEqual(self.assigned(), [('Visit', 'ana'), ('Visit', 'ben')])
+        self.group.group_members.remove(self.ana)
+        self.assertEqual(self.assigned(), [('Visit', 'ben')])
+        task.due_date = date(2026, 3, 2)
+        task.save()
+        self.assertEqual(list(TaskAssignment.objects.values_list('due_date', flat=True)), [date(2026, 3, 2)])
+        task.delete()
+        self.assertEqual(self.assigned(), [])
+
+    def test_clearing_a_users_groups_keeps_other_assignments(self):
+        self.group.group_members.add(self.ben)
+        Task.objects.create(title='Visit', booking=self.booking, due_date=date(2026, 3, 1))
+        # Ana also covers a task for a group she isn't a member of
+        other = make_group('Field', self.leader, [])
+        covered = Task.objects.create(title='Call', booking=self.booking, due_date=date(2026, 3, 1))
+        TaskAssignment.objects.filter(task=covered).delete()
+        TaskAssignment.objects.create(task=covered, group=other, member=self.ana, due_date=covered.due_date)
+
+        self.ana.custom_groups.clear()
+        self.assertEqual(
+            sorted(TaskAssignment.objects.values_list('group__group_name', 'member__username')),
+            [('Field', 'ana'), ('Support', 'ben')],
+        )
+
+        self.group.group_members.clear()
+        self.assertEqual(
+            sorted(TaskAssignment.objects.values_list('group__group_name', 'member__username')), [('Field', 'ana')]
+        )
+
+    def test_rebuild_covers_bulk_created_tasks(self):
+        self.group.group_members.add(self.ben)
+        Task.objects.bulk_create([
+            Task(title=title, booking=self.booking, due_date=date(2026, 3, 1)) for title in ('Call', 'Visit')
+        ])
+        self.assertEqual(self.assigned(), [])
+        rebuild_assignments(Task.objects.all())
+        self.assertEqual(self.assigned(), [('Call', 'ana'), ('Call', 'ben'), ('Visit', 'ana'), ('Visit', 'ben')])
+
+
+class DashboardRollupTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        self.repair = make_service('Repair', '10.00')
+        self.setup = make_service('Setup', '25.50')
+
+    def book(self, service, day):
+        return Booking.objects.create(booking_user=self.customer, booking_service=service, due_date=day)
+
+    def test_signal_counts_match_a_rebuild(self):
+        first = self.book(self.repair, date(2026, 5, 1))
+        second = self.book(self.repair, date(2026, 5, 1))
+        self.book(self.setup, date(2026, 5, 2))
+        Task.objects.create(title='Visit', booking=first, due_date=date(2026, 5, 1))
+        group = make_group('Support', User.objects.create_user('leader', 'leader@example.com', 'pw', is_staff=True))
+        GroupBooking.objects.create(group=group, booking=first, due_date=date(2026, 5, 1))
+
+        # Moves and deletes take the old day's count back
+        second.due_date = date(2026, 5, 3)
+        second.booking_service = self.setup
+        second.save()
+        self.setup.service_price = '30.00'
+        self.setup.save()
+        first.delete()
+
+        counted = rollup_rows()
+        self.assertIn((self.setup.id, date(2026, 5, 3), 1, 30), counted[1])
+        rebuild_rollups()
+        self.assertEqual(rollup_rows(), counted)
+
+    def test_dashboard_cache_follows_new_bookings(self):
+        self.assertEqual(get_dashboard_metrics()['total_bookings'], 0)
+        self.book(self.repair, date(2026, 5, 1))
+        metrics = get_dashboard_metrics()
+        self.assertEqual(metrics['total_bookings'], 1)
+        self.assertEqual(metrics['total_revenue'], 10)
+
+
+class LookupTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.staff = User.objects.create_user('sam', 'sam@example.com', 'pw', is_staff=True)
+        self.customer = User.objects.create_user('sally', 'sally@example.com', 'pw')
+
+    def lookup(self, kind, **params):
+        return self.client.get(reverse('lookup', args=[kind]), params)
+
+    def test_user_lookups_match_prefixes_and_can_be_limited_to_staff(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.lookup('users', q='SA').json()['results'], [
+            {'id': self.customer.id, 'label': 'sally'}, {'id': self.staff.id, 'label': 'sam'},
+        ])
+        self.assertEqual(self.lookup('users', q='sa', staff=1).json()['results'], [{'id': self.staff.id, 'label': 'sam'}])
+        self.assertEqual(self.lookup('users', q='').json()['results'], [])
+        self.assertEqual(self.lookup('nothing', q='sa').status_code, 404)
+
+    def test_user_lookups_are_for_staff_only(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.lookup('users', q='sa').status_code, 403)
+        self.assertEqual(self.lookup('services', q='re').status_code, 200)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.lookup('users', q='sa').status_code, 200)
+        self.assertEqual(self.lookup('groups', q='sa').status_code, 403)
+
+    def test_results_stop_at_the_limit(self):
+        User.objects.bulk_create([User(username=f'sa{i:02}', email=f'sa{i:02}@example.com') for i in range(LOOKUP_LIMIT + 5)])
+        self.client.force_login(self.admin)
+        labels = [result['label'] for result in self.lookup('users', q='sa').json()['results']]
+        self.assertEqual(labels, [f'sa{i:02}' for i in range(LOOKUP_LIMIT)])
+
+    def test_forms_accept_picked_ids(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('group-create'), {
+            'group_name': 'Support', 'group_leader': self.staff.id, 'members': [self.staff.id, self.admin.id],
+        })
+        group = Group.objects.get(group_name='Support')
+        self.assertEqual(group.group_leader, self.staff)
+        self.assertEqual(set(group.group_members.all()), {self.staff, self.admin})
+
+        self.client.post(reverse('group-edit', args=[group.id]), {
+            'group_name': 'Support', 'group_leader': self.admin.id, 'group_members': [self.customer.id],
+        })
+        group.refresh_from_db()
+        self.assertEqual(group.group_leader, self.admin)
+        self.assertEqual(list(group.group_members.all()), [self.customer])
+
+        booking = Booking.objects.create(
+            booking_user=self.customer, booking_service=make_service(), due_date=date.today() + timedelta(days=3)
+        )
+        response = self.client.post(reverse('update-booking', args=[booking.id]), {
+            'booking_user': self.staff.id, 'booking_service': booking.booking_service_id,
+            'due_date': booking.due_date.isoformat(),
+        })
+        self.assertRedirects(response, reverse('booking-list'))
+        booking.refresh_from_db()
+        self.assertEqual(booking.booking_user, self.staff)
+
+
+class ServiceCatalogTests(TestCase):
+    def test_etag_changes_when_a_service_changes(self):
+        service = make_service('Repair', '10.00')
+        response = self.client.get(reverse('service-catalog'))
+        etag = response['ETag']
+        self.assertEqual(response.json()['services'][0]['price'], '10.00')
+        self.assertEqual(self.client.get(reverse('service-catalog'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        service.service_price = '12.00'
+        service.save()
+        response = self.client.get(reverse('service-catalog'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['services'][0]['price'], '12.00')
+
+    def test_reloads_on_a_bump_from_another_worker(self):
+        service = make_service('Repair', '10.00')
+        self.assertEqual(get_catalog().get(service.id).service_name, 'Repair')
+        # Another worker's save: the row and the shared generation change,
+        # but nothing in this process is told
+        Service.objects.filter(pk=service.pk).update(service_name='Repairs')
+        bump_generation(SERVICE_GENERATION)
+        self.assertEqual(get_catalog().get(service.id).service_name, 'Repairs')
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        service = make_service('Repair', '10.00')
+        self.bookings = [
+            Booking.objects.create(booking_user=customer, booking_service=service, due_date=date(2026, 6, day))
+            for day in (1, 2, 3, 4, 5)
+        ]
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+
+    def download(self, **params):
+        response = self.client.get(reverse('export', args=['bookings']), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_chunks_cover_every_row_once(self):
+        export = build_export('bookings', date_from='2026-06-02', date_to='2026-06-04')
+        self.assertEqual([row[0] for row in export.rows(chunk_size=2)], [booking.id for booking in self.bookings[1:4]])
+
+    def test_csv_and_gzipped_ndjson_agree(self):
+        rows = list(csv.DictReader(io.StringIO(self.download(format='csv').decode())))
+        lines = gzip.decompress(self.download(format='ndjson', gzip='1')).decode().splitlines()
+        self.assertEqual([row['id'] for row in rows], [str(booking.id) for booking in self.bookings])
+        self.assertEqual([json.loads(line)['id'] for line in lines], [booking.id for booking in self.bookings])
+        self.assertEqual(rows[0]['username'], 'customer')
+
+
+class BookingImportTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('ana', 'Ana@Example.com', 'pw')
+        User.objects.create_user('ben', 'ben@example.com', 'pw')
+        self.repair = make_service('Repair', '10.00')
+        make_service('Setup', '25.00')
+
+    def import_rows(self, rows, batch_size=2):
+        importer = BookingImporter(batch_size=batch_size, today=date(2026, 1, 1))
+        return importer.run(enumerate(rows, start=2))
+
+    def test_valid_rows_are_booked_and_counted_across_batches(self):
+        report = self.import_rows([
+            {'user': 'ana', 'service': 'repair', 'due_date': '2026-02-01'},
+            {'user': 'ana@example.com', 'service': str(self.repair.id), 'due_date': '2026-02-01'},
+            {'user': 'nobody', 'service': 'Repair', 'due_date': '2026-02-01'},
+            {'user': 'ben', 'service': 'Setup', 'due_date': '2026-02-02'},
+            {'user': 'ben', 'service': 'Setup', 'due_date': '2026-01-01'},
+            {'user': 'ben', 'service': 'Cleaning', 'due_date': '2026-02-02'},
+            {'user': 'ben', 'service': 'Setup', 'due_date': '02/03/2026'},
+        ])
+        self.assertEqual((report.processed, report.created), (7, 3))
+        self.assertEqual(
+            [(error.line, error.error) for error in report.errors],
+            [
+                (4, 'Unknown user'),
+                (6, 'Due date cannot be today or in the past'),
+                (7, "Unknown service 'Cleaning'"),
+                (8, 'Invalid due date format'),
+            ],
+        )
+        self.assertEqual(Booking.objects.filter(booking_user__username='ana').count(), 2)
+
+        # bulk_create skips the signals, so the importer counts the rollups itself
+        counted = rollup_rows()
+        self.assertIn((self.repair.id, date(2026, 2, 1), 2, 20), counted[1])
+        rebuild_rollups()
+        self.assertEqual(rollup_rows(), counted)
+
+
+class ServiceCapacityTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        self.service = make_service('Repair', '10.00', daily_capacity=1)
+        self.day = date(2026, 7, 1)
+        self.next_day = date(2026, 7, 2)
+
+    def booked(self, day):
+        return ServiceDay.objects.filter(service=self.service, day=day).values_list('booked', flat=True).first()
+
+    def test_saves_moves_and_deletes_keep_the_counter(self):
+        booking = Booking.objects.create(booking_user=self.customer, booking_service=self.service, due_date=self.day)
+        self.assertEqual(self.booked(self.day), 1)
+
+        second = Booking(booking_user=self.customer, booking_service=self.service, due_date=self.day)
+        with self.assertRaises(ValidationError):
+            second.full_clean()
+        # A slot taken between clean() and save() is refused by save() itself
+        with self.assertRaises(ValidationError):
+            second.save()
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(self.booked(self.day), 1)
+
+        booking.due_date = self.next_day
+        booking.save()
+        self.assertEqual((self.booked(self.day), self.booked(self.next_day)), (0, 1))
+        booking.delete()
+        self.assertEqual(self.booked(self.next_day), 0)
+
+    def test_a_move_reads_the_previous_slot_once(self):
+        booking = Booking.objects.create(booking_user=self.customer, booking_service=self.service, due_date=self.day)
+        booking.due_date = self.next_day
+        with CaptureQueriesContext(connection) as queries:
+            booking.save()
+        booking_table = f'FROM "{Booking._meta.db_table}"'
+        self.assertEqual(sum(booking_table in query['sql'] for query in queries.captured_queries), 1)
+        # The rollups moved the booking along with the capacity slot
+        self.assertEqual(
+            list(ServiceDailyRollup.objects.exclude(bookings=0).values_list('day', 'bookings')), [(self.next_day, 1)]
+        )
+
+    def test_admin_shows_a_full_day_as_a_form_error(self):
+        Booking.objects.create(booking_user=self.customer, booking_service=self.service, due_date=self.day)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.post(reverse('admin:TechPalsApp_booking_add'), {
+            'booking_user': self.customer.id, 'booking_service': self.service.id, 'due_date': self.day.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'fully booked')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_bulk_import_fills_the_day_and_rejects_the_rest(self):
+        self.service.daily_capacity = 2
+        self.service.save()
+        report = BookingImporter(today=date(2026, 1, 1)).run(enumerate([
+            {'user': 'customer', 'service': 'Repair', 'due_date': self.day.isoformat()} for _ in range(3)
+        ], start=2))
+        self.assertEqual(report.created, 2)
+        self.assertEqual(
+            [(error.line, error.error) for error in report.errors], [(4, 'The service is fully booked on that date')]
+        )
+        self.assertEqual(self.booked(self.day), 2)
+        self.assertEqual(Booking.objects.filter(due_date=self.day).count(), 2)
+
+
+class RevenueReportTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        self.repair = make_service('Repair', '10.00')
+        self.setup = make_service('Setup', '25.00')
+        bookings = ((self.repair, date(2026, 3, 30)), (self.repair, date(2026, 4, 2)), (self.setup, date(2026, 4, 2)))
+        for service, day in bookings:
+            Booking.objects.create(booking_user=customer, booking_service=service, due_date=day)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def report(self, **params):
+        response = self.client.get(reverse('revenue-report'), {'from': '2026-03-01', 'to': '2026-04-30', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_report_follows_price_changes_and_survives_a_rebuild(self):
+        self.setup.service_price = '40.00'
+        self.setup.save()
+        report = self.report(by='month')
+        self.assertEqual((report['bookings'], report['revenue']), (3, '60.00'))
+        self.assertEqual(
+            [(period['start'], period['revenue']) for period in report['periods']],
+            [('2026-03-01', '10.00'), ('2026-04-01', '50.00')],
+        )
+        self.assertEqual([service['name'] for service in report['services']], ['Setup', 'Repair'])
+
+        ServiceDailyRollup.objects.update(bookings=0, revenue=0)
+        call_command('rebuild_rollups', stdout=io.StringIO())
+        self.assertEqual(self.report(by='month'), report)
+
+    def test_service_filter_and_bad_input(self):
+        report = self.report(service=self.repair.id)
+        self.assertEqual((report['bookings'], report['revenue']), (2, '20.00'))
+        for params in ({'from': '2026-05-01', 'to': '2026-04-01'}, {'by': 'week'}, {'service': 'repair'}):
+            self.assertEqual(self.client.get(reverse('revenue-report'), params).status_code, 400)
+
+
+@override_settings(RATE_LIMITS={})
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.leader = User.objects.create_user('leader', 'leader@example.com', 'pw', is_staff=True)
+        self.member = User.objects.create_user('member', 'member@example.com', 'pw', is_staff=True)
+        self.group = make_group('Support', self.leader, [self.member])
+
+    def post(self, sender, content):
+        return GroupMessage.objects.create(group=self.group, sender=sender, content=content)
+
+    def unread(self, user):
+        return GroupReadState.objects.get(user=user, group=self.group).unread
+
+    def test_messages_count_for_everyone_but_the_sender(self):
+        first = self.post(self.leader, 'one')
+        self.post(self.leader, 'two')
+        self.assertEqual((self.unread(self.member), self.unread(self.leader)), (2, 0))
+        mark_read(self.member.id, self.group.id, first.id)
+        self.assertEqual(self.unread(self.member), 1)
+        self.post(self.member, 'reply')
+        self.assertEqual((self.unread(self.member), self.unread(self.leader)), (0, 1))
+
+    def test_cached_total_follows_new_messages_and_reads(self):
+        self.assertEqual(get_unread_total(self.member.id, [self.group.id]), 0)
+        message = self.post(self.leader, 'one')
+        self.assertEqual(get_unread_total(self.member.id, [self.group.id]), 1)
+        mark_read(self.member.id, self.group.id, message.id)
+        self.assertEqual(get_unread_total(self.member.id, [self.group.id]), 0)
+
+    def test_a_message_is_one_bump_however_big_the_group(self):
+        self.group.group_members.add(*[
+            User.objects.create_user(f'member{i}', f'member{i}@example.com', 'pw') for i in range(10)
+        ])
+        self.post(self.leader, 'hello')
+        with CaptureQueriesContext(connection) as queries:
+            self.post(self.leader, 'hello again')
+        bump = f'UPDATE "{Generation._meta.db_table}"'
+        self.assertEqual(sum(query['sql'].startswith(bump) for query in queries.captured_queries), 1)
+        self.assertEqual(GroupReadState.objects.filter(group=self.group, unread=2).count(), 11)
+
+    def test_reads_only_invalidate_when_the_count_changes(self):
+        first = self.post(self.leader, 'one')
+        mark_read(self.member.id, self.group.id, first.id)
+        reply = self.post(self.member, 'reply')
+        generation = get_generation(f'unread:{self.member.id}')
+        # Already read, then only the member's own message is newer
+        mark_read(self.member.id, self.group.id, first.id)
+        mark_read(self.member.id, self.group.id, reply.id)
+        self.assertEqual(get_generation(f'unread:{self.member.id}'), generation)
+        self.assertEqual(GroupReadState.objects.get(user=self.member, group=self.group).last_read_id, reply.id)
+
+        self.post(self.leader, 'two')
+        mark_read(self.member.id, self.group.id, reply.id + 1)
+        self.assertGreater(get_generation(f'unread:{self.member.id}'), generation)
+
+    def test_first_read_counts_what_is_left_after_the_cursor(self):
+        first = self.post(self.leader, 'one')
+        self.post(self.leader, 'two')
+        self.post(self.member, 'mine')
+        self.post(self.leader, 'three')
+        GroupReadState.objects.filter(user=self.member).delete()
+        self.assertEqual(get_unread_total(self.member.id, [self.group.id]), 0)
+        mark_read(self.member.id, self.group.id, first.id)
+        self.assertEqual(self.unread(self.member), 2)
+        self.assertEqual(get_unread_total(self.member.id, [self.group.id]), 2)
+
+    def test_read_cursor_is_clamped_to_the_newest_message(self):
+        message = self.post(self.leader, 'one')
+        self.client.force_login(self.member)
+        response = self.client.post(reverse('mark-group-read', args=[self.group.id]), {'last_id': message.id + 1000})
+        self.assertEqual(response.status_code, 204)
+        state = GroupReadState.objects.get(user=self.member, group=self.group)
+        self.assertEqual((state.last_read_id, state.unread), (message.id, 0))
+
+        # A later message can still be read and cleared
+        later = self.post(self.leader, 'two')
+        self.assertEqual(self.unread(self.member), 1)
+        mark_read(self.member.id, self.group.id, later.id)
+        self.assertEqual(self.unread(self.member), 0)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = f'{directory}/ratelimit.sqlite3'
+
+    def test_workers_share_buckets(self):
+        # Two stores on one file stand in for two worker processes
+        first, second = BucketStore(self.path), BucketStore(self.path)
+        self.assertEqual(first.take('login:ip:1', 2, 2 / 60), (True, 0))
+        self.assertEqual(second.take('login:ip:1', 2, 2 / 60), (True, 0))
+        allowed, retry_after = first.take('login:ip:1', 2, 2 / 60)
+        self.assertFalse(allowed)
+        self.assertGreater(retry_after, 0)
+        self.assertEqual(second.take('login:ip:2', 2, 2 / 60), (True, 0))
+
+    def test_login_posts_are_limited_per_identifier(self):
+        with self.settings(RATE_LIMIT_DB=self.path, RATE_LIMITS={'login': [('field:identifier', '2/m')]}):
+            statuses = [
+                self.client.post(reverse('login'), {'identifier': 'Ana', 'password': 'wrong'}).status_code
+                for _ in range(3)
+            ]
+            other = self.client.post(reverse('login'), {'identifier': 'ben', 'password': 'wrong'})
+        self.assertEqual(statuses[2], 429)
+        self.assertNotIn(429, statuses[:2])
+        self.assertNotEqual(other.status_code, 429)
+
+
+@job('test-add')
+def add_job(a, b, fail=False):
+    if fail:
+        raise RuntimeError("failed on purpose")
+    return a + b
+
+
+class BouncingEmailBackend(locmem.EmailBackend):
+    def send_messages(self, messages):
+        for message in messages:
+            if 'bounce@example.com' in message.to:
+                raise SMTPRecipientsRefused({'bounce@example.com': (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+class JobQueueTests(TestCase):
+    def test_unique_jobs_are_claimed_once_and_record_their_result(self):
+        queued = enqueue('test-add', {'a': 1, 'b': 2}, unique_key='sum')
+        self.assertEqual(enqueue('test-add', {'a': 5, 'b': 5}, unique_key='sum').id, queued.id)
+
+        claimed = claim_next('worker-1')
+        self.assertEqual((claimed.id, claimed.status, claimed.attempts), (queued.id, Job.RUNNING, 1))
+        self.assertIsNone(claim_next('worker-2'))
+        run_job(claimed)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.result), (Job.SUCCEEDED, 3))
+
+    def test_failures_retry_later_then_fail(self):
+        queued = enqueue('test-add', {'a': 1, 'b': 2, 'fail': True}, max_attempts=2)
+        run_job(claim_next('worker-1'))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.QUEUED, 1))
+        self.assertGreater(queued.run_at, timezone.now())
+        # Not due yet
+        self.assertIsNone(claim_next('worker-1'))
+
+        Job.objects.filter(id=queued.id).update(run_at=timezone.now())
+        run_job(claim_next('worker-1'))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.FAILED, 2))
+        self.assertIn('failed on purpose', queued.last_error)
+
+    def test_jobs_of_a_dead_worker_are_requeued(self):
+        queued = enqueue('test-add', {'a': 1, 'b': 2})
+        claim_next('worker-1')
+        Job.objects.filter(id=queued.id).update(locked_at=timezone.now() - LOCK_TIMEOUT * 2)
+        self.assertEqual(recover_stale(), 1)
+        self.assertEqual(claim_next('worker-2').id, queued.id)
+
+    def test_periodic_reminders_are_queued_for_a_fixed_day(self):
+        ensure_periodic(['send-due-reminders'])
+        queued = Job.objects.get(name='send-due-reminders')
+        expected = timezone.localdate(queued.run_at) + timedelta(days=1)
+        self.assertEqual(queued.kwargs, {'day': expected.isoformat()})
+
+    @override_settings(EMAIL_BACKEND='TechPalsApp.tests.BouncingEmailBackend')
+    def test_reminder_failures_are_reported_not_retried(self):
+        service = make_service()
+        for username in ('ana', 'bounce', 'cy'):
+            customer = User.objects.create_user(username, f'{username}@example.com', 'pw')
+            Booking.objects.create(booking_user=customer, booking_service=service, due_date=date(2026, 3, 1))
+        queued = enqueue('send-due-reminders', {'day': '2026-03-01'})
+        run_job(claim_next('worker-1'))
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.SUCCEEDED)
+        self.assertEqual(queued.result['sent'], 2)
+        self.assertEqual([failure['to'] for failure in queued.result['failed']], ['bounce@example.com'])
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['ana@example.com', 'cy@example.com'])
+
+
+class BlogPageCacheTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('writer', 'writer@example.com', 'pw')
+        self.category = Category.objects.create(name='Guides')
+        self.post = Post.objects.create(title='First steps', author=self.author, category=self.category, content='Hello')
+
+    def test_cached_pages_follow_posts_categories_and_authors(self):
+        self.assertContains(self.client.get(reverse('blog-list')), 'First steps')
+        # From the page cache: only the generation is read from the database
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(reverse('blog-list')), 'First steps')
+
+        self.post.title = 'Getting started'
+        self.post.save()
+        self.assertContains(self.client.get(reverse('blog-list')), 'Getting started')
+
+        self.category.name = 'Tutorials'
+        self.category.save()
+        self.assertContains(self.client.get(reverse('blog-detail', args=[self.post.slug])), 'Tutorials')
+
+        self.author.username = 'editor'
+        self.author.save()
+        self.assertContains(self.client.get(reverse('blog-detail', args=[self.post.slug])), 'editor')
+
+    def test_logged_in_users_skip_the_cache(self):
+        self.client.get(reverse('blog-list'))
+        Post.objects.filter(pk=self.post.pk).update(title='Edited quietly')
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(reverse('blog-list')), 'Edited quietly')
+
+
+class SharedCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = f'{directory}/cache.sqlite3'
+
+    def test_workers_share_entries(self):
+        # Two caches on one file stand in for two worker processes
+        first, second = SQLiteCache(self.path, {}), SQLiteCache(self.path, {})
+        first.set('greeting', {'text': 'hi'})
+        self.assertEqual(second.get('greeting'), {'text': 'hi'})
+        self.assertFalse(second.add('greeting', 'other'))
+        self.assertTrue(second.add('farewell', 'bye'))
+        first.set_many({'a': 1, 'b': 2})
+        self.assertEqual(second.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2})
+        second.delete_many(['a', 'b'])
+        self.assertIsNone(first.get('a'))
+
+    def test_expired_entries_are_missed_and_replaced(self):
+        cache = SQLiteCache(self.path, {})
+        cache.set('stale', 1, 0)
+        self.assertIsNone(cache.get('stale'))
+        self.assertTrue(cache.add('stale', 2))
+        self.assertEqual(cache.get('stale'), 2)
+
+    def test_generations_are_bumped_in_the_database(self):
+        first = get_generation('test')
+        bump_generation('test')
+        bump_generation('test')
+        self.assertGreater(get_generation('test'), first)
+        self.assertEqual(Generation.objects.get(name='test').value, get_generation('test'))
+        # A counter that was never read is created by its first bump
+        bump_generation('fresh')
+        self.assertTrue(Generation.objects.filter(name='fresh').exists())
+
+
+class TaskSchedulingTests(TestCase):
+    def setUp(self):
+        self.today = date(2026, 8, 1)
+        customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        self.ana = User.objects.create_user('ana', 'ana@example.com', 'pw', is_staff=True)
+        self.ben = User.objects.create_user('ben', 'ben@example.com', 'pw', is_staff=True)
+        self.busy = make_group('Busy', self.ana, [self.ana])
+        self.busy.daily_capacity = 1
+        self.busy.save()
+        self.free = make_group('Free', self.ben, [self.ben])
+        service = make_service()
+        for i in range(3):
+            booking = Booking.objects.create(booking_user=customer, booking_service=service, due_date=date(2026, 8, 2))
+            GroupBooking.objects.create(group=self.busy, booking=booking, due_date=booking.due_date)
+            Task.objects.create(title=f'Task {i}', booking=booking, due_date=date(2026, 8, 2))
+
+    def test_overloaded_group_hands_bookings_over_and_state_follows(self):
+        plan = plan_tasks(today=self.today)
+        self.assertEqual([overload.group_name for overload in plan.overloads_before], ['Busy'])
+        self.assertEqual(plan.overloads_after, [])
+        self.assertEqual(plan.late_task_ids, [])
+
+        moved, assigned, rescheduled = apply_plan(plan)
+        self.assertEqual((moved, assigned, rescheduled), (1, 0, 3))
+        self.assertEqual(GroupBooking.objects.filter(group=self.free).count(), 1)
+        self.assertFalse(Task.objects.filter(scheduled_date__isnull=True).exists())
+        # Assignments and group rollups were written around the signals
+        self.assertEqual(TaskAssignment.objects.filter(member=self.ben).count(), 1)
+        counted = rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(rollup_rows(), counted)
+
+
+class BrokerTests(TestCase):
+    async def test_publish_reaches_subscribers_of_the_channel_only(self):
+        broker = Broker()
+        subscription = broker.subscribe('group:1')
+        other = broker.subscribe('group:2')
+        broker.publish('group:1', {'id': 1})
+        self.assertEqual(await subscription.get(1), {'id': 1})
+        self.assertTrue(other.queue.empty())
+        broker.unsubscribe(subscription)
+        broker.unsubscribe(other)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_relay_carries_messages_between_workers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with self.settings(CHAT_RELAY_PATH=f'{directory}/relay.sqlite3'):
+            # Two brokers on one relay file stand in for two worker processes
+            receiving, sending = Broker(), Broker()
+            subscription = receiving.subscribe('group:1')
+            await asyncio.sleep(0.1)
+            sending.publish('group:1', {'id': 7})
+            self.assertEqual(await subscription.get(5), {'id': 7})
+            receiving.unsubscribe(subscription)
+
+
+class GroupStreamTests(TestCase):
+    def setUp(self):
+        self.leader = User.objects.create_user('leader', 'leader@example.com', 'pw', is_staff=True)
+        self.member = User.objects.create_user('member', 'member@example.com', 'pw', is_staff=True)
+        self.group = make_group('Support', self.leader, [self.member])
+        self.message = GroupMessage.objects.create(group=self.group, sender=self.leader, content='hello')
+
+    def test_stream_needs_asgi_and_membership(self):
+        outsider = User.objects.create_user('outsider', 'outsider@example.com', 'pw', is_staff=True)
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(reverse('group-message-stream', args=[self.group.id])).status_code, 503)
+        async_client = self.async_client_class()
+        async_client.force_login(outsider)
+        response = async_to_sync(async_client.get)(reverse('group-message-stream', args=[self.group.id]))
+        self.assertEqual(response.status_code, 403)
+
+    async def test_stream_sends_the_backlog_then_live_messages(self):
+        stream = _group_event_stream(self.group.id, self.member.id, 0)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+        self.assertIn('"content": "hello"', await anext(stream))
+        broker.publish(group_channel(self.group.id), {'id': self.message.id + 1, 'content': 'live'})
+        self.assertIn('"content": "live"', await anext(stream))
+        await stream.aclose()
+
+    async def test_stream_ends_once_the_member_is_removed(self):
+        stream = _group_event_stream(self.group.id, self.member.id, self.message.id)
+        await anext(stream)
+        await sync_to_async(self.group.group_members.remove)(self.member)
+        broker.publish(group_channel(self.group.id), {'id': self.message.id + 1, 'content': 'secret'})
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
@@ -0,0 +1,112 @@
+from django.core.cache import cache
+from django.db.models import Count, F, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .caching import bump_generation, versioned_key
+from .membership import get_membership
+from .models import GroupMessage, GroupReadState
+
+# Unread chat messages per member per group.
+#
+# Each member (and the leader) of a group has a GroupReadState row with
+# the id of the last message they have seen and how many messages from
+# others came after it. A new message adds one to every other reader's
+# row in a single UPDATE; opening the chat moves the cursor and recounts
+# what is left after it in the same statement, so a message arriving
+# meanwhile is never lost. Nothing ever counts a group's history on read.
+#
+# The navbar badge is the sum of a user's rows for the groups they belong
+# to, cached in the shared cache under the generations of those groups and
+# of the user. A new message, or members leaving, bumps the group's
+# generation once however many members the group has; a read bumps the
+# user's only if it changed their count. A total computed while a row was changing lands under an old
+# generation and is never read.
+
+UNREAD_CACHE_SECONDS = 5 * 60
+
+
+def _group_generation(group_id):
+    return f'unread-group:{group_id}'
+
+
+def _user_generation(user_id):
+    return f'unread:{user_id}'
+
+
+def _readers(group_id):
+    membership = get_membership(group_id)
+    if membership is None:
+        return set()
+    readers = set(membership.member_ids)
+    if membership.leader_id:
+        readers.add(membership.leader_id)
+    return readers
+
+
+def record_message(message):
+    """Count a new message as unread for everyone in its group but the sender."""
+    readers = _readers(message.group_id)
+    # Members who joined since the last message don't have a row yet
+    GroupReadState.objects.bulk_create(
+        [GroupReadState(user_id=user_id, group_id=message.group_id) for user_id in readers],
+        ignore_conflicts=True,
+    )
+    states = GroupReadState.objects.filter(group_id=message.group_id)
+    states.filter(user_id__in=readers - {message.sender_id}).update(unread=F('unread') + 1)
+    # The sender has the chat open
+    states.filter(user_id=message.sender_id, last_read_id__lt=message.id).update(last_read_id=message.id, unread=0)
+    bump_generation(_group_generation(message.group_id))
+
+
+def mark_read(user_id, group_id, last_id):
+    """Move the user's cursor in the group up to message ``last_id``."""
+    # last_id comes from the client; a cursor past the newest message would
+    # make later reads no-ops, so the unread count could never be cleared
+    latest = GroupMessage.objects.filter(group_id=group_id).order_by('-id').values_list('id', flat=True).first()
+    last_id = min(last_id, latest or 0)
+    after = (
+        GroupMessage.objects.filter(group_id=group_id, id__gt=last_id).exclude(sender_id=user_id)
+        .order_by().values('group_id').annotate(count=Count('id')).values('count')
+    )
+    remaining = Coalesce(Subquery(after), 0)
+    behind = GroupReadState.objects.filter(user_id=user_id, group_id=group_id, last_read_id__lt=last_id)
+    if behind.exclude(unread=remaining).update(last_read_id=last_id, unread=remaining):
+        bump_generation(_user_generation(user_id))
+    elif not behind.update(last_read_id=last_id):
+        # No row yet, or already read this far. Should a message create the
+        # row first, its row stands and the next read moves the cursor.
+        unread = GroupMessage.objects.filter(group_id=group_id, id__gt=last_id).exclude(sender_id=user_id).count()
+        GroupReadState.objects.bulk_create(
+            [GroupReadState(user_id=user_id, group_id=group_id, last_read_id=last_id, unread=unread)],
+            ignore_conflicts=True,
+        )
+        if unread:
+            bump_generation(_user_generation(user_id))
+
+
+def forget(pairs):
+    """Drop the read state of ``(group id, user id)`` pairs that left a group."""
+    for group_id, user_id in pairs:
+        GroupReadState.objects.filter(group_id=group_id, user_id=user_id).delete()
+    for group_id in {group_id for group_id, _ in pairs}:
+        bump_generation(_group_generation(group_id))
+
+
+def unread_total(user_id, group_ids):
+    if not group_ids:
+        return 0
+    total = GroupReadState.objects.filter(user_id=user_id, group_id__in=group_ids).aggregate(total=Sum('unread'))
+    return total['total'] or 0
+
+
+def get_unread_total(user_id, group_ids):
+    """Unread messages across ``group_ids`` (the user's groups), served from cache."""
+    key = versioned_key(
+        f'unread-total:{user_id}',
+        _user_generation(user_id), *(_group_generation(group_id) for group_id in sorted(group_ids)),
+    )
+    total = cache.get(key)
+    if total is None:
+        total = unread_total(user_id, group_ids)
+        cache.set(key, total, UNREAD_CACHE_SECONDS)
+    return total
@@ -17,6 +17,7 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     
     path('users/add/', views.add_user, name='add-user'),
+    path('users/import/', views.import_users_view, name='import-users'),
     path('users/', views.users, name='users'),
     path('user/update/<int:pk>/', views.update_user, name='update-user'),
     path('user/delete/<int:pk>/', views.delete_user, name='delete-user'),
@@ -25,25 +26,39 @@ urlpatterns = [
     
     path('services/add/', views.add_service, name='add-service'),
     path('services/', views.services, name='service-list'),
+    path('services/catalog/', views.service_catalog, name='service-catalog'),  # JSON, with ETags
+    path('services/<int:service_id>/availability/', views.service_availability, name='service-availability'),  # JSON
     path('services/update/<int:service_id>/', views.update_service, name='update-service'),
     path('services/delete/<int:service_id>/', views.delete_service, name='delete-service'),
     
     path('bookings/', views.booking_list, name='booking-list'),
     path('bookings/add/', views.make_booking, name='make-booking'),
+    path('bookings/import/', views.import_bookings_view, name='import-bookings'),
     path('booking/<int:booking_id>/update/', views.update_booking, name='update-booking'),
     path('booking/delete/<int:booking_id>/', views.delete_booking, name='delete-booking'),
     
     path('groups/', views.group_list, name='group-list'),  
+    path('groups/search/', views.message_search, name='message-search'),
     path('groups/create/', views.create_group, name='group-create'),
     path('groups/<int:group_id>/', views.group_chat, name='group-chat'),
     path('group/edit/<int:group_id>/', views.edit_group, name='group-edit'),
     # path('groups/<int:group_id>/edit/', views.edit_group, name='edit-group'),
     path('group/delete/<int:group_id>/', views.delete_group, name='group-delete'),
+    path('groups/<int:group_id>/messages/', views.group_messages, name='group-messages'),
+    path('groups/<int:group_id>/stream/', views.group_message_stream, name='group-message-stream'),
+    path('groups/<int:group_id>/search/', views.group_message_search, name='group-message-search'),
     path('groups/<int:group_id>/post_message/', views.post_group_message, name='post-group-message'),
+    path('groups/<int:group_id>/read/', views.mark_group_read, name='mark-group-read'),
     path('group-booking/<int:group_booking_id>/submit_report/', views.submit_group_report, name='submit-group-report'),
     
     # Tasks
     path('tasks/create/', views.create_task, name='create-task'),  # Admin only
+    path('lookup/<str:kind>/', views.lookup, name='lookup'),  # Typeahead JSON for form pickers
+    path('tasks/recommendations/<int:booking_id>/', views.group_recommendations, name='task-group-recommendations'),
+    path('tasks/schedule/', views.task_schedule, name='task-schedule'),  # Admin only
+    path('jobs/<int:job_id>/', views.job_detail, name='job-detail'),  # Admin only, JSON
+    path('export/<str:name>/', views.export_data, name='export'),  # Admin only; ?format=csv|ndjson&gzip=1
+    path('reports/revenue/', views.revenue, name='revenue-report'),  # Admin only; ?from=&to=&service=&by=day|month
     path('tasks/', views.staff_task_list, name='task-list'),       # Staff view their group's tasks
     path('tasks/<int:task_id>/edit/', views.update_task, name='edit-task'),
     path('tasks/<int:task_id>/delete/', views.delete_task, name='delete-task'),
@@ -1,15 +1,45 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib import messages  # for flash messages
+from django.contrib.messages.storage.cookie import CookieStorage
 from django.contrib.auth import authenticate, login, logout
-from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Exists, F, FilteredRelation, OuterRef, Q
+from django.db.models.functions import Coalesce
 from django.db import models
 from django.contrib.auth.decorators import login_required, user_passes_test
-from . models import Profile, Service, Group, GroupBooking, GroupMessage, GroupReport, Booking, Task, Post, Category
-from django.http import HttpResponseForbidden
-from datetime import datetime, date
+from . models import Profile, Service, Group, GroupBooking, GroupMessage, GroupReport, Booking, Task, TaskAssignment, Post, Category
+from django.http import (
+    Http404, HttpResponse, HttpResponseForbidden, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from datetime import datetime, date, timedelta
+import asyncio
+import json
+import time
 from django.core.paginator import Paginator
+from django.urls import reverse
+from django.conf import settings
+from django.views.decorators.http import condition, require_POST
 from .forms import PostForm, ContactForm
+from .pagination import keyset_page
+from .recommendations import rank_groups
+from .rollups import REVENUE_PERIODS, get_dashboard_metrics, revenue_report
+from .scheduling import apply_plan, group_overload, plan_tasks
+from .broker import broker, group_channel
+from .catalog import get_catalog
+from .caching import BLOG_GENERATION, cache_page_for_anonymous, get_generation
+from .capacity import availability
+from .context_processors import role_for
+from .exports import EXPORTS, FORMATS, build_export, export_filename, stream_export
+from .imports import detect_format, import_bookings, open_upload, read_rows, save_upload
+from .jobs import enqueue, job_counts, job_status
+from .lookups import booking_label, lookup_bookings, lookup_groups, lookup_services, lookup_users, prefix_match
+from .membership import get_membership, is_member, membership_version
+from .search import search_messages
+from .skills import parse_skills, skill_ids_for
+from .unread import mark_read
 
 # Create your views here.
 def index(request):
@@ -59,21 +89,7 @@ def login_view(request):
         identifier = request.POST.get('identifier')  # username or email
         password = request.POST.get('password')
         
-        print(f"Received identifier: {identifier}")
-        print(f"Received password: {'*' * len(password) if password else None}")
-
-        user = None
-
-        try:
-            # Fetch user by username OR email
-
-            # Now attempt to authenticate
-            user = authenticate(request, username=identifier, password=password)
-            print(f"Authentication success: {user is not None}")
-
-        except User.DoesNotExist:
-            print("User does not exist.")
-            user = None
+        user = authenticate(request, username=identifier, password=password)
 
         if user is not None:
             login(request, user)
@@ -99,7 +115,8 @@ def staff_required(user):
 @login_required
 @user_passes_test(admin_required)
 def admin_dashboard(request):
-    return render(request, 'dashboard.admin.html')
+    # Served from the rollup tables and cached; never scans bookings or tasks
+    return render(request, 'dashboard.admin.html', {'kpi': get_dashboard_metrics()})
 
 @login_required
 @user_passes_test(staff_required)
@@ -142,26 +159,95 @@ def add_user(request):
             is_staff=is_staff,
             is_superuser=is_superuser
         )
-        Profile.objects.update_or_create(user=user, defaults={'tech_stack': tech_stack})
+        # The signal already created (and cached) the profile
+        user.profile.tech_stack = tech_stack
+        user.profile.save_if_dirty()
         
         return redirect('users')
     return render(request, 'user.add.html')
 
+@login_required
+@user_passes_test(admin_required)
+def import_users_view(request):
+    if request.method == 'POST':
+        uploaded = request.FILES.get('file')
+        if not uploaded:
+            messages.error(request, 'Choose a CSV or JSON Lines file to import.')
+            return redirect('import-users')
+        # Hashing every password takes far too long for a request; a job
+        # worker imports the file while this page polls job-detail
+        queued = enqueue(
+            'import-users', {'path': save_upload(uploaded), 'fmt': detect_format(uploaded.name)}, max_attempts=1
+        )
+        return redirect(f"{reverse('import-users')}?job={queued.id}")
+
+    job = None
+    job_id = request.GET.get('job', '')
+    if job_id.isdigit():
+        job = job_status(int(job_id))
+        if job is not None and job['name'] != 'import-users':
+            job = None
+    return render(request, 'user.import.html', {'job': job})
+
+USERS_PER_PAGE = 50
+# Admins, then staff, then clients, newest first; served by user_role_joined_idx
+USER_ORDERING = ('-is_superuser', '-is_staff', '-date_joined', '-id')
+# Above this many matches a search is paged by scanning in display order
+USER_SEARCH_SCAN_THRESHOLD = 1000
+USER_ROLE_SECTIONS = (
+    ('admin', 'Admins'),
+    ('staff', 'Staff'),
+    ('user', 'Clients'),
+)
+
 @login_required
 @user_passes_test(admin_required)
 def users(request):
-    users = User.objects.select_related('profile').order_by('-date_joined')
-    
-    admins = users.filter(is_superuser=True)
-    staff = users.filter(is_staff=True, is_superuser=False)
-    regular_users = users.filter(is_staff=False, is_superuser=False)
-    
+    users = listed = User.objects.all()
+
+    # Prefix search on username, email or tech stack, each backed by a LOWER() index
+    query = request.GET.get('q', '').strip()
+    if query:
+        name_match = prefix_match('username', query) | prefix_match('email', query)
+        tech_stack_match = Profile.objects.filter(prefix_match('tech_stack', query))
+        users = listed = users.filter(name_match | Q(id__in=tech_stack_match.values('user_id')))
+
+    # All three role counts in one pass
+    counts = users.aggregate(
+        admin=Count('id', filter=Q(is_superuser=True)),
+        staff=Count('id', filter=Q(is_staff=True, is_superuser=False)),
+        user=Count('id', filter=Q(is_staff=False, is_superuser=False)),
+    )
+    if query and sum(counts.values()) > USER_SEARCH_SCAN_THRESHOLD:
+        # Broad search: walking the role index and stopping after one page is
+        # cheaper than collecting and sorting every match through the indexes
+        listed = User.objects.filter(name_match | Exists(tech_stack_match.filter(user_id=OuterRef('pk'))))
+
+    # One page in one query, then split into role sections in Python
+    page = keyset_page(
+        listed.select_related('profile').only(
+            'id', 'username', 'email', 'is_staff', 'is_superuser', 'date_joined', 'profile__tech_stack'
+        ),
+        keys=USER_ORDERING,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=USERS_PER_PAGE,
+    )
+    rows_by_role = {role: [] for role, _ in USER_ROLE_SECTIONS}
+    for user in page:
+        rows_by_role[role_for(user)].append(user)
+    sections = [
+        {'role': role, 'label': label, 'users': rows_by_role[role], 'count': counts[role]}
+        for role, label in USER_ROLE_SECTIONS
+    ]
+
     context = {
-        'admins': admins,
-        'staff': staff,
-        'regular_users': regular_users,
+        'page': page,
+        'sections': sections,
+        'total': sum(counts.values()),
+        'query': query,
     }
-    
+
     return render(request, 'users.html', context)
 
 @login_required
@@ -178,11 +264,11 @@ def update_user(request, pk):
         # Check if username or email is already taken (excluding current user)
         if User.objects.filter(username=username).exclude(pk=user.pk).exists():
             messages.error(request, 'Username already exists')
-            return redirect('update-user')
+            return redirect('update-user', pk=user.pk)
         
         if User.objects.filter(email=email).exclude(pk=user.pk).exists():
             messages.error(request, 'This email already exists')
-            return redirect('update-user')
+            return redirect('update-user', pk=user.pk)
         
         user.username= username
         user.email= email
@@ -191,9 +277,9 @@ def update_user(request, pk):
         user.is_superuser = is_superuser
         user.save()
         
-        # Update profile
+        # Update profile, writing only if the tech stack changed
         user.profile.tech_stack = tech_stack
-        user.profile.save()
+        user.profile.save_if_dirty()
         
         messages.success(request, 'User updated successfully')
         return redirect('users')
@@ -223,14 +309,6 @@ def delete_user(request, pk):
     messages.success(request, f'User {user.username} deleted successfully')
     return redirect('users')
 
-def get_base_template(user):
-    if user.is_superuser:
-        return 'base_admin.html'
-    elif user.is_staff:
-        return 'base_staff.html'
-    else:
-        return 'base_user.html'
-
 # User Profile Management
 @login_required
 def update_profile(request):
@@ -248,17 +326,8 @@ def update_profile(request):
         else:
             return redirect('user-dashboard') 
 
-    # Determine base template based on role
-    if request.user.is_superuser:
-        base_template = 'base_admin.html'
-    elif request.user.is_staff:
-        base_template = 'base_staff.html'
-    else:
-        base_template = 'base_user.html'
-
     return render(request, 'profile_update.html', {
         'profile': profile,
-        'base_template': base_template,
     })
 
 # Services Management
@@ -270,34 +339,59 @@ def add_service(request):
         service_name = request.POST.get('service_name')
         service_description = request.POST.get('service_description')
         service_price = request.POST.get('service_price')
+        daily_capacity = request.POST.get('daily_capacity', '')
         
-        Service.objects.create(
+        service = Service.objects.create(
             service_name=service_name,
             service_description=service_description,
-            service_price=service_price
+            service_price=service_price,
+            daily_capacity=int(daily_capacity) if daily_capacity.isdigit() else None
         )
+        service.skills.set(skill_ids_for(parse_skills(request.POST.get('skills'))))
         return redirect('service-list')
     
     return render(request, 'service.add.html')
 
+def _services_page_etag(request):
+    # Only the anonymous page is the same for everyone; checking the cookie
+    # first avoids a session lookup for most visitors. Pending flash
+    # messages are part of the page, so those responses aren't validated.
+    if CookieStorage.cookie_name in request.COOKIES:
+        return None
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+        return None
+    return f'{get_catalog().etag}-page'
+
+
 # @login_required
+@condition(etag_func=_services_page_etag)
 def services(request):
-    services = Service.objects.all()
-    user = request.user
-    
-    if user.is_authenticated and user.is_superuser:
-        base_template = 'base_admin.html'
-    elif user.is_authenticated and user.is_staff:
-        base_template = 'base_staff.html'
-    elif user.is_authenticated and not user.is_staff:
-        base_template = 'base_user.html'
-    else:
-        base_template = 'base.html'
-        
     return render(request, 'services.html', {
-        'services': services,
-        'base_template': base_template,
-        'user': user
+        'services': get_catalog().services,
+        'user': request.user
+    })
+
+
+@condition(etag_func=lambda request: get_catalog().etag)
+def service_catalog(request):
+    # Public JSON catalog; clients revalidate with If-None-Match and get 304s
+    response = HttpResponse(get_catalog().json, content_type='application/json')
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+@login_required
+def service_availability(request, service_id):
+    # Free slots per day over the booking window, from the ServiceDay counters
+    service = get_catalog().get(service_id)
+    if service is None:
+        raise Http404("Service not found")
+    calendar = availability(service.id, service.daily_capacity)
+    return JsonResponse({
+        'service': service.id,
+        'daily_capacity': service.daily_capacity,
+        'days': [day.as_dict() for day in calendar],
+        'available': [day.day.isoformat() for day in calendar if day.available],
     })
 
 @login_required
@@ -315,11 +409,16 @@ def update_service(request, service_id):
             service.service_price = float(service_price)
         except (ValueError, TypeError):
             service.service_price = 0  # or handle error differently
+        # Blank for no limit
+        daily_capacity = request.POST.get('daily_capacity', '')
+        service.daily_capacity = int(daily_capacity) if daily_capacity.isdigit() else None
         
         service.save()
+        service.skills.set(skill_ids_for(parse_skills(request.POST.get('skills'))))
         
         return redirect('service-list')
-    return render(request, 'service.update.html', {'service': service})
+    skills = ', '.join(service.skills.order_by('name').values_list('name', flat=True))
+    return render(request, 'service.update.html', {'service': service, 'skills': skills})
 
 @login_required
 @user_passes_test(admin_required)
@@ -333,14 +432,6 @@ def delete_service(request, service_id):
 
 @login_required
 def make_booking(request):
-    # Determine base_template based on user role
-    if request.user.is_superuser:
-        base_template = 'base_admin.html'
-    elif request.user.is_staff:
-        base_template = 'base_staff.html'
-    else:
-        base_template = 'base_user.html'
-
     if request.method == 'POST':
         booking_user_id = request.POST.get('booking_user') if request.user.is_superuser else request.user.id
         booking_service_id = request.POST.get('booking_service')
@@ -351,12 +442,12 @@ def make_booking(request):
             due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
         except ValueError:
             messages.error(request, "Invalid due date format.")
-            return _render_booking_form(request, base_template, due_date_str, booking_service_id, booking_user_id)
+            return _render_booking_form(request, due_date_str, booking_service_id, booking_user_id)
 
         # Validate due date is not today or in the past
         if due_date <= date.today():
             messages.error(request, "Due date cannot be today or in the past.")
-            return _render_booking_form(request, base_template, due_date_str, booking_service_id, booking_user_id)
+            return _render_booking_form(request, due_date_str, booking_service_id, booking_user_id)
 
         # Get user and service objects
         try:
@@ -373,34 +464,56 @@ def make_booking(request):
             due_date=due_date
         )
         try:
+            # clean() refuses a full day; save() can still refuse if the
+            # last slot went in the meantime
             booking.full_clean()
             booking.save()
         except ValidationError as e:
-            messages.error(request, e.message_dict)
-            return _render_booking_form(request, base_template, due_date_str, booking_service_id, booking_user_id)
+            messages.error(request, ' '.join(e.messages))
+            return _render_booking_form(request, due_date_str, booking_service_id, booking_user_id)
 
         messages.success(request, "Booking created successfully.")
         return redirect('booking-list')  # update URL name if needed
 
     # GET request: render form with defaults
     booking_user_id = request.user.id if not request.user.is_superuser else None
-    return _render_booking_form(request, base_template, '', None, booking_user_id)
+    return _render_booking_form(request, '', None, booking_user_id)
 
 
-def _render_booking_form(request, base_template, input_due_date, selected_service_id, selected_user_id):
+def _render_booking_form(request, input_due_date, selected_service_id, selected_user_id):
     context = {
         'input_due_date': input_due_date,
         'selected_service_id': selected_service_id,
-        'base_template': base_template,
-        'services': Service.objects.all(),
+        'services': get_catalog().services,
     }
     if request.user.is_superuser:
-        context['users'] = User.objects.all()
-        context['selected_user_id'] = selected_user_id
+        # The user picker only needs the chosen user, not every account
+        context['selected_user'] = (
+            User.objects.filter(id=selected_user_id).only('id', 'username').first()
+            if str(selected_user_id or '').isdigit() else None
+        )
 
     return render(request, 'booking.make.html', context)
 
 
+@login_required
+@user_passes_test(admin_required)
+def import_bookings_view(request):
+    report = None
+    if request.method == 'POST':
+        uploaded = request.FILES.get('file')
+        if not uploaded:
+            messages.error(request, 'Choose a CSV or JSON Lines file to import.')
+            return redirect('import-bookings')
+        report = import_bookings(read_rows(open_upload(uploaded), detect_format(uploaded.name)))
+        if report.created:
+            messages.success(request, f'Created {report.created} bookings from {report.processed} rows.')
+    return render(request, 'booking.import.html', {'report': report})
+
+
+BOOKINGS_PER_PAGE = 25
+
+
 @login_required
 def booking_list(request):
     user = request.user
@@ -412,17 +525,50 @@ def booking_list(request):
         # Normal users see only their own bookings
         bookings = Booking.objects.filter(booking_user=user)
 
-    if user.is_superuser:
-        base_template = 'base_admin.html'
-    elif user.is_staff:
-        base_template = 'base_staff.html'
-    else:
-        base_template = 'base_user.html'
+    # Optional filters, all served by the (user|service, due_date) indexes
+    filter_user = request.GET.get('user', '').strip()
+    filter_service = request.GET.get('service', '').strip()
+    date_from = request.GET.get('date_from', '').strip()
+    date_to = request.GET.get('date_to', '').strip()
+
+    if filter_user and (user.is_superuser or user.is_staff):
+        bookings = bookings.filter(booking_user__username=filter_user)
+    if filter_service.isdigit():
+        bookings = bookings.filter(booking_service_id=filter_service)
+    try:
+        if date_from:
+            bookings = bookings.filter(due_date__gte=date.fromisoformat(date_from))
+        if date_to:
+            bookings = bookings.filter(due_date__lte=date.fromisoformat(date_to))
+    except ValueError:
+        messages.error(request, "Invalid date filter.")
+
+    # Join user and service in the same query and only load the shown columns
+    bookings = bookings.select_related('booking_user', 'booking_service').only(
+        'id', 'due_date', 'booking_user__username', 'booking_service__service_name'
+    )
+    page = keyset_page(
+        bookings,
+        keys=('due_date', 'id'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=BOOKINGS_PER_PAGE,
+    )
+
+    # Keep the filters on the next/previous links
+    filter_params = request.GET.copy()
+    filter_params.pop('after', None)
+    filter_params.pop('before', None)
 
     return render(request, 'bookings.html', {
-        'bookings': bookings,
-        'base_template': base_template,
-        'user_role': 'admin' if user.is_superuser else 'staff' if user.is_staff else 'user'
+        'bookings': page,
+        'page': page,
+        'services': get_catalog().services,
+        'filter_user': filter_user,
+        'filter_service': filter_service,
+        'date_from': date_from,
+        'date_to': date_to,
+        'filter_query': filter_params.urlencode(),
     })
 
 
@@ -435,21 +581,11 @@ def update_booking(request, booking_id):
         messages.error(request, "You do not have permission to update this booking.")
         return redirect('booking-list')
 
-    # Determine base template
-    if request.user.is_superuser:
-        base_template = 'base_admin.html'
-    elif request.user.is_staff:
-        base_template = 'base_staff.html'
-    else:
-        base_template = 'base_user.html'
-
     # defining local variable before using it
     def render_update_form(error=None):
         return render(request, 'booking.update.html', {
             'booking': booking,
-            'services': Service.objects.all(),
-            'users': User.objects.all(),
-            'base_template': base_template,
+            'services': get_catalog().services,
             'error': error
         })
 
@@ -484,7 +620,7 @@ def update_booking(request, booking_id):
             messages.success(request, "Booking updated successfully.")
             return redirect('booking-list')
         except ValidationError as e:
-            return render_update_form(e.message_dict)
+            return render_update_form(' '.join(e.messages))
 
     # If GET request, show form
     return render_update_form()
@@ -516,9 +652,6 @@ def cancel_booking(request, booking_id):
 @login_required
 @user_passes_test(admin_required)
 def create_group(request):
-    users = User.objects.filter(is_staff=True)
-    base_template = get_base_template(request.user)
-
     if request.method == 'POST':
         group_name = request.POST.get('group_name')
         group_leader_id = request.POST.get('group_leader')
@@ -526,9 +659,7 @@ def create_group(request):
 
         if not group_name or not group_leader_id or not group_member_ids:
             return render(request, 'groups.create.html', {
-                'users': users,
                 'error': 'Please fill all fields.',
-                'base_template': base_template
             })
 
         group_leader = get_object_or_404(User, id=group_leader_id)
@@ -540,40 +671,55 @@ def create_group(request):
 
         return redirect('group-list')
 
-    return render(request, 'groups.create.html', {
-        'users': users,
-        'base_template': base_template
-    })
+    return render(request, 'groups.create.html')
 
 @login_required
 def group_list(request):
-    base_template = get_base_template(request.user)
-
     # Show groups where user is a member or leader 
     # Admin can view all groups
     if request.user.is_superuser:
-        groups = Group.objects.all()
+        groups = Group.objects.select_related('group_leader')
     else:
+        # Read from the database rather than the navigation's cached ids,
+        # so a removed member stops seeing the group straight away
         groups = Group.objects.filter(
-        models.Q(group_members=request.user) | models.Q(group_leader=request.user)
-    ).distinct()
+            Q(id__in=request.user.custom_groups.values('id')) | Q(group_leader=request.user)
+        ).select_related('group_leader')
+    # The user's unread count per group, joined from their read state rows
+    groups = groups.annotate(
+        read_state=FilteredRelation('read_states', condition=Q(read_states__user=request.user)),
+        unread=Coalesce(F('read_state__unread'), 0),
+    )
 
     return render(request, 'group_list.html', {
         'groups': groups,
-        'base_template': base_template
     })
 
+CHAT_PAGE_SIZE = 50
+
+
+def _chat_messages(group_id):
+    # Sender usernames are joined in, so rendering a message costs no extra query
+    return GroupMessage.objects.filter(group_id=group_id).select_related('sender').only(
+        'id', 'group_id', 'content', 'file', 'timestamp', 'sender__username'
+    )
+
+
 @login_required
 def group_chat(request, group_id):
     group = get_object_or_404(Group, id=group_id)
-    base_template = get_base_template(request.user)
 
     # Check if user is group leader or member
-    if request.user != group.group_leader and request.user not in group.group_members.all():
+    membership = get_membership(group.id)
+    if not membership.can_access(request.user):
         return HttpResponseForbidden("You are not a member of this group.")
 
-    # Get messages ordered by timestamp
-    messages = group.messages.order_by('timestamp')  # Assuming related_name='messages' on GroupMessage
+    # Only the latest page of messages; older history is fetched on demand
+    latest = list(_chat_messages(group.id).order_by('-id')[:CHAT_PAGE_SIZE + 1])
+    has_older = len(latest) > CHAT_PAGE_SIZE
+    messages = latest[:CHAT_PAGE_SIZE][::-1]
+    if messages:
+        mark_read(request.user.id, group.id, messages[-1].id)
 
     # Get the first group booking (if any)
     group_booking = group.group_bookings.first()  # Assuming related_name='group_bookings'
@@ -583,44 +729,241 @@ def group_chat(request, group_id):
 
     context = {
         'group': group,
+        'membership': membership,
         'group_booking': group_booking,
         'group_report': group_report,
         'messages': messages,
+        'has_older': has_older,
+        'last_message_id': messages[-1].id if messages else 0,
         'user': request.user,
-        'base_template': base_template,
     }
 
     return render(request, 'group_chat.html', context)
 
 
 @login_required
-def post_group_message(request, group_id):
-    group = get_object_or_404(Group, id=group_id)
+def group_messages(request, group_id):
+    """JSON delta of a group's chat: ``?after=<id>`` for new messages, ``?before=<id>`` for history."""
+    membership = get_membership(group_id)
+    if membership is None:
+        raise Http404("Group not found.")
+    if not membership.can_access(request.user):
+        return HttpResponseForbidden("You are not a member of this group.")
+
+    after = request.GET.get('after', '')
+    before = request.GET.get('before', '')
+    queryset = _chat_messages(group_id)
+
+    if before.isdigit():
+        rows = list(queryset.filter(id__lt=int(before)).order_by('-id')[:CHAT_PAGE_SIZE + 1])
+        has_more = len(rows) > CHAT_PAGE_SIZE
+        rows = rows[:CHAT_PAGE_SIZE][::-1]
+    else:
+        after_id = int(after) if after.isdigit() else 0
+        rows = list(queryset.filter(id__gt=after_id).order_by('id')[:CHAT_PAGE_SIZE + 1])
+        has_more = len(rows) > CHAT_PAGE_SIZE
+        rows = rows[:CHAT_PAGE_SIZE]
+
+    return JsonResponse({
+        'messages': [message.as_dict() for message in rows],
+        'has_more': has_more,
+    })
+
+
+STREAM_HEARTBEAT_SECONDS = 15
+# Open streams re-check membership in the database at least this often,
+# besides whenever the group's membership version changes
+STREAM_MEMBERSHIP_RECHECK_SECONDS = 60
+
+
+def _can_view_group(user, group_id):
+    membership = get_membership(group_id)
+    if membership is None:
+        return None
+    return membership.can_access(user)
+
+
+def _messages_after(group_id, after_id):
+    return [
+        message.as_dict()
+        for message in _chat_messages(group_id).filter(id__gt=after_id).order_by('id')[:CHAT_PAGE_SIZE]
+    ]
+
+
+def _sse_event(payload):
+    return f"id: {payload['id']}\nevent: message\ndata: {json.dumps(payload)}\n\n"
 
-    if request.user not in group.group_members.all() and request.user != group.group_leader:
+
+async def _group_event_stream(group_id, user_id, last_id):
+    # Subscribe before reading the backlog so nothing posted in between is lost
+    subscription = broker.subscribe(group_channel(group_id))
+    version = await sync_to_async(membership_version)(group_id)
+    checked_at = time.monotonic()
+
+    async def still_member():
+        # A member removed while the stream is open must stop receiving
+        # messages: a changed membership version (one cache read) triggers a
+        # database check, and so does a long enough quiet spell, for removals
+        # that bypassed the signals
+        nonlocal version, checked_at
+        current = await sync_to_async(membership_version)(group_id)
+        if current == version and time.monotonic() - checked_at < STREAM_MEMBERSHIP_RECHECK_SECONDS:
+            return True
+        version, checked_at = current, time.monotonic()
+        return await sync_to_async(is_member)(group_id, user_id)
+
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            backlog = await sync_to_async(_messages_after)(group_id, last_id)
+            for payload in backlog:
+                last_id = payload['id']
+                yield _sse_event(payload)
+            if len(backlog) < CHAT_PAGE_SIZE:
+                break
+
+        while not subscription.overflowed:
+            try:
+                payload = await subscription.get(STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if not await still_member():
+                    break
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            if payload['id'] <= last_id:
+                continue
+            if not await still_member():
+                break
+            last_id = payload['id']
+            yield _sse_event(payload)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@login_required
+async def group_message_stream(request, group_id):
+    """Server-Sent Events stream of new messages in a group (ASGI only)."""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be tied up for the whole connection; the page
+        # falls back to polling group-messages when it sees this.
+        return HttpResponse("Streaming requires the ASGI server.", status=503)
+
+    allowed = await sync_to_async(_can_view_group)(request.user, group_id)
+    if allowed is None:
+        raise Http404("Group not found.")
+    if not allowed:
+        return HttpResponseForbidden("You are not a member of this group.")
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('after', '')
+    last_id = int(last_id) if last_id.isdigit() else 0
+
+    response = StreamingHttpResponse(
+        _group_event_stream(group_id, request.user.id, last_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@require_POST
+def mark_group_read(request, group_id):
+    # The open chat page reports the last message it has shown
+    membership = get_membership(group_id)
+    if membership is None:
+        raise Http404("Group not found.")
+    # Writes re-check membership in the database rather than trusting the cache
+    if not membership.can_access(request.user) or not is_member(group_id, request.user.id):
         return HttpResponseForbidden("You are not a member of this group.")
+    last_id = request.POST.get('last_id', '')
+    if not last_id.isdigit():
+        return HttpResponseBadRequest("last_id is required.")
+    mark_read(request.user.id, group_id, int(last_id))
+    return HttpResponse(status=204)
+
+
+@login_required
+def post_group_message(request, group_id):
+    membership = get_membership(group_id)
+    if membership is None:
+        raise Http404("Group not found.")
+    if not membership.can_access(request.user):
+        return HttpResponseForbidden("You are not a member of this group.")
+
+    # The chat page posts with fetch() and only needs the new message back
+    wants_json = request.headers.get('x-requested-with') == 'XMLHttpRequest'
 
     if request.method == 'POST':
+        # Writes re-check membership in the database rather than trusting the cache
+        if not is_member(group_id, request.user.id):
+            return HttpResponseForbidden("You are not a member of this group.")
         content = request.POST.get('content', '').strip()
         uploaded_file = request.FILES.get('file')
 
         if not content and not uploaded_file:
             # No message or file provided
+            if wants_json:
+                return JsonResponse({'error': "You must enter a message or attach a file."}, status=400)
             messages.error(request, "You must enter a message or attach a file.")
-            return redirect('group-detail', group_id=group.id)
+            return redirect('group-chat', group_id=group_id)
 
         message = GroupMessage.objects.create(
-            group=group,
+            group_id=group_id,
             sender=request.user,
             content=content,
             file=uploaded_file if uploaded_file else None,
         )
 
-        return redirect('group-chat', group_id=group.id)
+        if wants_json:
+            return JsonResponse({'message': message.as_dict()}, status=201)
+        return redirect('group-chat', group_id=group_id)
     else:
         return HttpResponseBadRequest("Invalid request method.")
 
 
+SEARCH_PAGE_SIZE = 20
+
+
+def _visible_group_ids(user):
+    # Same rule as GroupMembership.can_access: only the leader and members
+    # read a group's messages, admins included
+    group_ids = set(user.custom_groups.values_list('id', flat=True))
+    group_ids.update(user.led_groups.values_list('id', flat=True))
+    return group_ids
+
+
+def _search_page(request, group_ids):
+    query = request.GET.get('q', '').strip()
+    page = request.GET.get('page', '1')
+    page = int(page) if page.isdigit() and int(page) > 0 else 1
+    results, has_next = search_messages(query, group_ids, page=page, per_page=SEARCH_PAGE_SIZE)
+    return {
+        'query': query,
+        'results': results,
+        'page_number': page,
+        'has_next': has_next,
+    }
+
+
+@login_required
+def group_message_search(request, group_id):
+    group = get_object_or_404(Group, id=group_id)
+    if not get_membership(group.id).can_access(request.user):
+        return HttpResponseForbidden("You are not a member of this group.")
+
+    context = _search_page(request, [group.id])
+    context['group'] = group
+    return render(request, 'group_search.html', context)
+
+
+@login_required
+def message_search(request):
+    # Search across every group the user can open
+    context = _search_page(request, _visible_group_ids(request.user))
+    return render(request, 'group_search.html', context)
+
+
 @login_required
 def edit_group(request, group_id):
     group = get_object_or_404(Group, id=group_id)
@@ -630,8 +973,6 @@ def edit_group(request, group_id):
         messages.error(request, "You do not have permission to edit this group.")
         return redirect('group-detail', group_id)
 
-    users = User.objects.all()
-
     if request.method == 'POST':
         group_name = request.POST.get('group_name')
         group_leader_id = request.POST.get('group_leader')
@@ -639,6 +980,9 @@ def edit_group(request, group_id):
 
         # Update fields
         group.group_name = group_name
+        daily_capacity = request.POST.get('daily_capacity', '')
+        if request.user.is_superuser and daily_capacity.isdigit():
+            group.daily_capacity = int(daily_capacity)
 
         try:
             group.group_leader = User.objects.get(id=group_leader_id)
@@ -656,16 +1000,10 @@ def edit_group(request, group_id):
         else:
             return redirect('group-chat', group_id)  # Others go to group chat
 
-    base_template = (
-        'base_admin.html' if request.user.is_superuser else
-        'base_staff.html' if request.user.is_staff else
-        'base_user.html'
-    )
-
     return render(request, 'group_edit.html', {
         'group': group,
-        'users': users,
-        'base_template': base_template,
+        # Pickers start from the current leader and members only
+        'members': group.group_members.order_by('username').only('id', 'username'),
     })
 
 @login_required
@@ -679,7 +1017,6 @@ def delete_group(request, group_id):
 def submit_group_report(request, group_booking_id):
     group_booking = get_object_or_404(GroupBooking, id=group_booking_id)
     group = group_booking.group
-    base_template = get_base_template(request.user)
 
     if request.user != group.group_leader:
         return HttpResponseForbidden("Only the group leader can submit the report.")
@@ -692,9 +1029,10 @@ def submit_group_report(request, group_booking_id):
 
     return render(request, 'group_report.html', {
         'group': group,
-        'base_template': base_template
     })
 
+SCHEDULE_MOVES_SHOWN = 200
+
 @login_required
 @user_passes_test(lambda u: u.is_superuser)
 def create_task(request):
@@ -734,6 +1072,9 @@ def create_task(request):
             group_booking.due_date = parsed_due_date
             group_booking.save()
 
+        # Warn before the group takes on more than it can finish by the deadline
+        overload = group_overload(group.id, parsed_due_date)
+
         # Create Task
         Task.objects.create(
             title=title,
@@ -743,43 +1084,208 @@ def create_task(request):
         )
 
         messages.success(request, "Task assigned successfully.")
+        if overload:
+            messages.warning(
+                request,
+                f"{group.group_name} now has {overload.demand} tasks due by {overload.due_date} "
+                f"but can only finish {overload.capacity}. Consider rebalancing from the task schedule."
+            )
         return redirect('task-list')
 
     else:
-        # GET request, show all bookings and groups to assign
-        bookings = Booking.objects.all()
-        groups = Group.objects.all()
+        # GET request; bookings are picked by typeahead, groups are few enough to list
+        selected_booking = None
+        booking_id = request.GET.get('booking', '')
+        if booking_id.isdigit():
+            selected_booking = Booking.objects.select_related('booking_service', 'booking_user').filter(id=booking_id).first()
+
+        # Groups best suited to the chosen booking's service come first
+        if selected_booking:
+            groups = rank_groups(selected_booking.booking_service)
+        else:
+            groups = Group.objects.all()
 
         return render(request, 'task_create.html', {
-            'bookings': bookings,
             'groups': groups,
-            'base_template': 'base_admin.html',
+            'selected_booking': selected_booking,
+            'selected_booking_label': selected_booking and booking_label(
+                selected_booking.id,
+                selected_booking.booking_service.service_name,
+                selected_booking.booking_user.username,
+                selected_booking.due_date,
+            ),
         })
 
 
+LOOKUPS = {
+    # kind: (lookup function, who may use it)
+    'users': (lookup_users, lambda user: user.is_staff or user.is_superuser),
+    'bookings': (lookup_bookings, lambda user: user.is_superuser),
+    'groups': (lookup_groups, lambda user: user.is_superuser),
+    'services': (lookup_services, lambda user: True),
+}
+
+
+@login_required
+def lookup(request, kind):
+    if kind not in LOOKUPS:
+        raise Http404("Unknown lookup")
+    find, allowed = LOOKUPS[kind]
+    if not allowed(request.user):
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+    text = request.GET.get('q', '').strip()
+    if not text:
+        return JsonResponse({'results': []})
+    kwargs = {'staff_only': True} if kind == 'users' and request.GET.get('staff') else {}
+    results = [{'id': item_id, 'label': label} for item_id, label in find(text, **kwargs)]
+    return JsonResponse({'results': results})
+
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def group_recommendations(request, booking_id):
+    booking = get_object_or_404(Booking.objects.select_related('booking_service'), id=booking_id)
+    ranking = rank_groups(booking.booking_service)
+    return JsonResponse({'booking': booking.id, 'groups': [score.as_dict() for score in ranking]})
+
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def task_schedule(request):
+    keep_assignments = request.POST.get('mode', request.GET.get('mode')) != 'replan'
+    plan = plan_tasks(keep_assignments=keep_assignments)
+
+    if request.method == 'POST':
+        moved, created, rescheduled = apply_plan(plan)
+        messages.success(
+            request,
+            f"Schedule applied: {moved} bookings moved, {created} assigned, {rescheduled} tasks rescheduled."
+        )
+        return redirect('task-schedule')
+
+    return render(request, 'task_schedule.html', {
+        'plan': plan,
+        'moves': [
+            {
+                'booking_id': move.booking_id,
+                'tasks': len(move.task_ids),
+                'from_group': plan.group_name(move.from_group_id),
+                'to_group': plan.group_name(move.to_group_id),
+            }
+            for move in plan.moves[:SCHEDULE_MOVES_SHOWN]
+        ],
+        'keep_assignments': keep_assignments,
+        'moves_shown': SCHEDULE_MOVES_SHOWN,
+    })
+
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def export_data(request, name):
+    if name not in EXPORTS:
+        raise Http404("Unknown export")
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest("Format must be csv or ndjson.")
+    compress = request.GET.get('gzip') == '1'
+    try:
+        export = build_export(name, **request.GET.dict())
+    except ValueError:
+        return HttpResponseBadRequest("Invalid filter.")
+
+    response = StreamingHttpResponse(
+        stream_export(export, fmt, compress=compress),
+        content_type='application/gzip' if compress else FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(export, fmt, compress)}"'
+    return response
+
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def revenue(request):
+    # Date-range revenue from the per-service daily rollups; defaults to this year so far
+    today = date.today()
+    period = request.GET.get('by', 'day')
+    service = request.GET.get('service', '')
+    try:
+        start = date.fromisoformat(request.GET['from']) if request.GET.get('from') else today.replace(month=1, day=1)
+        end = date.fromisoformat(request.GET['to']) if request.GET.get('to') else today
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+    if end < start:
+        return JsonResponse({'error': "'to' is before 'from'"}, status=400)
+    if period not in REVENUE_PERIODS:
+        return JsonResponse({'error': 'by must be day or month'}, status=400)
+    if service and not service.isdigit():
+        return JsonResponse({'error': 'Invalid service'}, status=400)
+    return JsonResponse(revenue_report(start, end, service_id=int(service) if service else None, period=period))
+
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def job_detail(request, job_id):
+    status = job_status(job_id)
+    if status is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return JsonResponse({'job': status, 'queue': job_counts()})
+
+
+TASKS_PER_PAGE = 20
+UPCOMING_TASK_DAYS = 7
+
 @login_required
 def staff_task_list(request):
     today = date.today()
+    soon = today + timedelta(days=UPCOMING_TASK_DAYS)
 
     if request.user.is_superuser:
-        # Admin sees all upcoming tasks
-        tasks = Task.objects.filter(due_date__gte=today).order_by('due_date')
-        base_template = 'base_admin.html'
+        # Admin sees all upcoming tasks, via the (due_date, id) index
+        counts = Task.objects.aggregate(
+            overdue=Count('id', filter=Q(due_date__lt=today)),
+            upcoming=Count('id', filter=Q(due_date__gte=today, due_date__lte=soon)),
+        )
+        page = keyset_page(
+            Task.objects.filter(due_date__gte=today).select_related(
+                'booking__booking_service', 'booking__group_booking__group'
+            ),
+            keys=('due_date', 'id'),
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            per_page=TASKS_PER_PAGE,
+        )
+        tasks = list(page)
+        for task in tasks:
+            task.assigned_group = task.group
     elif request.user.is_staff:
-        # Staff see tasks assigned to their groups
-        user_groups = request.user.custom_groups.all()
-        tasks = Task.objects.filter(
-            booking__group_booking__group__in=user_groups,
-            due_date__gte=today
-        ).distinct().order_by('due_date')
-        base_template = 'base_staff.html'
+        # Staff see tasks assigned to their groups: one range scan of their
+        # rows in the denormalized assignment index
+        assignments = TaskAssignment.objects.filter(member=request.user)
+        counts = assignments.aggregate(
+            overdue=Count('id', filter=Q(due_date__lt=today)),
+            upcoming=Count('id', filter=Q(due_date__gte=today, due_date__lte=soon)),
+        )
+        page = keyset_page(
+            assignments.filter(due_date__gte=today).select_related('task__booking__booking_service', 'group'),
+            keys=('due_date', 'task_id'),
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            per_page=TASKS_PER_PAGE,
+        )
+        tasks = []
+        for assignment in page:
+            assignment.task.assigned_group = assignment.group
+            tasks.append(assignment.task)
     else:
         from django.http import HttpResponseForbidden
         return HttpResponseForbidden("You do not have permission to view this page.")
 
     return render(request, 'task_list.html', {
         'tasks': tasks,
-        'base_template': base_template,
+        'page': page,
+        'overdue_count': counts['overdue'],
+        'upcoming_count': counts['upcoming'],
+        'upcoming_days': UPCOMING_TASK_DAYS,
     })
 
 
@@ -800,7 +1306,7 @@ def update_task(request, task_id):
         except ValueError:
             messages.error(request, "Invalid due date format.")
             return render(request, 'task.update.html', {
-                'task': task, 'bookings': bookings, 'base_template': 'base_admin.html'
+                'task': task, 'bookings': bookings
             })
 
         task.title = title
@@ -815,7 +1321,6 @@ def update_task(request, task_id):
     return render(request, 'tasks.update.html', {
         'task': task,
         'bookings': bookings,
-        'base_template': 'base_admin.html',
     })
 
     
@@ -847,49 +1352,51 @@ def create_post(request):
     })
 
 
+def _blog_sidebar_context():
+    # The querysets are lazy: when the sidebar fragment is cached for this
+    # generation the template never evaluates them.
+    return {
+        'categories': Category.objects.all(),
+        'recent_posts': Post.objects.only('title', 'slug').order_by('-published_date')[:5],
+        'blog_generation': get_generation(BLOG_GENERATION),
+    }
+
+
+@cache_page_for_anonymous(BLOG_GENERATION)
 def blog_list(request):
-    post_list = Post.objects.order_by('-published_date')
+    post_list = Post.objects.select_related('author', 'category').order_by('-published_date')
     paginator = Paginator(post_list, 5)  # 5 posts per page
     page_number = request.GET.get('page')
     posts = paginator.get_page(page_number)
 
-    categories = Category.objects.all()
-    recent_posts = Post.objects.order_by('-published_date')[:5]
-
     return render(request, 'blog_list.html', {
         'posts': posts,
-        'categories': categories,
-        'recent_posts': recent_posts,
+        **_blog_sidebar_context(),
     })
 
 
+@cache_page_for_anonymous(BLOG_GENERATION)
 def blog_detail(request, slug):
-    post = get_object_or_404(Post, slug=slug)
-    categories = Category.objects.all()
-    recent_posts = Post.objects.order_by('-published_date')[:5]
+    post = get_object_or_404(Post.objects.select_related('author', 'category'), slug=slug)
 
     return render(request, 'blog_detail.html', {
         'post': post,
-        'categories': categories,
-        'recent_posts': recent_posts,
+        **_blog_sidebar_context(),
     })
 
 
+@cache_page_for_anonymous(BLOG_GENERATION)
 def blog_category(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    post_list = category.posts.order_by('-published_date')
+    post_list = category.posts.select_related('author', 'category').order_by('-published_date')
     paginator = Paginator(post_list, 5)
     page_number = request.GET.get('page')
     posts = paginator.get_page(page_number)
 
-    categories = Category.objects.all()
-    recent_posts = Post.objects.order_by('-published_date')[:5]
-
     return render(request, 'blog_list.html', {
         'posts': posts,
-        'categories': categories,
-        'recent_posts': recent_posts,
         'current_category': category,
+        **_blog_sidebar_context(),
     })
     
 ## Contact management